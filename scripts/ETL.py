@@ -18,15 +18,166 @@ import pyodbc
 import os
 from db_connect_source1 import get_source1_connection  # Connexion SQL Server
 from db_connect_source2 import get_source2_files       # Chemins des fichiers Excel
+from db_connect_source2 import read_excel_cached       # Lecture Excel via cache Feather
 from db_connect_BI import get_bi_connection
 import numpy as np
+import time
+import json
+import argparse
+import calendar
+import sqlite3
+import uuid
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from etl_instrumentation import instrumented, instrument_cursor, start_run, end_run, annotate_run, RUN_LOG_PATH
+from dw_backend import BACKENDS, DW_BACKEND, get_backend   # DW : SQL Server, SQLite ou DuckDB
+from synthetic_northwind import load_manifest              # sources hors ligne (--sources)
+from etl_checkpoint import (CHECKPOINT_PATH, CheckpointStore, code_version,   # reprise des étapes
+                            file_fingerprint, frames_digest, stage_key)
+
+# ------------------------------
+# 0️⃣ ÉTAT ETL : WATERMARKS POUR L'EXTRACTION INCRÉMENTALE
+# ------------------------------
+
+ETL_STATE_PATH = "../data/final/etl_state.json"
+DEFAULT_LOOKBACK_DAYS = 7
+
+# Colonnes de watermark des Orders, avec leurs noms bruts dans Excel
+WATERMARK_COLUMNS = {
+    'OrderID': ['OrderID', 'Order ID'],
+    'OrderDate': ['OrderDate', 'Order Date'],
+    'ShippedDate': ['ShippedDate', 'Shipped Date'],
+}
+
+
+def load_etl_state(path=ETL_STATE_PATH):
+    """
+    Charge l'état ETL persistant (watermarks par source).
+    Retourne un dictionnaire vide si aucun état n'existe encore.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_etl_state(state, path=ETL_STATE_PATH):
+    """Écrit l'état ETL de façon atomique (fichier temporaire + remplacement)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _first_present_column(df, candidates):
+    for c in candidates:
+        if c in df.columns:
+            return c
+    return None
+
+
+def compute_order_watermarks(df_orders, previous=None):
+    """
+    Calcule les high-water marks (max OrderID / OrderDate / ShippedDate)
+    d'un DataFrame d'Orders, combinés avec les watermarks précédents.
+    Les dates sont stockées au format ISO.
+    """
+    watermarks = dict(previous or {})
+
+    for mark, candidates in WATERMARK_COLUMNS.items():
+        col = _first_present_column(df_orders, candidates)
+        if col is None:
+            continue
+
+        if mark == 'OrderID':
+            values = pd.to_numeric(df_orders[col], errors='coerce').dropna()
+            new_value = int(values.max()) if not values.empty else None
+        else:
+            values = pd.to_datetime(df_orders[col], errors='coerce').dropna()
+            new_value = values.max().isoformat() if not values.empty else None
+
+        if new_value is None:
+            continue
+
+        old_value = watermarks.get(mark)
+        if old_value is None:
+            watermarks[mark] = new_value
+        elif mark == 'OrderID' and new_value > old_value:
+            watermarks[mark] = new_value
+        elif mark != 'OrderID' and pd.Timestamp(new_value) > pd.Timestamp(old_value):
+            watermarks[mark] = new_value
+
+    return watermarks
+
+
+def orders_delta_clause(watermarks, lookback_days=DEFAULT_LOOKBACK_DAYS, columns=None):
+    """
+    Construit la clause WHERE (paramétrée) des Orders nouveaux ou modifiés :
+    OrderID > watermark, ou OrderDate / ShippedDate dans la fenêtre
+    [watermark - lookback_days, +∞[.
+    Retourne (clause, params) ; clause vide si pas de watermark (extraction complète).
+    """
+    if not watermarks:
+        return "", []
+
+    conditions, params = [], []
+    if watermarks.get('OrderID') is not None and (columns is None or 'OrderID' in columns):
+        conditions.append("[OrderID] > ?")
+        params.append(int(watermarks['OrderID']))
+
+    for mark in ['OrderDate', 'ShippedDate']:
+        if watermarks.get(mark) is not None and (columns is None or mark in columns):
+            conditions.append(f"[{mark}] >= ?")
+            params.append((pd.Timestamp(watermarks[mark]) - timedelta(days=lookback_days)).to_pydatetime())
+
+    if not conditions:
+        return "", []
+    return " WHERE " + " OR ".join(conditions), params
+
+
+def filter_orders_delta(df_orders, watermarks, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Équivalent pandas de orders_delta_clause pour les sources sans requête (Excel).
+    """
+    if not watermarks:
+        return df_orders
+
+    mask = pd.Series(False, index=df_orders.index)
+
+    id_col = _first_present_column(df_orders, WATERMARK_COLUMNS['OrderID'])
+    if id_col is not None and watermarks.get('OrderID') is not None:
+        mask |= pd.to_numeric(df_orders[id_col], errors='coerce') > int(watermarks['OrderID'])
+
+    for mark in ['OrderDate', 'ShippedDate']:
+        col = _first_present_column(df_orders, WATERMARK_COLUMNS[mark])
+        if col is not None and watermarks.get(mark) is not None:
+            since = pd.Timestamp(watermarks[mark]) - timedelta(days=lookback_days)
+            mask |= pd.to_datetime(df_orders[col], errors='coerce') >= since
+
+    return df_orders[mask].reset_index(drop=True)
+
+
+def track_order_watermarks(chunks, watermarks):
+    """
+    Enveloppe un générateur de blocs d'Orders (mode streaming) et met à jour
+    watermarks en place au fil de la lecture.
+    """
+    for chunk in chunks:
+        watermarks.update(compute_order_watermarks(chunk, watermarks))
+        yield chunk
 
 # ------------------------------
 # 1️⃣ EXTRACTION DE LA SOURCE 1 : SQL SERVER
 # ------------------------------
 
-def extract_sql_server_data():
-   
+@instrumented()
+def extract_sql_server_data(watermarks=None, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Extrait les tables Northwind depuis SQL Server.
+    Si watermarks est fourni (mode incrémental), seuls les Orders nouveaux
+    ou modifiés depuis les watermarks (moins lookback_days) sont lus.
+    """
     print("🚀 Extraction des données depuis SQL Server...")
 
     # Connexion à SQL Server
@@ -39,8 +190,9 @@ def extract_sql_server_data():
 
     try:
         # --- Orders ---
-        sql_orders_query = "SELECT * FROM Orders"
-        df_orders = pd.read_sql(sql_orders_query, conn)
+        delta_clause, delta_params = orders_delta_clause(watermarks, lookback_days)
+        sql_orders_query = "SELECT * FROM Orders" + delta_clause
+        df_orders = pd.read_sql(sql_orders_query, conn, params=delta_params or None)
         print(f"✅ Orders (SQL Server) : {df_orders.shape[0]} lignes, {df_orders.shape[1]} colonnes")
         sql_data['orders'] = df_orders
 
@@ -87,10 +239,12 @@ def extract_sql_server_data():
 # 2️⃣ EXTRACTION DE LA SOURCE 2 : EXCEL
 # ------------------------------
 
-def extract_excel_data():
+@instrumented()
+def extract_excel_data(watermarks=None, lookback_days=DEFAULT_LOOKBACK_DAYS):
     """
     Récupère les données des fichiers Excel : orders.xlsx, customers.xlsx, employees.xlsx
     Retourne un dictionnaire de DataFrames
+    Si watermarks est fourni (mode incrémental), les orders sont filtrés sur le delta.
     """
     print("\n🚀 Extraction des données depuis Excel...")
 
@@ -101,7 +255,9 @@ def extract_excel_data():
     for key, path in files.items():
         if os.path.exists(path):
             try:
-                df = pd.read_excel(path)
+                df = read_excel_cached(path)
+                if key == 'orders':
+                    df = filter_orders_delta(df, watermarks, lookback_days)
                 excel_data[key] = df
                 print(f"✅ {key.capitalize()} (Excel) : {df.shape[0]} lignes, {df.shape[1]} colonnes")
             except Exception as e:
@@ -111,20 +267,227 @@ def extract_excel_data():
 
     return excel_data
 
+# ------------------------------
+# 2️⃣ bis EXTRACTION EN STREAMING (SQL SERVER)
+# ------------------------------
+
+# Colonnes réellement utilisées par les build_dim_* / build_fact_table.
+# Les colonnes absentes de la source sont ignorées à l'extraction.
+SQL_COLUMNS_USED = {
+    'orders': ('Orders', ['OrderID', 'CustomerID', 'EmployeeID', 'OrderDate',
+                          'ShippedDate', 'RequiredDate', 'StatusID']),
+    'customers': ('Customers', ['CustomerID', 'CompanyName', 'Company', 'ContactName',
+                                'City', 'Region', 'StateProvince', 'Country']),
+    'employees': ('Employees', ['EmployeeID', 'LastName', 'FirstName', 'Title',
+                                'JobTitle', 'City', 'Country']),
+    'region': ('Region', ['RegionID', 'RegionDescription', 'RegionName']),
+    'territories': ('Territories', ['TerritoryID', 'TerritoryDescription', 'RegionID']),
+    'employee_territories': ('EmployeeTerritories', ['EmployeeID', 'TerritoryID']),
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def get_projected_columns(conn, table_name, wanted_columns):
+    """
+    Retourne les colonnes de wanted_columns qui existent dans table_name
+    (requête vide, portable SQL Server / SQLite).
+    """
+    existing = pd.read_sql(f"SELECT * FROM {table_name} WHERE 1 = 0", conn).columns
+    return [c for c in wanted_columns if c in existing]
+
+
+def iter_sql_table_chunks(key, chunksize=DEFAULT_CHUNK_SIZE, watermarks=None,
+                          lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Générateur de DataFrames pour la table source correspondant à key
+    (voir SQL_COLUMNS_USED) : seules les colonnes utiles sont lues,
+    par blocs de chunksize lignes. La connexion est fermée à la fin.
+    Pour 'orders', watermarks restreint la lecture au delta (voir orders_delta_clause).
+    """
+    table_name, wanted_columns = SQL_COLUMNS_USED[key]
+
+    conn = get_source1_connection()
+    if not conn:
+        raise Exception("❌ Impossible de se connecter à SQL Server")
+
+    try:
+        columns = get_projected_columns(conn, table_name, wanted_columns)
+        select_list = ", ".join(f"[{c}]" for c in columns)
+        query = f"SELECT {select_list} FROM {table_name}"
+        params = []
+        if key == 'orders':
+            delta_clause, params = orders_delta_clause(watermarks, lookback_days, columns)
+            query += delta_clause
+        for chunk in pd.read_sql(query, conn, params=params or None, chunksize=chunksize):
+            yield chunk
+    finally:
+        conn.close()
+
+
+def extract_sql_server_data_streaming(chunksize=DEFAULT_CHUNK_SIZE, watermarks=None,
+                                      lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Variante streaming de extract_sql_server_data :
+    - 'orders' est un générateur de DataFrames (blocs de chunksize lignes)
+    - les petites tables (customers, employees, region, ...) sont
+      matérialisées, mais uniquement avec les colonnes utiles.
+    """
+    print(f"🚀 Extraction streaming depuis SQL Server (blocs de {chunksize} lignes)...")
+
+    sql_data = {}
+    for key in SQL_COLUMNS_USED:
+        if key == 'orders':
+            continue
+        chunks = list(iter_sql_table_chunks(key, chunksize))
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        print(f"✅ {key} (SQL Server) : {df.shape[0]} lignes, {df.shape[1]} colonnes")
+        sql_data[key] = df
+
+    sql_data['orders'] = iter_sql_table_chunks('orders', chunksize, watermarks, lookback_days)
+    print("✅ Orders (SQL Server) : lecture différée par blocs")
+
+    return sql_data
+
+# ------------------------------
+# 2️⃣ ter EXTRACTION PARALLÈLE (SQL + EXCEL)
+# ------------------------------
+
+def _read_sql_table_timed(key, watermarks=None, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Lit une table source complète (SELECT *) sur sa propre connexion.
+    Pour 'orders', watermarks restreint la lecture au delta.
+    Retourne (DataFrame, durée en secondes).
+    """
+    table_name = SQL_COLUMNS_USED[key][0]
+    start = time.perf_counter()
+
+    conn = get_source1_connection()
+    if not conn:
+        raise Exception("❌ Impossible de se connecter à SQL Server")
+
+    try:
+        delta_clause, params = orders_delta_clause(watermarks, lookback_days) if key == 'orders' else ("", [])
+        df = pd.read_sql(f"SELECT * FROM {table_name}" + delta_clause, conn, params=params or None)
+    finally:
+        conn.close()
+
+    return df, time.perf_counter() - start
+
+
+def _read_excel_timed(path):
+    """
+    Lit un classeur Excel (exécuté dans un processus séparé).
+    Retourne (DataFrame, durée en secondes).
+    """
+    start = time.perf_counter()
+    df = read_excel_cached(path)
+    return df, time.perf_counter() - start
+
+
+@instrumented()
+def extract_all_parallel(max_sql_workers=None, max_excel_workers=None,
+                         state=None, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    Extraction concurrente des deux sources :
+    - chaque table SQL est lue dans un thread avec sa propre connexion (I/O)
+    - chaque classeur Excel est lu dans un processus séparé (CPU)
+    Retourne (sql_data, excel_data, timings) ; sql_data et excel_data sont
+    identiques à ceux de extract_sql_server_data / extract_excel_data.
+    """
+    print("🚀 Extraction parallèle SQL Server + Excel...")
+
+    files = get_source2_files()
+    sql_keys = list(SQL_COLUMNS_USED)
+    excel_keys = [key for key, path in files.items() if os.path.exists(path)]
+    for key, path in files.items():
+        if key not in excel_keys:
+            print(f"❌ Fichier non trouvé : {path}")
+
+    sql_data, excel_data, timings = {}, {}, {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_sql_workers or len(sql_keys)) as thread_pool, \
+         ProcessPoolExecutor(max_workers=max_excel_workers or max(1, len(excel_keys))) as process_pool:
+
+        # Processus Excel lancés avant les threads SQL : un fork pendant qu'un thread
+        # détient un verrou (stdout, import...) peut bloquer le processus enfant
+        excel_futures = {key: process_pool.submit(_read_excel_timed, files[key]) for key in excel_keys}
+        sql_marks = (state or {}).get('sql')
+        sql_futures = {key: thread_pool.submit(_read_sql_table_timed, key, sql_marks, lookback_days)
+                       for key in sql_keys}
+
+        # Résultats collectés dans l'ordre de l'extraction série
+        for key in sql_keys:
+            df, elapsed = sql_futures[key].result()
+            sql_data[key] = df
+            timings[f"sql.{key}"] = elapsed
+            print(f"✅ {key} (SQL Server) : {df.shape[0]} lignes, {df.shape[1]} colonnes")
+
+        for key in excel_keys:
+            try:
+                df, elapsed = excel_futures[key].result()
+            except Exception as e:
+                print(f"❌ Erreur lecture {key} : {e}")
+                continue
+            if key == 'orders':
+                df = filter_orders_delta(df, (state or {}).get('excel'), lookback_days)
+            excel_data[key] = df
+            timings[f"excel.{key}"] = elapsed
+            print(f"✅ {key.capitalize()} (Excel) : {df.shape[0]} lignes, {df.shape[1]} colonnes")
+
+    timings['total'] = time.perf_counter() - start
+    return sql_data, excel_data, timings
+
+
+def print_extraction_timings(timings):
+    """
+    Affiche le rapport de temps par source et le gain par rapport à une exécution série.
+    """
+    print("\n⏱ Temps d'extraction par source :")
+    for name, elapsed in timings.items():
+        if name != 'total':
+            print(f"   - {name:<32} {elapsed:8.3f} s")
+
+    serial_estimate = sum(v for k, v in timings.items() if k != 'total')
+    print(f"   ▶ Total parallèle : {timings['total']:.3f} s "
+          f"(somme des sources : {serial_estimate:.3f} s)")
+
 # ------------------------------
 # 3️⃣ FONCTION PRINCIPALE D'EXTRACTION
 # ------------------------------
 
-def main_extraction():
+@instrumented()
+def main_extraction(streaming=False, chunksize=DEFAULT_CHUNK_SIZE, parallel=False,
+                    watermarks=None, lookback_days=DEFAULT_LOOKBACK_DAYS):
     """
     Extrait toutes les données depuis les sources SQL et Excel
     Retourne deux dictionnaires de DataFrames
+    (en mode streaming, sql_data['orders'] est un générateur de DataFrames ;
+    en mode parallel, les sources sont lues en concurrence, voir extract_all_parallel ;
+    les deux modes sont incompatibles : ValueError)
+    watermarks : {'sql': {...}, 'excel': {...}} pour une extraction incrémentale des Orders,
+    None pour une extraction complète.
     """
-    # Extraction SQL Server
-    sql_data = extract_sql_server_data()
+    watermarks = watermarks or {}
+    if watermarks:
+        print(f"🔁 Extraction incrémentale des Orders (look-back {lookback_days} jours)")
+
+    if parallel and streaming:
+        raise ValueError("parallel et streaming sont incompatibles (Orders lus par blocs sur une seule connexion)")
 
-    # Extraction Excel
-    excel_data = extract_excel_data()
+    if parallel:
+        sql_data, excel_data, timings = extract_all_parallel(state=watermarks, lookback_days=lookback_days)
+        print_extraction_timings(timings)
+    else:
+        # Extraction SQL Server
+        if streaming:
+            sql_data = extract_sql_server_data_streaming(chunksize, watermarks.get('sql'), lookback_days)
+        else:
+            sql_data = extract_sql_server_data(watermarks.get('sql'), lookback_days)
+
+        # Extraction Excel
+        excel_data = extract_excel_data(watermarks.get('excel'), lookback_days)
 
     # Petit check : afficher quelques lignes pour vérifier
 
@@ -184,14 +547,121 @@ def main_extraction():
 # 4️⃣ FONCTION DE VERIFICATION SQL vs EXCEL
 # ------------------------------
 
+# Clés listées par catégorie dans le rapport console
+RECONCILE_SAMPLE_SIZE = 5
+
+
+def _normalize_pair(left, right, name=None, casefold=True):
+    """
+    Ramène une colonne des deux sources à une représentation commune avant hachage :
+    dates -> datetime64 (texte ou Timestamp), nombres des deux côtés -> float64,
+    sinon texte nettoyé (espaces, casse si casefold ; 10641.0 -> '10641'). Vide = NA.
+    """
+    def is_number(s):
+        return pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+
+    def is_integral(s):
+        return bool((s.dropna() % 1 == 0).all())
+
+    def as_date(s):
+        return pd.to_datetime(s, errors='coerce', format='ISO8601').astype('datetime64[us]')
+
+    def as_text(s):
+        if is_number(s) and is_integral(s):
+            s = s.astype('Int64')
+        text = s.astype('string').str.strip()
+        if casefold:
+            text = text.str.casefold()
+        return text.mask(text == '')
+
+    if (name in DATE_COLUMNS or pd.api.types.is_datetime64_any_dtype(left)
+            or pd.api.types.is_datetime64_any_dtype(right)):
+        return as_date(left), as_date(right)
+    if is_number(left) and is_number(right):
+        dtype = 'Int64' if is_integral(left) and is_integral(right) else 'float64'
+        return left.astype(dtype), right.astype(dtype)
+    return as_text(left), as_text(right)
+
+
+def row_fingerprints(df, columns):
+    """
+    Empreinte de contenu (uint64) de chaque ligne de df sur columns,
+    par hachage vectorisé (pd.util.hash_pandas_object) : une passe, coût linéaire.
+    Les colonnes doivent être déjà normalisées (voir _normalize_pair).
+    """
+    if not columns:
+        return pd.Series(np.zeros(len(df), dtype=np.uint64), index=df.index)
+    return pd.util.hash_pandas_object(df[columns], index=False)
+
+
+def reconcile_table(df_sql, df_excel, key_col, columns=None):
+    """
+    Rapprochement ligne à ligne de deux versions d'une table sur key_col.
+    Les colonnes comparées sont columns, ou par défaut les colonnes communes aux deux
+    sources (hors clé). Chaque ligne est réduite à (clé, empreinte) puis les deux côtés
+    sont joints par hachage (merge) : aucune comparaison colonne par colonne.
+    Retourne un dict :
+      counts : sql_rows, excel_rows, matched, changed, missing_in_excel, missing_in_sql,
+               duplicate_keys_sql, duplicate_keys_excel
+      keys   : clés (numpy) missing_in_excel / missing_in_sql / changed, par exemple
+               pour ne recharger que les lignes concernées
+      columns : colonnes comparées
+    """
+    if columns is None:
+        columns = [c for c in df_sql.columns if c in df_excel.columns and c != key_col]
+
+    sides = {'sql': {}, 'excel': {}}
+    # Clés : texte sans changement de casse (restituées telles quelles dans keys)
+    sides['sql']['key'], sides['excel']['key'] = _normalize_pair(
+        df_sql[key_col], df_excel[key_col], key_col, casefold=False)
+    for col in columns:
+        sides['sql'][col], sides['excel'][col] = _normalize_pair(df_sql[col], df_excel[col], col)
+
+    frames, duplicates = {}, {}
+    for side, data in sides.items():
+        normalized = pd.DataFrame({c: v.reset_index(drop=True) for c, v in data.items()})
+        fingerprints = pd.DataFrame({
+            'key': normalized['key'],
+            'fingerprint': row_fingerprints(normalized, columns).to_numpy(),
+        })
+        dup = fingerprints['key'].duplicated()
+        duplicates[side] = int(dup.sum())
+        frames[side] = fingerprints[~dup]
+
+    merged = frames['sql'].merge(frames['excel'], on='key', how='outer',
+                                 suffixes=('_sql', '_excel'), indicator=True)
+    both = merged['_merge'] == 'both'
+    changed = both & (merged['fingerprint_sql'] != merged['fingerprint_excel'])
+    keys = {
+        'missing_in_excel': merged.loc[merged['_merge'] == 'left_only', 'key'].to_numpy(),
+        'missing_in_sql': merged.loc[merged['_merge'] == 'right_only', 'key'].to_numpy(),
+        'changed': merged.loc[changed, 'key'].to_numpy(),
+    }
+    counts = {
+        'sql_rows': len(df_sql),
+        'excel_rows': len(df_excel),
+        'matched': int((both & ~changed).sum()),
+        'changed': len(keys['changed']),
+        'missing_in_excel': len(keys['missing_in_excel']),
+        'missing_in_sql': len(keys['missing_in_sql']),
+        'duplicate_keys_sql': duplicates['sql'],
+        'duplicate_keys_excel': duplicates['excel'],
+    }
+    return {'counts': counts, 'keys': keys, 'columns': columns}
+
+
+@instrumented()
 def verify_data_consistency(sql_data, excel_data, key_columns_map):
     """
-    Compare les DataFrames SQL et Excel pour chaque table.
-    Affiche les lignes manquantes dans chaque source.
-    
+    Rapproche les DataFrames SQL et Excel pour chaque table (voir reconcile_table) :
+    lignes absentes d'un côté, présentes des deux côtés mais au contenu différent.
+
     key_columns_map : dictionnaire { 'table_name' : 'clé_unique' }
+    Retourne { 'table_name' : résultat de reconcile_table } ; les compteurs sont
+    aussi ajoutés au journal d'exécution (section 'reconciliation').
     """
     print("\n🔍 Vérification de la correspondance SQL <-> Excel...")
+    results = {}
 
     for table, key_col in key_columns_map.items():
         df_sql = sql_data.get(table)
@@ -201,25 +671,36 @@ def verify_data_consistency(sql_data, excel_data, key_columns_map):
             print(f"⚠️ Données manquantes pour la table {table}")
             continue
 
-        # Identifier les clés uniques présentes dans SQL mais pas dans Excel
-        missing_in_excel = df_sql[~df_sql[key_col].isin(df_excel[key_col])]
-        # Identifier les clés uniques présentes dans Excel mais pas dans SQL
-        missing_in_sql = df_excel[~df_excel[key_col].isin(df_sql[key_col])]
+        if not isinstance(df_sql, pd.DataFrame):
+            # Mode streaming : la table n'est pas matérialisée
+            print(f"⏭ Table '{table}' lue en streaming, vérification ignorée")
+            continue
+
+        result = reconcile_table(df_sql, df_excel, key_col)
+        results[table] = result
+        counts, keys = result['counts'], result['keys']
 
-        print(f"\n📌 Table '{table}' (clé: '{key_col}')")
-        print(f"   - Lignes présentes en SQL mais absentes dans Excel : {len(missing_in_excel)}")
-        if not missing_in_excel.empty:
-            print(missing_in_excel.head())
+        print(f"\n📌 Table '{table}' (clé: '{key_col}', {len(result['columns'])} colonnes comparées)")
+        print(f"   - Lignes identiques dans les deux sources : {counts['matched']}")
+        for label, category in [("présentes des deux côtés mais différentes", 'changed'),
+                                ("présentes en SQL mais absentes dans Excel", 'missing_in_excel'),
+                                ("présentes en Excel mais absentes dans SQL", 'missing_in_sql')]:
+            print(f"   - Lignes {label} : {counts[category]}")
+            if counts[category]:
+                print(f"     ex. {key_col} : {keys[category][:RECONCILE_SAMPLE_SIZE].tolist()}")
+        if counts['duplicate_keys_sql'] or counts['duplicate_keys_excel']:
+            print(f"   ⚠️ Clés en double : SQL {counts['duplicate_keys_sql']}, "
+                  f"Excel {counts['duplicate_keys_excel']} (première occurrence comparée)")
 
-        print(f"   - Lignes présentes en Excel mais absentes dans SQL : {len(missing_in_sql)}")
-        if not missing_in_sql.empty:
-            print(missing_in_sql.head())
+    annotate_run('reconciliation', {table: r['counts'] for table, r in results.items()})
+    return results
 
 
 
 
 
 # ---------- UTIL — harmonisation des colonnes Excel ----------
+@instrumented()
 def harmonize_excel_columns(excel_data):
     """
     Renomme les colonnes Excel pour correspondre aux noms SQL (utiles pour la suite).
@@ -263,71 +744,274 @@ def harmonize_excel_columns(excel_data):
 
 
 # ---------- BUILD DimDate ----------
-def build_dim_date(sql_orders, excel_orders, min_override=None, max_override=None):
+
+DATE_COLUMNS = ['OrderDate', 'ShippedDate', 'RequiredDate']
+MONTH_NAMES = np.array(calendar.month_name, dtype=object)   # index 1..12
+
+
+def _date_key_int(year, month, day):
+    """DateKey YYYYMMDD par arithmétique entière (pas de strftime)."""
+    return year * 10000 + month * 100 + day
+
+
+def _key_to_date(date_key):
+    """Timestamp d'un DateKey YYYYMMDD."""
+    date_key = int(date_key)
+    return pd.Timestamp(date_key // 10000, date_key // 100 % 100, date_key % 100)
+
+
+def build_calendar(start_date, end_date, fiscal_year_start_month=None, iso_week=False):
     """
-    Construit DimDate à partir des colonnes de date présentes dans les ordres (SQL + Excel).
-    Retourne DataFrame dim_date avec DateKey (YYYYMMDD int) et colonnes de découpage.
-    Si min_override/max_override fournis, on les utilise (utile pour tests).
+    Lignes de DimDate pour chaque jour de start_date à end_date (bornes incluses).
+    Attributs optionnels :
+      iso_week=True            -> IsoYear, IsoWeek (semaine ISO 8601)
+      fiscal_year_start_month  -> FiscalYear (année de fin de l'exercice), FiscalQuarter, FiscalMonth
     """
-    print("📅 Construction de DimDate...")
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    year = dates.year.to_numpy(dtype=np.int64)
+    month = dates.month.to_numpy(dtype=np.int64)
+    day = dates.day.to_numpy(dtype=np.int64)
+    day_of_week = dates.dayofweek.to_numpy(dtype=np.int64) + 1   # 1=Monday .. 7=Sunday
+
+    dim_date = pd.DataFrame({
+        'DateKey': _date_key_int(year, month, day),
+        'DateValue': dates,
+        'Year': year,
+        'Quarter': (month - 1) // 3 + 1,
+        'Month': month,
+        'MonthName': MONTH_NAMES[month],
+        'Day': day,
+        'DayOfWeek': day_of_week,
+        # IsWeekend: Saturday (6) and Sunday (7) -> 1
+        'IsWeekend': (day_of_week >= 6).astype(np.int64),
+    })
+
+    if iso_week:
+        iso = dates.isocalendar()
+        dim_date['IsoYear'] = iso['year'].to_numpy(dtype=np.int64)
+        dim_date['IsoWeek'] = iso['week'].to_numpy(dtype=np.int64)
+
+    if fiscal_year_start_month:
+        fiscal_month = (month - fiscal_year_start_month) % 12 + 1
+        dim_date['FiscalYear'] = year + ((fiscal_year_start_month > 1) & (month >= fiscal_year_start_month))
+        dim_date['FiscalQuarter'] = (fiscal_month - 1) // 3 + 1
+        dim_date['FiscalMonth'] = fiscal_month
+
+    return dim_date
+
 
-    # Récupérer toutes les colonnes date possibles (OrderDate, ShippedDate, RequiredDate)
-    date_cols_sql = []
-    for c in ['OrderDate', 'ShippedDate', 'RequiredDate']:
-        if c in sql_orders.columns:
-            date_cols_sql.append(sql_orders[c])
+def calendar_options(dim_date):
+    """Options de build_calendar déduites des colonnes d'une DimDate déjà construite."""
+    options = {'iso_week': 'IsoWeek' in dim_date.columns, 'fiscal_year_start_month': None}
+    if 'FiscalMonth' in dim_date.columns and not dim_date.empty:
+        row = dim_date.iloc[0]
+        options['fiscal_year_start_month'] = int((int(row['Month']) - int(row['FiscalMonth'])) % 12 + 1)
+    return options
 
-    date_cols_xls = []
-    for c in ['OrderDate', 'ShippedDate', 'RequiredDate']:
-        if c in excel_orders.columns:
-            date_cols_xls.append(excel_orders[c])
 
-    all_dates = pd.concat(date_cols_sql + date_cols_xls, ignore_index=True) if (date_cols_sql + date_cols_xls) else pd.Series(dtype='datetime64[ns]')
+def _date_bounds(*frames):
+    """(min, max) des colonnes de date présentes dans les frames, sans les concaténer."""
+    lows, highs = [], []
+    for df in frames:
+        for c in DATE_COLUMNS:
+            if c in df.columns:
+                dates = _to_datetime_values(df[c])   # mêmes règles que DimOrder
+                if dates.notna().any():
+                    lows.append(dates.min())
+                    highs.append(dates.max())
+    return (min(lows), max(highs)) if lows else (None, None)
 
-    # Convertir en datetime proprement
-    all_dates = pd.to_datetime(all_dates, errors='coerce')
-    all_dates = all_dates.dropna()
 
-    if all_dates.empty:
+@instrumented()
+def build_dim_date(sql_orders, excel_orders, min_override=None, max_override=None,
+                   fiscal_year_start_month=None, iso_week=False):
+    """
+    Construit DimDate à partir des colonnes de date présentes dans les ordres (SQL + Excel).
+    Retourne DataFrame dim_date avec DateKey (YYYYMMDD int) et colonnes de découpage
+    (voir build_calendar pour les attributs ISO / exercice fiscal optionnels).
+    Si min_override/max_override fournis, on les utilise (utile pour tests).
+    Au chargement, seuls les jours absents du DW sont insérés (voir load_dim_date).
+    """
+    print("📅 Construction de DimDate...")
+
+    # Bornes de toutes les colonnes date possibles (OrderDate, ShippedDate, RequiredDate)
+    date_min, date_max = _date_bounds(sql_orders, excel_orders)
+
+    if date_min is None:
         # Aucun date trouvé ; lever une erreur ou créer une période par défaut
         raise ValueError("Aucune date trouvée dans les sources d'orders pour générer DimDate.")
 
-    start_date = pd.to_datetime(min_override) if min_override is not None else all_dates.min()
-    end_date = pd.to_datetime(max_override) if max_override is not None else all_dates.max()
+    start_date = pd.to_datetime(min_override) if min_override is not None else date_min
+    end_date = pd.to_datetime(max_override) if max_override is not None else date_max
 
     print(f"   ▶ plage: {start_date.date()} → {end_date.date()}")
 
     # Générer calendrier complet
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-
-    dim_date = pd.DataFrame({
-        'DateKey': date_range.strftime('%Y%m%d').astype(int),
-        'DateValue': date_range,
-        'Year': date_range.year,
-        'Quarter': date_range.quarter,
-        'Month': date_range.month,
-        'MonthName': date_range.strftime('%B'),
-        'Day': date_range.day,
-        'DayOfWeek': (date_range.dayofweek + 1),  # 1=Monday .. 7=Sunday
-    })
-
-    # IsWeekend: Saturday (6) and Sunday (7) -> 1
-    dim_date['IsWeekend'] = dim_date['DayOfWeek'].isin([6,7]).astype(int)
+    dim_date = build_calendar(start_date.normalize(), end_date.normalize(),
+                              fiscal_year_start_month=fiscal_year_start_month, iso_week=iso_week)
 
     print(f"   ▶ DimDate : {len(dim_date)} lignes générées.")
     return dim_date
 
 
+# ---------- UTIL — opérations vectorisées sur les colonnes ----------
+def _column_or_none(df, col):
+    """Colonne col de df, ou une Series de None si elle n'existe pas (comme r.get(col))."""
+    if col in df.columns:
+        return df[col]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _to_datetime_values(s):
+    """
+    pd.to_datetime(..., errors='coerce') comme appliqué valeur par valeur (iterrows) :
+    une colonne déjà datetime est convertie telle quelle ; sinon format='mixed', chaque
+    valeur est analysée avec son propre format (la conversion en bloc déduirait un
+    format unique de la première valeur et rendrait NaT pour les autres formats).
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return pd.to_datetime(s)
+    return pd.to_datetime(s, errors='coerce', format='mixed')
+
+
+def _is_falsy(s):
+    """Masque des valeurs « fausses » au sens Python (None, '', 0) ; NaN est vrai."""
+    values = s.to_numpy(dtype=object)
+    falsy = np.equal(values, None) | np.equal(values, '') | np.equal(values, 0)
+    return pd.Series(falsy, index=s.index)
+
+
+def _coalesce_or(df, columns, none_last=False):
+    """
+    Équivalent vectorisé de r.get(c1) or r.get(c2) or ... (or None si none_last).
+    """
+    if none_last:
+        result = pd.Series([None] * len(df), index=df.index, dtype=object)
+        candidates = columns
+    else:
+        result = _column_or_none(df, columns[-1]).astype(object)
+        candidates = columns[:-1]
+
+    for col in reversed(candidates):
+        values = _column_or_none(df, col)
+        result = values.astype(object).where(~_is_falsy(values), result)
+    return result
+
+
+def _split_contact_names(contact):
+    """
+    Version vectorisée de split_contact : retourne (LastName, FirstName).
+    Un seul mot -> LastName ; sinon premier mot -> FirstName, le reste -> LastName.
+    """
+    last = pd.Series([None] * len(contact), index=contact.index, dtype=object)
+    first = last.copy()
+
+    valid = contact.notna()
+    text = (contact[valid].astype(str).str.strip()
+            .str.replace(r"\s+", " ", regex=True))
+    parts = text.str.partition(" ")
+    has_rest = parts[1] == " "
+    non_empty = text != ""
+
+    last[valid] = parts[2].where(has_rest, parts[0]).where(non_empty, None)
+    first[valid] = parts[0].where(has_rest & non_empty, None)
+    return last, first
+
+
+def _union_infer(*parts):
+    """
+    Concatène des DataFrames (mêmes colonnes) avec les dtypes qu'aurait inférés
+    pd.DataFrame(rows) sur les lignes unies : les colonnes de même dtype non-object
+    sont concaténées telles quelles, les autres passent par object + inférence.
+    """
+    columns = {}
+    for c in parts[0].columns:
+        series = [p[c] for p in parts]
+        dtypes = {str(s.dtype) for s in series}
+        if len(dtypes) == 1 and series[0].dtype != object:
+            columns[c] = pd.concat(series, ignore_index=True)
+        else:
+            columns[c] = pd.concat([s.astype(object) for s in series], ignore_index=True).infer_objects()
+    return pd.DataFrame(columns)
+
+
+def _employee_codes(employee_ids):
+    """EMP_<id> pour chaque EmployeeID non nul (entiers nullables), None sinon."""
+    ids = pd.to_numeric(employee_ids, errors='coerce').astype('Int64')
+    return ('EMP_' + ids.astype(str)).astype(object).where(ids.notna(), None)
+
+
 # ---------- BUILD DimCustomer ----------
+@instrumented()
 def build_dim_customer(sql_customers, excel_customers):
     """
-    Construit DimCustomer en unifiant SQL et Excel.
+    Construit DimCustomer en unifiant SQL et Excel (version vectorisée).
     - CustomerCode : natural key unifiée (SQL garde son CustomerID string, Excel reçoit préfixe EX_)
     - Sépare Company / LastName / FirstName si possible
     Retourne DataFrame dim_customer avec une clé surrogate CustomerID_local (commence à 1).
+    Résultat identique à build_dim_customer_rowwise.
     """
     print("👥 Construction de DimCustomer...")
 
+    df_sql = sql_customers
+    df_xls = excel_customers
+
+    # Codes : SQL garde son CustomerID, Excel reçoit le préfixe EX_
+    if 'CustomerID' in df_sql.columns:
+        sql_codes = df_sql['CustomerID'].astype(str)
+    else:
+        sql_codes = pd.Series("SQL_" + df_sql.index.astype(str), index=df_sql.index)
+
+    if 'CustomerID' in df_xls.columns:
+        xls_codes = 'EX_' + df_xls['CustomerID'].astype(str)
+    else:
+        xls_codes = pd.Series("EX_" + df_xls.index.astype(str), index=df_xls.index)
+
+    # SQL : ContactName découpé en LastName / FirstName
+    sql_last, sql_first = _split_contact_names(_coalesce_or(df_sql, ['ContactName'], none_last=True))
+    part_sql = pd.DataFrame({
+        'CustomerCode': sql_codes,
+        'Company': _coalesce_or(df_sql, ['CompanyName', 'Company'], none_last=True),
+        'LastName': sql_last,
+        'FirstName': sql_first,
+        'City': _column_or_none(df_sql, 'City'),
+        'StateProvince': _coalesce_or(df_sql, ['Region', 'StateProvince']),
+        'CountryRegion': _column_or_none(df_sql, 'Country'),
+    })
+
+    # Excel
+    part_xls = pd.DataFrame({
+        'CustomerCode': xls_codes,
+        'Company': _coalesce_or(df_xls, ['CompanyName', 'Company'], none_last=True),
+        'LastName': _column_or_none(df_xls, 'LastName'),
+        'FirstName': _column_or_none(df_xls, 'FirstName'),
+        'City': _column_or_none(df_xls, 'City'),
+        'StateProvince': _column_or_none(df_xls, 'StateProvince'),
+        'CountryRegion': _coalesce_or(df_xls, ['CountryRegion', 'Country/Region', 'Country']),
+    })
+
+    # Union (colonnes en object puis inférence : mêmes dtypes que pd.DataFrame(rows))
+    df_customers_all = _union_infer(part_sql, part_xls)
+
+    # Dé-duplication par CustomerCode (garder la première apparition)
+    df_customers_all.drop_duplicates(subset=['CustomerCode'], inplace=True)
+
+    df_customers_all = df_customers_all.reset_index(drop=True)
+    df_customers_all['CustomerID_local'] = df_customers_all.index + 1  # commence à 1
+
+    dim_customer = df_customers_all[['CustomerID_local', 'CustomerCode', 'Company', 'LastName', 'FirstName', 'City', 'StateProvince', 'CountryRegion']]
+
+    print(f"   ▶ DimCustomer : {len(dim_customer)} lignes (après unification).")
+    return dim_customer
+
+
+def build_dim_customer_rowwise(sql_customers, excel_customers):
+    """
+    Implémentation d'origine (iterrows + split_contact), conservée comme
+    référence pour les contrôles d'équivalence et les benchmarks.
+    """
+    print("👥 Construction de DimCustomer (ligne à ligne)...")
+
     # Préparer copies
     df_sql = sql_customers.copy()
     df_xls = excel_customers.copy()
@@ -408,9 +1092,53 @@ def build_dim_customer(sql_customers, excel_customers):
 
 
 # ---------- BUILD DimEmployee ----------
+@instrumented()
 def build_dim_employee(sql_employees, excel_employees):
+    """
+    Construit DimEmployee en unifiant SQL et Excel (version vectorisée).
+    EmployeeCode = EMP_<EmployeeID>, SQL prioritaire en cas de doublon.
+    Résultat identique à build_dim_employee_rowwise.
+    """
     print("👤 Construction de DimEmployee...")
 
+    parts = []
+    for df, country_cols in [(sql_employees, ['Country']),
+                             (excel_employees, ['CountryRegion', 'Country'])]:
+        if 'EmployeeID' not in df.columns:
+            continue
+        emp_orig = df['EmployeeID'].astype('int64')     # ID original (même clé naturelle)
+        parts.append(pd.DataFrame({
+            'EmployeeID_orig': emp_orig,
+            'EmployeeCode': 'EMP_' + emp_orig.astype(str),
+            'LastName': _column_or_none(df, 'LastName'),
+            'FirstName': _column_or_none(df, 'FirstName'),
+            'JobTitle': _coalesce_or(df, ['Title', 'JobTitle']),
+            'City': _column_or_none(df, 'City'),
+            'CountryRegion': _coalesce_or(df, country_cols),
+        }))
+
+    # ========== DÉDOUBLONNAGE & SURROGATE ==========
+    df_emps_all = _union_infer(*parts)
+    df_emps_all.drop_duplicates(subset=['EmployeeCode'], inplace=True)
+    df_emps_all = df_emps_all.reset_index(drop=True)
+    df_emps_all['EmployeeID_local'] = df_emps_all.index + 1
+
+    dim_employee = df_emps_all[
+        ['EmployeeID_local', 'EmployeeID_orig', 'EmployeeCode',
+         'LastName', 'FirstName', 'JobTitle', 'City', 'CountryRegion']
+    ]
+
+    print(f"   ▶ DimEmployee : {len(dim_employee)} lignes (après unification).")
+    return dim_employee
+
+
+def build_dim_employee_rowwise(sql_employees, excel_employees):
+    """
+    Implémentation d'origine (iterrows), conservée comme référence
+    pour les contrôles d'équivalence et les benchmarks.
+    """
+    print("👤 Construction de DimEmployee (ligne à ligne)...")
+
     df_sql = sql_employees.copy()
     df_xls = excel_employees.copy()
 
@@ -463,14 +1191,73 @@ def build_dim_employee(sql_employees, excel_employees):
     return dim_employee
 
 # ---------- BUILD DimOrder ----------
+@instrumented()
 def build_dim_order(sql_orders, excel_orders):
     """
-    Construire DimOrder en unifiant SQL et Excel:
-    - OrderID (natural key) : on garde tel quel (ton DW attend int)
-    - CustomerCode, EmployeeCode (natural keys)
-    - OrderDate, ShippedDate, StatusID
+    Construire DimOrder en unifiant SQL et Excel (version vectorisée) :
+    - OrderID (natural key) : on garde tel quel (ton DW attend int)
+    - CustomerCode, EmployeeCode (natural keys)
+    - OrderDate, ShippedDate, StatusID
+    Dates converties par colonne (formats mixtes gérés valeur par valeur, voir
+    _to_datetime_values), codes construits par colonne, SQL avant Excel
+    (drop_duplicates garde la première occurrence) : résultat identique à
+    build_dim_order_rowwise.
+    """
+    print("📦 Construction de DimOrder (préparation)...")
+
+    columns = ['OrderID', 'CustomerCode', 'EmployeeCode', 'OrderDate', 'ShippedDate', 'StatusID']
+    parts = []
+
+    # SQL orders : CustomerID est déjà un code ('ALFKI')
+    if not sql_orders.empty:
+        parts.append(pd.DataFrame({
+            'OrderID': sql_orders['OrderID'].astype('int64'),
+            'CustomerCode': _column_or_none(sql_orders, 'CustomerID'),
+            'EmployeeCode': _employee_codes(_column_or_none(sql_orders, 'EmployeeID')),
+            'OrderDate': _to_datetime_values(_column_or_none(sql_orders, 'OrderDate')),
+            'ShippedDate': _to_datetime_values(_column_or_none(sql_orders, 'ShippedDate')),
+            'StatusID': _column_or_none(sql_orders, 'StatusID'),
+        }))
+
+    # Excel orders : CustomerID numérique -> EX_<id> comme pour DimCustomer
+    if not excel_orders.empty:
+        cust_ids = pd.to_numeric(_column_or_none(excel_orders, 'CustomerID'), errors='coerce').astype('Int64')
+        shipped_col = 'ShippedDate' if 'ShippedDate' in excel_orders.columns else 'Shipped Date'
+        status_col = 'Status ID' if 'Status ID' in excel_orders.columns else 'StatusID'
+        parts.append(pd.DataFrame({
+            'OrderID': excel_orders['OrderID'].astype('int64'),
+            'CustomerCode': ('EX_' + cust_ids.astype(str)).astype(object).where(cust_ids.notna(), None),
+            'EmployeeCode': _employee_codes(_column_or_none(excel_orders, 'EmployeeID')),
+            'OrderDate': _to_datetime_values(_column_or_none(excel_orders, 'OrderDate')),
+            'ShippedDate': _to_datetime_values(_column_or_none(excel_orders, shipped_col)),
+            'StatusID': _column_or_none(excel_orders, status_col),
+        }))
+
+    if not parts:
+        # Aucun Order (ex. extraction incrémentale sans nouveauté) : colonnes typées,
+        # pour que build_fact_table produise une table de faits vide
+        parts = [pd.DataFrame({'OrderID': pd.Series(dtype='int64'), 'CustomerCode': pd.Series(dtype=object),
+                               'EmployeeCode': pd.Series(dtype=object),
+                               'OrderDate': pd.Series(dtype='datetime64[ns]'),
+                               'ShippedDate': pd.Series(dtype='datetime64[ns]'),
+                               'StatusID': pd.Series(dtype=object)})]
+    df_orders_all = _union_infer(*parts)
+
+    # Deduplicate by OrderID if necessary (keep first)
+    df_orders_all.drop_duplicates(subset=['OrderID'], inplace=True)
+
+    dim_order = df_orders_all[columns]
+
+    print(f"   ▶ DimOrder (préparé) : {len(dim_order)} lignes (après union).")
+    return dim_order
+
+
+def build_dim_order_rowwise(sql_orders, excel_orders):
+    """
+    Implémentation d'origine (iterrows + pd.to_datetime par valeur), conservée
+    comme référence pour les contrôles d'équivalence et les benchmarks.
     """
-    print("📦 Construction de DimOrder (préparation)...")
+    print("📦 Construction de DimOrder (préparation, ligne à ligne)...")
 
     rows = []
 
@@ -508,7 +1295,8 @@ def build_dim_order(sql_orders, excel_orders):
             'StatusID': r.get('Status ID') if 'Status ID' in r.index else r.get('StatusID')
         })
 
-    df_orders_all = pd.DataFrame(rows)
+    df_orders_all = pd.DataFrame(rows, columns=['OrderID', 'CustomerCode', 'EmployeeCode',
+                                                'OrderDate', 'ShippedDate', 'StatusID'])
 
     # Deduplicate by OrderID if necessary (keep first)
     df_orders_all.drop_duplicates(subset=['OrderID'], inplace=True)
@@ -523,6 +1311,7 @@ def build_dim_order(sql_orders, excel_orders):
 
 
 
+@instrumented()
 def build_dim_region(df_region_sql):
     """
     Build DimRegion with:
@@ -551,6 +1340,7 @@ def build_dim_region(df_region_sql):
 
 
 
+@instrumented()
 def build_dim_territory(df_territory):
     dim_territory = df_territory.copy()
     dim_territory.rename(columns={
@@ -567,11 +1357,14 @@ def build_dim_territory(df_territory):
     return dim_territory
 
 
+@instrumented()
 def build_fact_table(dim_order, dim_customer, dim_employee, dim_date, sql_data):
     """
     Construit la table de faits avec RegionID et TerritoryID.
     """
-    df = dim_order.copy()
+    # Seules les colonnes utiles de DimOrder sont fusionnées (les merges produisent
+    # déjà de nouveaux DataFrames : pas de copie préalable)
+    df = dim_order[['OrderID', 'CustomerCode', 'EmployeeCode', 'OrderDate', 'ShippedDate']]
 
     # Merge Customer
     df = df.merge(dim_customer[['CustomerID_local', 'CustomerCode']],
@@ -585,8 +1378,9 @@ def build_fact_table(dim_order, dim_customer, dim_employee, dim_date, sql_data):
     df['OrdersDelivered'] = df['ShippedDate'].notna().astype(int)
     df['OrdersNotDelivered'] = (~df['ShippedDate'].notna()).astype(int)
 
-    # DateKey
-    df['DateKey'] = df['OrderDate'].dt.strftime('%Y%m%d').astype('Int64')
+    # DateKey (YYYYMMDD calculé en entiers, sans passer par des chaînes)
+    order_dates = df['OrderDate'].dt
+    df['DateKey'] = (order_dates.year * 10000 + order_dates.month * 100 + order_dates.day).astype('Int64')
 
     # Merge Territory via EmployeeID_orig
     df_empTerr = sql_data['employee_territories'].copy()
@@ -634,10 +1428,103 @@ def build_fact_table(dim_order, dim_customer, dim_employee, dim_date, sql_data):
 
 
 
-def transform_pipeline(sql_data, excel_data, date_min_override=None, date_max_override=None):
+# ---------- UTIL — représentation compacte (mémoire) ----------
+COMPACT_CATEGORY_RATIO = 0.5   # texte -> category si valeurs distinctes <= 50 % des lignes
+_INT_DTYPES = [(8, 'int8', 'Int8'), (16, 'int16', 'Int16'), (32, 'int32', 'Int32'), (64, 'int64', 'Int64')]
+
+
+def _is_key_column(col):
+    """Clés (ID, DateKey, clés locales) : jamais en dessous de 32 bits."""
+    return col.endswith(('ID', 'Key', '_local', '_orig'))
+
+
+def _downcast_int(s, min_bits=8):
+    """Plus petit type entier (numpy ou nullable) contenant les valeurs de s."""
+    nullable = isinstance(s.dtype, pd.api.extensions.ExtensionDtype)
+    values = s.dropna()
+    lo, hi = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for bits, np_dtype, nullable_dtype in _INT_DTYPES:
+        info = np.iinfo(np_dtype)
+        if bits >= min_bits and info.min <= lo and hi <= info.max:
+            return s.astype(nullable_dtype if nullable else np_dtype)
+    return s
+
+
+def compact_frame(df, category_ratio=COMPACT_CATEGORY_RATIO):
+    """
+    Représentation compacte d'un DataFrame (mêmes valeurs, moins de mémoire) :
+    - entiers réduits au plus petit type (32 bits minimum pour les clés, DateKey en int32),
+      y compris les entiers stockés en float à cause des NaN
+    - colonnes texte répétitives encodées en category (dictionnaire + codes)
+    Dates, booléens et flottants sont conservés.
+    """
+    columns = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype):
+            columns[col] = s
+        elif pd.api.types.is_integer_dtype(s):
+            columns[col] = _downcast_int(s, min_bits=32 if _is_key_column(col) else 8)
+        elif pd.api.types.is_float_dtype(s) and s.dropna().mod(1).eq(0).all():
+            # Entiers stockés en float à cause des NaN (ex. StatusID) -> entier nullable
+            columns[col] = _downcast_int(s.astype('Int64'), min_bits=32 if _is_key_column(col) else 8)
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            n_unique = s.nunique(dropna=True)
+            columns[col] = s.astype('category') if len(s) and n_unique <= category_ratio * len(s) else s
+        else:
+            columns[col] = s
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_report(frames):
+    """Mémoire réelle (deep) de chaque DataFrame, en Mo."""
+    return pd.DataFrame([
+        {'frame': name, 'rows': len(df), 'mb': round(df.memory_usage(deep=True).sum() / 2**20, 3)}
+        for name, df in frames.items()
+    ])
+
+
+def print_memory_report(before, after):
+    """Affiche la mémoire avant / après compaction, par DataFrame et au total."""
+    report = before.merge(after[['frame', 'mb']], on='frame', suffixes=('_before', '_after'))
+    total = pd.DataFrame([{'frame': 'TOTAL', 'rows': report['rows'].sum(),
+                           'mb_before': report['mb_before'].sum(), 'mb_after': report['mb_after'].sum()}])
+    report = pd.concat([report, total], ignore_index=True)
+    report['ratio'] = (report['mb_after'] / report['mb_before'].where(report['mb_before'] > 0)).round(3)
+    print("\n🧮 Mémoire (représentation compacte) :")
+    print(report.to_string(index=False))
+    return report
+
+
+def _finish_pipeline(dims, sql_data, compact):
+    """
+    Étape commune aux pipelines : table de faits, avec la représentation compacte
+    des dimensions (avant build_fact_table) et de la fact si compact=True.
+    """
+    if compact:
+        before = memory_report(dims)
+        dims = {name: compact_frame(df) for name, df in dims.items()}
+
+    df_fact = build_fact_table(dims['dim_order'], dims['dim_customer'], dims['dim_employee'],
+                               dims['dim_date'], sql_data)
+
+    if compact:
+        before = pd.concat([before, memory_report({'fact': df_fact})], ignore_index=True)
+        df_fact = compact_frame(df_fact)
+        print_memory_report(before, memory_report({**dims, 'fact': df_fact}))
+
+    return dims, df_fact
+
+
+@instrumented()
+def transform_pipeline(sql_data, excel_data, date_min_override=None, date_max_override=None,
+                       compact=False, fiscal_year_start_month=None, iso_week=False):
     """
     Orchestrateur complet de transformation.
     Prépare les dimensions et la table de faits.
+    compact=True : dimensions et faits en représentation compacte (voir compact_frame)
+    avec rapport mémoire avant / après.
+    fiscal_year_start_month / iso_week : attributs optionnels de DimDate (voir build_calendar).
     """
     print("===== START TRANSFORM PIPELINE =====")
 
@@ -649,14 +1536,12 @@ def transform_pipeline(sql_data, excel_data, date_min_override=None, date_max_ov
     dim_order = build_dim_order(sql_data['orders'], excel_data['orders'])
     dim_date = build_dim_date(sql_data['orders'], excel_data['orders'],
                               min_override=date_min_override,
-                              max_override=date_max_override)
+                              max_override=date_max_override,
+                              fiscal_year_start_month=fiscal_year_start_month,
+                              iso_week=iso_week)
     dim_region = build_dim_region(sql_data['region'])
     dim_territory = build_dim_territory(sql_data['territories'])
 
-    # ------ Fact table
-    df_fact = build_fact_table(dim_order, dim_customer, dim_employee, dim_date, sql_data)
-
-    # ------ Retourner les dims + facts
     dims = {
         'dim_date': dim_date,
         'dim_customer': dim_customer,
@@ -666,16 +1551,107 @@ def transform_pipeline(sql_data, excel_data, date_min_override=None, date_max_ov
         'dim_territory': dim_territory
     }
 
+    # ------ Fact table (+ représentation compacte) et retour des dims + facts
+    dims, df_fact = _finish_pipeline(dims, sql_data, compact)
+
     print("===== END TRANSFORM PIPELINE =====")
     return dims, df_fact
 
 
+@instrumented()
+def transform_pipeline_streaming(sql_data, excel_data, date_min_override=None, date_max_override=None,
+                                 compact=False, fiscal_year_start_month=None, iso_week=False):
+    """
+    Variante de transform_pipeline pour le mode streaming :
+    sql_data['orders'] est un générateur de DataFrames (voir extract_sql_server_data_streaming).
+    Chaque bloc d'Orders est réduit en DimOrder dès sa lecture, et seules les bornes
+    de dates sont conservées pour DimDate : le brut Orders n'est jamais matérialisé.
+    Résultat identique à transform_pipeline (SQL avant Excel, premier OrderID gardé).
+    Limite : la mémoire reste bornée pour le brut Orders seulement ; DimOrder (6 colonnes),
+    l'ensemble des OrderID vus et la table de faits restent entiers en mémoire
+    (proportionnels au nombre de commandes).
+    Aucun bloc ni Order Excel (ex. --incremental sans nouveauté) : DimOrder vide.
+    """
+    print("===== START TRANSFORM PIPELINE (STREAMING) =====")
+
+    excel_data = harmonize_excel_columns(excel_data)
+    excel_orders = excel_data['orders']
+
+    # ------ Dimensions (petites tables, déjà matérialisées)
+    dim_customer = build_dim_customer(sql_data['customers'], excel_data['customers'])
+    dim_employee = build_dim_employee(sql_data['employees'], excel_data['employees'])
+    dim_region = build_dim_region(sql_data['region'])
+    dim_territory = build_dim_territory(sql_data['territories'])
+
+    # ------ DimOrder bloc par bloc
+    seen_order_ids = set()
+    order_parts = []
+    date_min, date_max = None, None
+
+    for chunk in sql_data['orders']:
+        if chunk.empty:
+            continue
+
+        part = build_dim_order(chunk, excel_orders.iloc[0:0])
+        part = part[~part['OrderID'].isin(seen_order_ids)]
+        seen_order_ids.update(part['OrderID'].tolist())
+        order_parts.append(part)
+
+        # Bornes de dates pour DimDate
+        low, high = _date_bounds(chunk)
+        if low is not None:
+            date_min = low if date_min is None else min(date_min, low)
+            date_max = high if date_max is None else max(date_max, high)
+
+    # Excel après SQL (même priorité que build_dim_order)
+    if not excel_orders.empty:
+        part = build_dim_order(pd.DataFrame(), excel_orders)
+        order_parts.append(part[~part['OrderID'].isin(seen_order_ids)])
+
+    # infer_objects : mêmes dtypes que la construction en un seul bloc
+    if order_parts:
+        dim_order = pd.concat(order_parts, ignore_index=True).infer_objects()
+    else:
+        dim_order = build_dim_order(pd.DataFrame(), pd.DataFrame())
+    dim_order = dim_order[['OrderID', 'CustomerCode', 'EmployeeCode', 'OrderDate', 'ShippedDate', 'StatusID']]
+    print(f"   ▶ DimOrder (streaming) : {len(dim_order)} lignes (après union).")
+
+    sql_date_bounds = pd.DataFrame({'OrderDate': [date_min, date_max]}) if date_min is not None else pd.DataFrame()
+    if dim_order.empty and date_min is None and _date_bounds(excel_orders)[0] is None:
+        # Aucune date : DimDate vide (mêmes colonnes), rien à charger
+        today = pd.Timestamp.today().normalize()
+        dim_date = build_calendar(today, today, fiscal_year_start_month=fiscal_year_start_month,
+                                  iso_week=iso_week).iloc[0:0]
+    else:
+        dim_date = build_dim_date(sql_date_bounds, excel_orders,
+                                  min_override=date_min_override,
+                                  max_override=date_max_override,
+                                  fiscal_year_start_month=fiscal_year_start_month,
+                                  iso_week=iso_week)
+
+    dims = {
+        'dim_date': dim_date,
+        'dim_customer': dim_customer,
+        'dim_employee': dim_employee,
+        'dim_order': dim_order,
+        'dim_region': dim_region,
+        'dim_territory': dim_territory
+    }
+
+    # ------ Fact table (+ représentation compacte)
+    dims, df_fact = _finish_pipeline(dims, sql_data, compact)
+
+    print("===== END TRANSFORM PIPELINE (STREAMING) =====")
+    return dims, df_fact
+
+
 
 
 
 
 
 # ---------- TESTS ET CONTRÔLES ----------
+@instrumented()
 def run_transformation_tests(dims, df_fact, sql_data, excel_data):
     """
     Exécute une série de tests/contrôles pour valider la transformation.
@@ -770,16 +1746,73 @@ def run_transformation_tests(dims, df_fact, sql_data, excel_data):
 # 1️⃣ Chargement complet dans le Data Warehouse
 # ------------------------------
 
-def load_dimension(cursor, table_name, df, natural_key, id_col=None):
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _to_db_rows(df):
     """
-    Charge une dimension dans la base de données.
-    Évite les doublons et les problèmes de types.
+    Convertit un DataFrame en liste de tuples de types Python natifs
+    (int, float, datetime, str, None), colonne par colonne.
+    """
+    columns = []
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            # Valeurs positionnelles : to_pydatetime peut renvoyer une Series réindexée
+            values = pd.Series(np.asarray(s.dt.to_pydatetime(), dtype=object), index=s.index, dtype=object)
+        else:
+            values = s.astype(object)
+        columns.append(values.where(s.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+def _insert_frame(cursor, table_name, df, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    INSERT en masse des lignes de df (colonnes = colonnes de la table).
+    DuckDB lit directement le DataFrame (un seul INSERT ... SELECT) ;
+    sinon executemany par lots (fast_executemany sous pyodbc).
+    Retourne le nombre de lignes envoyées.
     """
-    print(f"🔹 Chargement de {table_name}...")
+    if df.empty:
+        return 0
+    columns = ", ".join(df.columns)
+
+    if _sql_dialect(cursor) == 'duckdb':
+        cursor.register('nw_bulk_frame', df)
+        try:
+            cursor.execute(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM nw_bulk_frame")
+        finally:
+            cursor.unregister('nw_bulk_frame')
+        return len(df)
+
+    placeholders = ", ".join(["?"] * len(df.columns))
+    insert_sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+
+    rows = _to_db_rows(df)
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(insert_sql, rows[i:i + batch_size])
+    return len(rows)
+
+
+def _table_columns(cursor, table_name):
+    """Noms des colonnes d'une table du DW (INFORMATION_SCHEMA, ou pragma sous SQLite / DuckDB)."""
+    if _sql_dialect(cursor) in ('sqlite', 'duckdb'):
+        cursor.execute(f"SELECT name FROM pragma_table_info('{table_name}')")
+    else:
+        cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME='{table_name}'")
+    return [row[0] for row in cursor.fetchall()]
+
 
+def _prepare_dimension(cursor, table_name, df, natural_key, id_col):
+    """
+    Étapes communes aux deux modes de chargement : colonnes présentes dans la table,
+    clé naturelle non nulle, conversions spéciales.
+    """
     # 1️⃣ Colonnes existantes dans la table
-    cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME='{table_name}'")
-    valid_columns = [row[0] for row in cursor.fetchall()]
+    valid_columns = _table_columns(cursor, table_name)
 
     df_to_insert = df[[col for col in df.columns if col in valid_columns]].copy()
 
@@ -794,10 +1827,62 @@ def load_dimension(cursor, table_name, df, natural_key, id_col=None):
     elif id_col == 'DateKey' and 'DateKey' in df_to_insert.columns:
         df_to_insert['DateKey'] = df_to_insert['DateKey'].astype('Int64')
 
+    return df_to_insert
+
+
+@instrumented(label_arg='table_name')
+def load_dimension(cursor, table_name, df, natural_key, id_col=None, mode='bulk',
+                   batch_size=DEFAULT_BATCH_SIZE, scd_type=None, load_date=None):
+    """
+    Charge une dimension dans la base de données.
+    Évite les doublons et les problèmes de types.
+    mode='bulk' (défaut) : clés existantes lues en une requête, anti-jointure pandas,
+    puis INSERT par lots (executemany / fast_executemany).
+    mode='rowwise' : ancien chargement ligne à ligne (SELECT + INSERT par ligne).
+    scd_type : 1 ou 2 pour mettre aussi à jour les membres modifiés (mode bulk,
+    voir upsert_dimension) ; None = nouveaux membres seulement.
+    Retourne le nombre de lignes insérées.
+    """
+    if mode == 'rowwise':
+        return load_dimension_rowwise(cursor, table_name, df, natural_key, id_col)
+    if scd_type:
+        return upsert_dimension(cursor, table_name, df, natural_key, id_col, scd_type=scd_type,
+                                load_date=load_date, batch_size=batch_size)['inserted']
+
+    print(f"🔹 Chargement de {table_name} (bulk)...")
+    start = time.perf_counter()
+
+    df_to_insert = _prepare_dimension(cursor, table_name, df, natural_key, id_col)
+
+    # 4️⃣ Anti-jointure sur les clés naturelles déjà chargées (une seule requête)
+    cursor.execute(f"SELECT {natural_key} FROM {table_name}")
+    existing_keys = pd.Series([row[0] for row in cursor.fetchall()], dtype=object)
+
+    df_to_insert = df_to_insert.drop_duplicates(subset=[natural_key])
+    df_new = df_to_insert[~df_to_insert[natural_key].isin(existing_keys)]
+
+    # 5️⃣ Insertion par lots
+    inserted_count = _insert_frame(cursor, table_name, df_new, batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {inserted_count} lignes insérées dans {table_name} "
+          f"({len(df_to_insert) / max(elapsed, 1e-9):,.0f} lignes/s traitées).")
+    return inserted_count
+
+
+def load_dimension_rowwise(cursor, table_name, df, natural_key, id_col=None):
+    """
+    Chargement d'origine ligne à ligne (un SELECT + un INSERT par membre),
+    conservé comme mode de repli.
+    """
+    print(f"🔹 Chargement de {table_name} (ligne à ligne)...")
+    start = time.perf_counter()
+
+    df_to_insert = _prepare_dimension(cursor, table_name, df, natural_key, id_col)
+
     # 4️⃣ Insertion avec gestion doublons et types
     inserted_count = 0
     for _, row in df_to_insert.iterrows():
-        cursor.execute(f"SELECT {id_col} FROM {table_name} WHERE {natural_key} = ?", row[natural_key])
+        cursor.execute(f"SELECT {id_col} FROM {table_name} WHERE {natural_key} = ?", (row[natural_key],))
         if cursor.fetchone():
             continue
 
@@ -815,16 +1900,376 @@ def load_dimension(cursor, table_name, df, natural_key, id_col=None):
         cursor.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})", values)
         inserted_count += 1
 
-    print(f"✅ {inserted_count} lignes insérées dans {table_name}.")
+    elapsed = time.perf_counter() - start
+    print(f"✅ {inserted_count} lignes insérées dans {table_name} "
+          f"({len(df_to_insert) / max(elapsed, 1e-9):,.0f} lignes/s traitées).")
+    return inserted_count
+
+
+
+
+# ---------- UPSERT DES DIMENSIONS (SCD type 1 / 2) ----------
+
+# Colonnes techniques des dimensions suivies (hors attributs hachés)
+SCD_COLUMNS = ['RowHash', 'ValidFrom', 'ValidTo', 'IsCurrent']
+DEFAULT_SCD_TYPE = 1
+
+
+def _attribute_hashes(df, columns):
+    """
+    Empreinte des attributs de chaque membre en BIGINT signé (stockée dans RowHash).
+    Les valeurs sont hachées sous forme de texte : l'empreinte ne dépend pas des
+    types pandas du run (category, entiers réduits, str / object).
+    """
+    return row_fingerprints(df[columns].astype('string'), columns).to_numpy().view(np.int64)
+
+
+def _stage_members(cursor, table_name, staging, df, dialect, batch_size):
+    """Table temporaire staging (mêmes colonnes que df, types de table_name) remplie avec df."""
+    columns = ", ".join(df.columns)
+    if dialect == 'mssql':
+        cursor.execute(f"IF OBJECT_ID('tempdb..{staging}') IS NOT NULL DROP TABLE {staging}")
+        cursor.execute(f"SELECT {columns} INTO {staging} FROM {table_name} WHERE 1 = 0")
+    else:
+        cursor.execute(f"DROP TABLE IF EXISTS temp.{staging}")
+        cursor.execute(f"CREATE TEMP TABLE {staging} AS SELECT {columns} FROM {table_name} WHERE 1 = 0")
+    _insert_frame(cursor, staging, df, batch_size)
+
+
+def _update_from_staging(cursor, table_name, staging, natural_key, assignments, dialect, params=(),
+                         current_only=True):
+    """
+    Un seul UPDATE ensembliste des versions courantes de table_name jointes à staging
+    sur la clé naturelle. assignments : { colonne : expression (alias s = staging, ? = params) }.
+    current_only=False : toutes les lignes jointes (table sans colonne IsCurrent).
+    Retourne le nombre de lignes modifiées.
+    """
+    if dialect == 'mssql':
+        sets = ", ".join(f"d.{col} = {expr}" for col, expr in assignments.items())
+        cursor.execute(f"UPDATE d SET {sets} FROM {table_name} d "
+                       f"JOIN {staging} s ON d.{natural_key} = s.{natural_key}"
+                       + (" WHERE d.IsCurrent = 1" if current_only else ""),
+                       list(params))
+    else:
+        # UPDATE ... FROM (SQLite >= 3.33, DuckDB)
+        sets = ", ".join(f"{col} = {expr}" for col, expr in assignments.items())
+        cursor.execute(f"UPDATE {table_name} SET {sets} FROM temp.{staging} AS s "
+                       f"WHERE {table_name}.{natural_key} = s.{natural_key}"
+                       + (f" AND {table_name}.IsCurrent = 1" if current_only else ""),
+                       list(params))
+    return _affected_rows(cursor, dialect)
+
+
+@instrumented(label_arg='table_name')
+def upsert_dimension(cursor, table_name, df, natural_key, id_col=None, scd_type=DEFAULT_SCD_TYPE,
+                     load_date=None, dialect=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Chargement d'une dimension avec détection des changements.
+    L'empreinte des attributs de chaque membre (_attribute_hashes) est comparée à
+    RowHash des versions courantes du DW, lues en une requête :
+      - membre absent            -> INSERT (nouvelle version courante, ValidFrom = load_date) ;
+      - empreinte différente     -> scd_type=1 : UPDATE des attributs en place ;
+                                    scd_type=2 : version courante fermée (ValidTo = load_date,
+                                    IsCurrent = 0) puis INSERT de la nouvelle version ;
+      - RowHash NULL (DW chargé avant le suivi des changements) -> UPDATE en place.
+    Seuls les membres modifiés sont copiés en staging ; chaque mise à jour est un
+    UPDATE ensembliste unique. Sans colonnes SCD dans la table (DW plus ancien),
+    seuls les nouveaux membres sont insérés (load_dimension).
+    load_date : date de validité des versions (défaut : aujourd'hui).
+    Retourne { 'inserted', 'updated', 'versioned', 'unchanged' }.
+    """
+    if scd_type not in (1, 2):
+        raise ValueError(f"scd_type doit valoir 1 ou 2 (reçu : {scd_type})")
+
+    table_columns = _table_columns(cursor, table_name)
+    if not set(SCD_COLUMNS) <= set(table_columns):
+        print(f"⚠️ {table_name} sans colonnes {', '.join(SCD_COLUMNS)} : nouveaux membres seulement")
+        inserted = load_dimension(cursor, table_name, df, natural_key, id_col, batch_size=batch_size)
+        return {'inserted': inserted, 'updated': 0, 'versioned': 0, 'unchanged': None}
+
+    dialect = dialect or _sql_dialect(cursor)
+    load_date = (pd.Timestamp(load_date) if load_date is not None else pd.Timestamp.now()).normalize()
+    print(f"🔹 Chargement de {table_name} (upsert SCD type {scd_type})...")
+    start = time.perf_counter()
+
+    members = _prepare_dimension(cursor, table_name, df, natural_key, id_col)
+    members = members.drop_duplicates(subset=[natural_key])
+    attributes = [c for c in members.columns if c not in (natural_key, id_col)]
+    members['RowHash'] = _attribute_hashes(members, attributes)
+
+    # Empreintes des versions courantes (une seule requête)
+    cursor.execute(f"SELECT {natural_key}, RowHash FROM {table_name} WHERE IsCurrent = 1")
+    current = pd.DataFrame.from_records(cursor.fetchall(), columns=[natural_key, 'RowHash'])
+    current = current.drop_duplicates(subset=[natural_key], keep='last').set_index(natural_key)['RowHash']
+    current = current.astype('Int64')   # entier nullable : pas de passage par float64 (précision)
+
+    known = members[natural_key].isin(current.index).to_numpy()
+    stored_hash = current.reindex(members[natural_key])
+    no_hash = known & stored_hash.isna().to_numpy()
+    changed = known & ~no_hash & (stored_hash.fillna(0).astype('int64').to_numpy() != members['RowHash'].to_numpy())
+
+    in_place = no_hash | changed if scd_type == 1 else no_hash
+    new_versions = ~known | changed if scd_type == 2 else ~known
+    staging = "#Dim_staging" if dialect == 'mssql' else "Dim_staging"
+    result = {'inserted': 0, 'updated': 0, 'versioned': 0,
+              'unchanged': int((known & ~no_hash & ~changed).sum())}
+
+    # 1️⃣ Type 1 (et empreintes manquantes) : attributs et RowHash mis à jour en place
+    if in_place.any():
+        _stage_members(cursor, table_name, staging, members[in_place], dialect, batch_size)
+        assignments = {col: f"s.{col}" for col in attributes + ['RowHash']}
+        result['updated'] = _update_from_staging(cursor, table_name, staging, natural_key,
+                                                 assignments, dialect)
+
+    # 2️⃣ Type 2 : fermeture des versions courantes des membres modifiés
+    if scd_type == 2 and changed.any():
+        _stage_members(cursor, table_name, staging, members.loc[changed, [natural_key]], dialect, batch_size)
+        result['versioned'] = _update_from_staging(cursor, table_name, staging, natural_key,
+                                                   {'ValidTo': '?', 'IsCurrent': '0'}, dialect,
+                                                   params=[load_date.to_pydatetime()])
+
+    if in_place.any() or (scd_type == 2 and changed.any()):
+        cursor.execute(f"DROP TABLE {staging}" if dialect == 'mssql' else f"DROP TABLE temp.{staging}")
+
+    # 3️⃣ Nouveaux membres (et nouvelles versions en type 2)
+    df_new = members[new_versions].assign(ValidFrom=load_date, IsCurrent=1)
+    result['inserted'] = _insert_frame(cursor, table_name, df_new, batch_size)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {table_name} : {result['inserted']} insérés, {result['updated']} mis à jour, "
+          f"{result['versioned']} versions fermées, {result['unchanged']} inchangés "
+          f"({len(members) / max(elapsed, 1e-9):,.0f} lignes/s traitées).")
+    return result
+
+
+
+
+# ---------- COMMANDES MODIFIÉES (expédition, statut) ----------
+
+ORDER_UPDATE_COLUMNS = ['ShippedDate', 'StatusID']
+
+
+@instrumented()
+def update_changed_orders(cursor, dim_order, dialect=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Commandes déjà chargées dont l'expédition ou le statut a changé (extraction
+    incrémentale : fenêtre de look-back). DimOrder est chargée en insertion seule et le
+    contrôle des doublons de load_fact écarte la ligne de faits ré-extraite : sans cette
+    étape, une commande expédiée après son premier chargement resterait « non livrée ».
+      - ShippedDate / StatusID de DimOrder mis à jour en place (UPDATE ensembliste) ;
+      - OrdersDelivered / OrdersNotDelivered des faits de ces commandes recalculés
+        (mêmes règles que build_fact_table : livrée si ShippedDate renseignée).
+    Comparaison au jour près (DATE côté DW). Les agrégats des mois de ces commandes sont
+    rafraîchis ensuite par refresh_aggregates (DateKey de la table de faits du run).
+    Retourne { 'orders', 'facts' } : lignes de DimOrder et de Tabledefait modifiées.
+    """
+    result = {'orders': 0, 'facts': 0}
+    if dim_order.empty:
+        return result
+
+    dialect = dialect or _sql_dialect(cursor)
+    print("🔹 Mise à jour des commandes modifiées (DimOrder, indicateurs de livraison)...")
+    start = time.perf_counter()
+
+    incoming = _prepare_dimension(cursor, "DimOrder", dim_order, 'OrderID', 'OrderID')
+    incoming = incoming.drop_duplicates(subset=['OrderID'])[['OrderID'] + ORDER_UPDATE_COLUMNS]
+
+    cursor.execute(f"SELECT OrderID, {', '.join(ORDER_UPDATE_COLUMNS)} FROM DimOrder")
+    stored = pd.DataFrame.from_records(cursor.fetchall(), columns=['OrderID'] + ORDER_UPDATE_COLUMNS)
+    stored['OrderID'] = stored['OrderID'].astype('Int64')
+    both = incoming.merge(stored, on='OrderID', how='inner', suffixes=('', '_dw'))
+
+    def normalized(values, column):
+        if column == 'ShippedDate':
+            return pd.to_datetime(values, errors='coerce').dt.normalize()
+        return pd.to_numeric(values, errors='coerce').astype('Float64')
+
+    changed = pd.Series(False, index=both.index)
+    for col in ORDER_UPDATE_COLUMNS:
+        new, old = normalized(both[col], col), normalized(both[f"{col}_dw"], col)
+        changed |= (new.isna() != old.isna()) | (new.notna() & old.notna() & (new != old)).fillna(False)
+
+    if changed.any():
+        staging = "#DimOrder_staging" if dialect == 'mssql' else "DimOrder_staging"
+        _stage_members(cursor, "DimOrder", staging, both.loc[changed, ['OrderID'] + ORDER_UPDATE_COLUMNS],
+                       dialect, batch_size)
+        result['orders'] = _update_from_staging(cursor, "DimOrder", staging, 'OrderID',
+                                                {col: f"s.{col}" for col in ORDER_UPDATE_COLUMNS},
+                                                dialect, current_only=False)
+        result['facts'] = _update_from_staging(
+            cursor, "Tabledefait", staging, 'OrderID',
+            {'OrdersDelivered': "CASE WHEN s.ShippedDate IS NULL THEN 0 ELSE 1 END",
+             'OrdersNotDelivered': "CASE WHEN s.ShippedDate IS NULL THEN 1 ELSE 0 END"},
+            dialect, current_only=False)
+        cursor.execute(f"DROP TABLE {staging}" if dialect == 'mssql' else f"DROP TABLE temp.{staging}")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {result['orders']} commandes mises à jour dans DimOrder, {result['facts']} lignes de faits "
+          f"({len(incoming) / max(elapsed, 1e-9):,.0f} lignes/s comparées).")
+    return result
+
+
+@instrumented()
+def load_dim_date(cursor, dim_date, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Prolonge le calendrier persistant DimDate du DW au lieu de recharger chaque jour.
+    Une requête lit les bornes du calendrier existant (MIN / MAX / COUNT de DateKey) ;
+    seuls les jours manquants pour couvrir dim_date (et l'écart éventuel avec le
+    calendrier existant) sont générés par build_calendar puis insérés.
+    Un calendrier existant avec des trous est complété une fois par anti-jointure.
+    Retourne le nombre de lignes insérées.
+    """
+    print("🔹 Chargement de DimDate (calendrier incrémental)...")
+    start = time.perf_counter()
+
+    if dim_date.empty:
+        print("✅ 0 lignes insérées dans DimDate (aucune date à couvrir).")
+        return 0
+
+    options = calendar_options(dim_date)
+    first = _key_to_date(dim_date['DateKey'].min())
+    last = _key_to_date(dim_date['DateKey'].max())
+    one_day = pd.Timedelta(days=1)
+
+    cursor.execute("SELECT MIN(DateKey), MAX(DateKey), COUNT(*) FROM DimDate")
+    dw_min, dw_max, dw_count = cursor.fetchone()
+
+    if not dw_count:
+        new_days = build_calendar(first, last, **options)
+    else:
+        dw_first, dw_last = _key_to_date(dw_min), _key_to_date(dw_max)
+        if dw_count == (dw_last - dw_first).days + 1:
+            # Calendrier contigu : jours avant son début et après sa fin seulement
+            ranges = []
+            if first < dw_first:
+                ranges.append((first, dw_first - one_day))
+            if last > dw_last:
+                ranges.append((dw_last + one_day, last))
+            parts = [build_calendar(lo, hi, **options) for lo, hi in ranges]
+            new_days = pd.concat(parts, ignore_index=True) if parts else build_calendar(first, first - one_day, **options)
+        else:
+            # Calendrier avec des trous : toute la plage, moins les jours déjà présents
+            new_days = build_calendar(min(first, dw_first), max(last, dw_last), **options)
+            cursor.execute("SELECT DateKey FROM DimDate")
+            existing_keys = pd.Series([row[0] for row in cursor.fetchall()], dtype='int64')
+            new_days = new_days[~new_days['DateKey'].isin(existing_keys)]
+
+    # Attributs ISO / fiscaux insérés seulement si la table du DW les a
+    valid_columns = _table_columns(cursor, "DimDate")
+    new_days = new_days[[col for col in new_days.columns if col in valid_columns]]
+
+    inserted_count = _insert_frame(cursor, "DimDate", new_days, batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {inserted_count} lignes insérées dans DimDate "
+          f"(plage demandée {first.date()} → {last.date()}, {elapsed:.3f} s).")
+    return inserted_count
+
+
+
+
+FACT_COLUMNS = ['OrderID', 'CustomerID', 'EmployeeID', 'OrdersDelivered', 'OrdersNotDelivered',
+                'RegionID', 'TerritoryID', 'DateKey']
+# Grain métier d'une ligne de faits : sans CustomerID / EmployeeID, clés de substitution qui
+# changent quand une dimension est versionnée (SCD type 2) alors que la commande est la même.
+FACT_DEDUP_KEYS = ['OrderID', 'DateKey']
+
+
+def _sql_dialect(cursor):
+    """'sqlite' / 'duckdb' pour un DW embarqué (voir dw_backend), 'mssql' sinon (pyodbc)."""
+    cursor = getattr(cursor, 'wrapped_cursor', cursor)   # curseur instrumenté
+    module = type(cursor).__module__.split('.')[0].lstrip('_')
+    return {'sqlite3': 'sqlite', 'duckdb': 'duckdb'}.get(module, 'mssql')
 
 
+def _affected_rows(cursor, dialect):
+    """Lignes écrites par le dernier INSERT / DELETE (DuckDB ne renseigne pas rowcount)."""
+    return cursor.fetchone()[0] if dialect == 'duckdb' else cursor.rowcount
 
 
-def load_fact(cursor, df_fact):
+def _publish_staged_facts(cursor, staging, dialect):
     """
-    Charge la table de faits Tabledefait de manière robuste.
+    INSERT ... SELECT ensembliste de la staging vers Tabledefait : première occurrence
+    (plus petit StageRowID) de chaque clé du lot, absente de Tabledefait. Comme en ligne
+    à ligne, une clé contenant NULL n'est jamais considérée comme doublon.
+    staging : nom de table ou table dérivée entre parenthèses.
+    Retourne le nombre de lignes insérées.
     """
-    print("🔹 Chargement de Tabledefait...")
+    key_is_null = " OR ".join(f"s.{k} IS NULL" for k in FACT_DEDUP_KEYS)
+    key_match = " AND ".join(f"f.{k} = s.{k}" for k in FACT_DEDUP_KEYS)
+    cols = ", ".join(FACT_COLUMNS)
+    cursor.execute(f"""
+        INSERT INTO Tabledefait ({cols})
+        SELECT {", ".join(f"s.{c}" for c in FACT_COLUMNS)}
+        FROM {staging} s
+        WHERE (({key_is_null})
+               OR s.StageRowID IN (SELECT MIN(StageRowID) FROM {staging} g
+                                   GROUP BY {", ".join(FACT_DEDUP_KEYS)}))
+          AND NOT EXISTS (SELECT 1 FROM Tabledefait f WHERE {key_match})
+        ORDER BY s.StageRowID
+    """)
+    return _affected_rows(cursor, dialect)
+
+
+@instrumented()
+def load_fact(cursor, df_fact, mode='staging', dialect=None, batch_size=DEFAULT_BATCH_SIZE,
+              **partition_options):
+    """
+    Charge la table de faits Tabledefait.
+    mode='staging' (défaut) : copie par lots dans une table temporaire, puis un seul
+    INSERT ... SELECT ensembliste qui écarte les doublons (mêmes OrderID et DateKey,
+    FACT_DEDUP_KEYS) déjà présents dans Tabledefait ou dans le lot.
+    mode='rowwise' : ancien chargement ligne à ligne (SELECT + INSERT par ligne).
+    mode='partitioned' : staging par partitions, en parallèle si le backend le permet
+    (voir load_fact_partitioned ; partition_options : backend, partitions, by, workers, retries).
+    dialect : 'mssql', 'sqlite' ou 'duckdb' (détecté depuis le curseur si None).
+    Retourne (lignes insérées, lignes ignorées).
+    """
+    if mode == 'rowwise':
+        return load_fact_rowwise(cursor, df_fact)
+    if mode == 'partitioned':
+        return load_fact_partitioned(cursor, df_fact, dialect=dialect, batch_size=batch_size,
+                                     **partition_options)[:2]
+
+    dialect = dialect or _sql_dialect(cursor)
+    print(f"🔹 Chargement de Tabledefait (staging, {dialect})...")
+    start = time.perf_counter()
+
+    # 1️⃣ Table de staging temporaire (portée : la connexion)
+    if dialect == 'mssql':
+        staging = "#Tabledefait_staging"
+        cursor.execute(f"IF OBJECT_ID('tempdb..{staging}') IS NOT NULL DROP TABLE {staging}")
+        cursor.execute(f"CREATE TABLE {staging} (StageRowID INT PRIMARY KEY, "
+                       + ", ".join(f"{c} INT NULL" for c in FACT_COLUMNS) + ")")
+    else:
+        staging = "Tabledefait_staging"
+        cursor.execute(f"DROP TABLE IF EXISTS temp.{staging}")
+        cursor.execute(f"CREATE TEMP TABLE {staging} (StageRowID INTEGER PRIMARY KEY, "
+                       + ", ".join(f"{c} INTEGER" for c in FACT_COLUMNS) + ")")
+
+    # 2️⃣ Copie par lots (StageRowID conserve l'ordre d'origine)
+    df_stage = df_fact.reindex(columns=FACT_COLUMNS).astype('Int64')
+    df_stage.insert(0, 'StageRowID', np.arange(len(df_stage)))
+    _insert_frame(cursor, staging, df_stage, batch_size)
+
+    # 3️⃣ Insertion ensembliste (doublons écartés)
+    inserted_count = _publish_staged_facts(cursor, staging, dialect)
+    skipped_count = len(df_stage) - inserted_count
+
+    cursor.execute(f"DROP TABLE {staging}" if dialect == 'mssql' else f"DROP TABLE temp.{staging}")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {inserted_count} lignes insérées dans Tabledefait, {skipped_count} doublons ignorés "
+          f"({len(df_stage) / max(elapsed, 1e-9):,.0f} lignes/s traitées).")
+    return inserted_count, skipped_count
+
+
+def load_fact_rowwise(cursor, df_fact):
+    """
+    Chargement d'origine ligne à ligne (un SELECT de doublon + un INSERT par ligne),
+    conservé comme mode de repli.
+    """
+    print("🔹 Chargement de Tabledefait (ligne à ligne)...")
+    start = time.perf_counter()
 
     inserted_count = 0
 
@@ -844,8 +2289,8 @@ def load_fact(cursor, df_fact):
         # Doublon
         cursor.execute("""
             SELECT FactID FROM Tabledefait
-            WHERE OrderID=? AND CustomerID=? AND EmployeeID=? AND DateKey=?
-        """, order_id, customer_id, employee_id, date_key)
+            WHERE OrderID=? AND DateKey=?
+        """, (order_id, date_key))
         if cursor.fetchone():
             continue
 
@@ -853,154 +2298,726 @@ def load_fact(cursor, df_fact):
             INSERT INTO Tabledefait
             (OrderID, CustomerID, EmployeeID, OrdersDelivered, OrdersNotDelivered, RegionID, TerritoryID, DateKey)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, order_id, customer_id, employee_id, orders_delivered, orders_not_delivered, region_id, territory_id, date_key)
+        """, (order_id, customer_id, employee_id, orders_delivered, orders_not_delivered, region_id, territory_id, date_key))
 
         inserted_count += 1
 
-    print(f"✅ {inserted_count} lignes insérées dans Tabledefait.")
+    skipped_count = len(df_fact) - inserted_count
+    elapsed = time.perf_counter() - start
+    print(f"✅ {inserted_count} lignes insérées dans Tabledefait, {skipped_count} doublons ignorés "
+          f"({len(df_fact) / max(elapsed, 1e-9):,.0f} lignes/s traitées).")
+    return inserted_count, skipped_count
+
+
+# ---------- CHARGEMENT PARTITIONNÉ DES FAITS ----------
+
+DEFAULT_FACT_PARTITIONS = 8
+DEFAULT_PARTITION_RETRIES = 2
+DEFAULT_FACT_WORKERS = 4           # connexions de staging (+ celle du chargement : sous NW_POOL_MAX_SIZE)
+FACT_PARTITION_TABLE = "Tabledefait_part"    # une table de staging par partition : Tabledefait_part_<exécution>_<n>
+
+
+def partition_facts(df_fact, partitions=DEFAULT_FACT_PARTITIONS, by='datekey'):
+    """
+    Découpe df_fact (colonnes FACT_COLUMNS + StageRowID = ordre d'origine) en partitions :
+      by='datekey' : plages de DateKey de tailles voisines (bornes = quantiles),
+                     DateKey NULL dans la dernière partition ;
+      by='orderid' : hachage de OrderID modulo partitions.
+    Les deux colonnes font partie de FACT_DEDUP_KEYS : deux doublons tombent toujours
+    dans la même partition. Retourne la liste des partitions non vides.
+    """
+    df_stage = df_fact.reindex(columns=FACT_COLUMNS).astype('Int64')
+    df_stage.insert(0, 'StageRowID', np.arange(len(df_stage)))
+    partitions = max(1, min(partitions, len(df_stage)))
+
+    if by == 'datekey':
+        date_keys = df_stage['DateKey']
+        bounds = date_keys.dropna().quantile(np.linspace(0, 1, partitions + 1)[1:-1]).to_numpy()
+        part = np.searchsorted(bounds, date_keys.fillna(0).to_numpy(dtype=np.int64), side='right')
+        part[date_keys.isna().to_numpy()] = partitions - 1
+    elif by == 'orderid':
+        order_ids = df_stage['OrderID'].fillna(-1).to_numpy(dtype=np.int64)
+        part = pd.util.hash_array(order_ids) % np.uint64(partitions)
+    else:
+        raise ValueError(f"Partitionnement inconnu : {by} (choix : datekey, orderid)")
+
+    return [chunk for _, chunk in df_stage.groupby(part, sort=True)]
+
+
+def _partition_table_ref(table_name, dialect, shared):
+    """Nom qualifié d'une table de partition : permanente si partagée entre connexions, sinon temporaire."""
+    return table_name if shared or dialect == 'mssql' else f"temp.{table_name}"
+
+
+def _stage_partition(cursor, table_name, frame, dialect, batch_size, shared):
+    """
+    (Re)crée la table de staging table_name et y copie frame.
+    shared : table permanente, lisible par la connexion de chargement (sinon table
+    temporaire de la connexion ; #table sous SQL Server serait invisible aux autres).
+    """
+    columns = "StageRowID BIGINT NOT NULL, " + ", ".join(f"{c} INTEGER NULL" for c in FACT_COLUMNS)
+    if dialect == 'mssql':
+        cursor.execute(f"IF OBJECT_ID('{table_name}') IS NOT NULL DROP TABLE {table_name}")
+        cursor.execute(f"CREATE TABLE {table_name} ({columns})")
+    else:
+        cursor.execute(f"DROP TABLE IF EXISTS {_partition_table_ref(table_name, dialect, shared)}")
+        cursor.execute(f"CREATE {'' if shared else 'TEMP '}TABLE {table_name} ({columns})")
+    _insert_frame(cursor, table_name, frame, batch_size)
+
+
+def _drop_partition_tables(backend, tables, dialect):
+    """
+    Supprime les tables de staging partagées sur une connexion séparée, validée à part :
+    appelé aussi après un échec (transaction du chargement annulée, partitions déjà validées).
+    Une erreur est signalée sans masquer celle du chargement.
+    """
+    conn = backend.connect()
+    try:
+        cursor = backend.cursor(conn)
+        for table in tables:
+            if dialect == 'mssql':
+                cursor.execute(f"IF OBJECT_ID('{table}') IS NOT NULL DROP TABLE {table}")
+            else:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.commit()
+    except Exception as e:
+        print(f"⚠️ Tables de staging non supprimées ({', '.join(tables)}) : {e}")
+    finally:
+        conn.close()
+
+
+def _load_partition(index, table_name, frame, dialect, batch_size, retries, backend=None, cursor=None):
+    """
+    Copie une partition dans sa table de staging table_name, avec reprise en cas d'échec.
+    backend : connexion dédiée empruntée au backend (chargement concurrent), validée
+    après la copie ; sinon cursor, le curseur de chargement (copie dans sa transaction).
+    Retourne la mesure de la partition (lignes, secondes, lignes/s, tentatives).
+    """
+    for attempt in range(1, retries + 2):
+        start = time.perf_counter()
+        conn = None
+        try:
+            if backend is not None:
+                conn = backend.connect()
+                backend.begin(conn)
+                _stage_partition(instrument_cursor(backend.cursor(conn)), table_name, frame, dialect,
+                                 batch_size, shared=True)
+                conn.commit()
+            else:
+                _stage_partition(cursor, table_name, frame, dialect, batch_size, shared=False)
+            elapsed = time.perf_counter() - start
+            return {'partition': index, 'table': table_name, 'rows': len(frame),
+                    'seconds': round(elapsed, 4), 'rows_per_s': round(len(frame) / max(elapsed, 1e-9)),
+                    'attempts': attempt}
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            if attempt > retries:
+                raise
+            print(f"⚠️ Partition {index} : échec ({e}), nouvelle tentative {attempt + 1}/{retries + 1}")
+            time.sleep(0.5 * attempt)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+@instrumented()
+def load_fact_partitioned(cursor, df_fact, backend=None, partitions=DEFAULT_FACT_PARTITIONS, by='datekey',
+                          workers=DEFAULT_FACT_WORKERS, retries=DEFAULT_PARTITION_RETRIES, dialect=None,
+                          batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Chargement de Tabledefait par partitions (voir partition_facts) :
+    1️⃣ chaque partition est copiée dans sa propre table de staging, avec reprise
+       (retries tentatives supplémentaires) en cas d'échec ;
+    2️⃣ un seul INSERT ... SELECT sur l'union des partitions publie le lot dans la
+       transaction du curseur de chargement (mêmes règles de doublons que load_fact).
+    Les partitions sont copiées en parallèle (workers connexions du pool) si le backend
+    le permet (backend.parallel_staging : SQL Server) ; sinon l'une après l'autre sur
+    le curseur de chargement (SQLite / DuckDB : un seul écrivain par transaction).
+    Tables de staging propres à l'exécution (suffixe aléatoire) : deux chargements
+    concurrents ne se les partagent pas. En parallèle, ce sont des tables permanentes
+    validées par chaque connexion : elles sont supprimées dans un finally, sur une
+    connexion séparée, même si le chargement échoue.
+    Le débit de chaque partition est affiché et ajouté au journal d'exécution.
+    Retourne (lignes insérées, lignes ignorées, mesures par partition).
+    """
+    dialect = dialect or _sql_dialect(cursor)
+    if df_fact.empty:
+        print("✅ 0 lignes insérées dans Tabledefait (aucune ligne de faits).")
+        return 0, 0, []
+    chunks = partition_facts(df_fact, partitions, by)
+    workers = min(workers or len(chunks), len(chunks))
+    parallel = backend is not None and backend.parallel_staging and workers > 1
+    print(f"🔹 Chargement de Tabledefait ({len(chunks)} partitions par {by}, "
+          + (f"{workers} connexions" if parallel else "séquentiel") + f", {dialect})...")
+    start = time.perf_counter()
+    run_tag = uuid.uuid4().hex[:12]
+    names = [f"{FACT_PARTITION_TABLE}_{run_tag}_{i}" for i in range(len(chunks))]
+
+    try:
+        # 1️⃣ Staging des partitions
+        if parallel:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_load_partition, i, names[i], chunk, dialect, batch_size, retries,
+                                       backend=backend)
+                           for i, chunk in enumerate(chunks)]
+                report = [future.result() for future in futures]
+        else:
+            report = [_load_partition(i, names[i], chunk, dialect, batch_size, retries, cursor=cursor)
+                      for i, chunk in enumerate(chunks)]
+        staged = time.perf_counter() - start
+
+        # 2️⃣ Publication : un seul INSERT ensembliste depuis l'union des partitions
+        tables = [_partition_table_ref(r['table'], dialect, parallel) for r in report]
+        union = "(" + " UNION ALL ".join(f"SELECT * FROM {t}" for t in tables) + ")"
+        inserted_count = _publish_staged_facts(cursor, union, dialect)
+        skipped_count = len(df_fact) - inserted_count
+        if not parallel:   # tables temporaires du curseur de chargement
+            for table in tables:
+                cursor.execute(f"DROP TABLE {table}")
+    finally:
+        if parallel:
+            _drop_partition_tables(backend, names, dialect)
+
+    elapsed = time.perf_counter() - start
+    print(f"   {'partition':>9} {'lignes':>10} {'secondes':>9} {'lignes/s':>11} {'essais':>6}")
+    for r in report:
+        print(f"   {r['partition']:>9} {r['rows']:>10,} {r['seconds']:>9.3f} {r['rows_per_s']:>11,} {r['attempts']:>6}")
+    print(f"✅ {inserted_count} lignes insérées dans Tabledefait, {skipped_count} doublons ignorés "
+          f"(staging {staged:.3f} s, publication {elapsed - staged:.3f} s, "
+          f"{len(df_fact) / max(elapsed, 1e-9):,.0f} lignes/s).")
+    annotate_run('fact_partitions', report)
+    return inserted_count, skipped_count, report
+
+
+
+
+
+
+
+
+
+
+def _fetch_key_map(cursor, table_name, code_col, id_col):
+    """
+    Table de correspondance clé naturelle -> clé du DW, lue en une requête,
+    sous forme de Series indexée par le code (dernière occurrence gardée).
+    Dimensions versionnées (SCD type 2) : version courante seulement.
+    """
+    current_only = " WHERE IsCurrent = 1" if 'IsCurrent' in _table_columns(cursor, table_name) else ""
+    cursor.execute(f"SELECT {code_col}, {id_col} FROM {table_name}{current_only}")
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=[code_col, id_col])
+    df = df.drop_duplicates(subset=[code_col], keep='last')
+    return df.set_index(code_col)[id_col]
+
+
+def _date_key(dates):
+    """DateKey (YYYYMMDD, Int64) de dates datetime, date ou chaînes 'YYYY-MM-DD'."""
+    dates = pd.to_datetime(pd.Series(dates), errors='coerce')
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('Int64')
+
 
+@instrumented()
+def resolve_fact_keys(cursor, df_fact):
+    """
+    Remplace CustomerID, EmployeeID et DateKey de la table de faits par les clés du DW :
+    OrderID -> DimOrder (CustomerCode, EmployeeCode, OrderDate) -> DimCustomer / DimEmployee.
+    TerritoryID et RegionID (identifiants Northwind d'origine) sont remplacés par les clés
+    de DimTerritory (via TerritoryCode) et de DimRegion (via RegionCode 'REG_<id>').
+    Les correspondances sont lues en une requête par table et appliquées par jointures vectorisées.
+    Toutes les clés non résolues sont signalées en une passe ; un OrderID absent de
+    DimOrder lève une ValueError (chargement annulé).
+    Retourne (df_fact résolu, rapport des clés non résolues).
+    """
+    customer_ids = _fetch_key_map(cursor, "DimCustomer", "CustomerCode", "CustomerID")
+    employee_ids = _fetch_key_map(cursor, "DimEmployee", "EmployeeCode", "EmployeeID")
+    region_ids = _fetch_key_map(cursor, "DimRegion", "RegionCode", "RegionID")
+    # TerritoryCode = identifiant Northwind en texte ('01581') ; la table de faits le porte en entier
+    territory_ids = _fetch_key_map(cursor, "DimTerritory", "TerritoryCode", "TerritoryID")
+    territory_ids.index = pd.to_numeric(territory_ids.index, errors='coerce').astype('Int64')
+    territory_ids = territory_ids[territory_ids.index.notna()]
+    territory_ids = territory_ids[~territory_ids.index.duplicated(keep='last')]
+
+    cursor.execute("SELECT OrderID, CustomerCode, EmployeeCode, OrderDate FROM DimOrder")
+    orders = pd.DataFrame.from_records(cursor.fetchall(),
+                                       columns=['OrderID', 'CustomerCode', 'EmployeeCode', 'OrderDate'])
+    orders = orders.set_index('OrderID')
+
+    # Attributs de la commande pour chaque ligne de faits (ordre des lignes conservé)
+    order_ids = pd.to_numeric(df_fact['OrderID'], errors='coerce')
+    order_attrs = orders.reindex(order_ids)
+    known_order = order_ids.isin(orders.index).to_numpy()
+
+    customer_codes = order_attrs['CustomerCode']
+    employee_codes = order_attrs['EmployeeCode']
+
+    df_resolved = df_fact.copy()
+    df_resolved['CustomerID'] = customer_ids.reindex(customer_codes).to_numpy()
+    df_resolved['EmployeeID'] = employee_ids.reindex(employee_codes).to_numpy()
+    df_resolved['DateKey'] = _date_key(order_attrs['OrderDate']).to_numpy()
+    territory_codes = pd.to_numeric(df_fact['TerritoryID'], errors='coerce').astype('Int64')
+    region_codes = pd.to_numeric(df_fact['RegionID'], errors='coerce').astype('Int64')
+    region_codes = ("REG_" + region_codes.astype(str)).where(region_codes.notna())
+    df_resolved['TerritoryID'] = territory_ids.reindex(territory_codes).to_numpy()
+    df_resolved['RegionID'] = region_ids.reindex(region_codes).to_numpy()
+    for col in ['CustomerID', 'EmployeeID', 'DateKey', 'TerritoryID', 'RegionID']:
+        df_resolved[col] = df_resolved[col].astype('Int64')
+
+    # Rapport des clés non résolues (une seule passe)
+    def unresolved(values, resolved):
+        mask = known_order & values.notna().to_numpy() & resolved.isna().to_numpy()
+        return mask.sum(), pd.unique(values.to_numpy()[mask])[:5].tolist()
+
+    report = {
+        'OrderID': ((~known_order).sum(), pd.unique(df_fact['OrderID'].to_numpy()[~known_order])[:5].tolist()),
+        'CustomerCode': unresolved(customer_codes, df_resolved['CustomerID']),
+        'EmployeeCode': unresolved(employee_codes, df_resolved['EmployeeID']),
+        'OrderDate': unresolved(order_attrs['OrderDate'], df_resolved['DateKey']),
+        'TerritoryCode': unresolved(territory_codes, df_resolved['TerritoryID']),
+        'RegionCode': unresolved(region_codes, df_resolved['RegionID']),
+    }
+    report = {key: {'count': int(count), 'sample': sample} for key, (count, sample) in report.items()}
+
+    problems = {key: r for key, r in report.items() if r['count']}
+    if problems:
+        print("⚠️ Clés non résolues dans la table de faits :")
+        for key, r in problems.items():
+            print(f"   - {key} : {r['count']} ligne(s), ex. {r['sample']}")
+    else:
+        print(f"✅ Clés de substitution résolues pour {len(df_resolved)} lignes de faits.")
+
+    if report['OrderID']['count']:
+        raise ValueError(f"{report['OrderID']['count']} ligne(s) de faits avec un OrderID absent de DimOrder")
+
+    return df_resolved, report
+
+
+# ---------- AGRÉGATS MATÉRIALISÉS (dashboard) ----------
+
+# Table -> (grain de rafraîchissement, colonnes de regroupement, expressions source).
+# Compteurs communs : Orders = lignes de faits, OrdersDelivered / OrdersNotDelivered =
+# lignes avec indicateur > 0 (mêmes règles que DeliveredFlag / NotDeliveredFlag du dashboard).
+AGGREGATE_TABLES = {
+    'AggFactMonthly': (
+        'month',
+        ['"Year"', '"Month"', 'RegionID', 'TerritoryID', 'EmployeeID', 'CountryRegion'],
+        ['d."Year"', 'd."Month"', 'f.RegionID', 'f.TerritoryID', 'f.EmployeeID', 'c.CountryRegion'],
+    ),
+    'AggFactWeekdayMonth': (
+        'month',
+        ['"Year"', '"Month"', 'DayOfWeek', 'IsWeekend', 'RegionID', 'TerritoryID', 'EmployeeID'],
+        ['d."Year"', 'd."Month"', 'd.DayOfWeek', 'd.IsWeekend', 'f.RegionID', 'f.TerritoryID', 'f.EmployeeID'],
+    ),
+    'AggFactCustomerYearly': (
+        'year',
+        ['"Year"', 'CustomerID', 'RegionID', 'TerritoryID', 'EmployeeID'],
+        ['d."Year"', 'f.CustomerID', 'f.RegionID', 'f.TerritoryID', 'f.EmployeeID'],
+    ),
+}
+AGGREGATE_COUNTERS = ['Orders', 'OrdersDelivered', 'OrdersNotDelivered']
+
+_AGGREGATE_SOURCE = """
+    FROM Tabledefait f
+    LEFT JOIN DimDate d ON f.DateKey = d.DateKey
+    LEFT JOIN DimCustomer c ON f.CustomerID = c.CustomerID
+"""
 
 
+def _month_range(date_keys):
+    """Plage de mois (YYYYMM, YYYYMM) couverte par des DateKey YYYYMMDD, ou None."""
+    months = pd.to_numeric(pd.Series(date_keys), errors='coerce').dropna() // 100
+    if months.empty:
+        return None
+    return int(months.min()), int(months.max())
 
 
+def _period_filters(grain, lo, hi):
+    """
+    (filtre de l'agrégat, filtre des faits) couvrant les mois lo..hi (YYYYMM),
+    étendus aux années entières pour un agrégat annuel.
+    """
+    if grain == 'year':
+        lo, hi = lo // 100, hi // 100
+        return (f'WHERE "Year" BETWEEN {lo} AND {hi}',
+                f"WHERE d.DateKey BETWEEN {lo * 10000 + 101} AND {hi * 10000 + 1231}")
+    return (f'WHERE ("Year" * 100 + "Month") BETWEEN {lo} AND {hi}',
+            f"WHERE d.DateKey BETWEEN {lo * 100 + 1} AND {hi * 100 + 31}")
+
 
+def _add_missing_aggregate_columns(cursor, table, columns, dialect):
+    """
+    Ajoute à un agrégat existant les colonnes de regroupement absentes
+    (DW créé avant l'élargissement du grain ; ensure_schema ne crée que les tables manquantes).
+    Retourne les colonnes ajoutées : l'agrégat doit alors être reconstruit en entier.
+    """
+    existing = {c.lower() for c in _table_columns(cursor, table)}
+    missing = [c.strip('"') for c in columns if c.strip('"').lower() not in existing]
+    add = "ADD" if dialect == 'mssql' else "ADD COLUMN"
+    col_type = "INT" if dialect == 'mssql' else "INTEGER"
+    for col in missing:
+        cursor.execute(f"ALTER TABLE {table} {add} {col} {col_type} NULL")
+    return missing
 
 
+@instrumented()
+def refresh_aggregates(cursor, date_keys=None, dialect=None):
+    """
+    Rafraîchit les agrégats du dashboard (AGGREGATE_TABLES) depuis Tabledefait.
+    date_keys : DateKey des faits chargés -> seuls les mois (ou années) de leur plage
+    sont supprimés puis recalculés, ainsi que le groupe « sans date » (Year NULL)
+    si date_keys contient des valeurs nulles.
+    date_keys=None, ou agrégats encore vides : reconstruction complète ;
+    un agrégat dont le grain a gagné des colonnes est lui aussi reconstruit en entier.
+    Retourne {table: lignes écrites}.
+    """
+    dialect = dialect or _sql_dialect(cursor)
+
+    cursor.execute("SELECT COUNT(*) FROM AggFactMonthly")
+    full = date_keys is None or cursor.fetchone()[0] == 0
+
+    months = None if full else _month_range(date_keys)
+    undated = not full and pd.Series(date_keys).isna().any()
+    if full:
+        print("🔹 Agrégats du dashboard : reconstruction complète...")
+    elif months is not None:
+        print(f"🔹 Agrégats du dashboard : mois {months[0]} → {months[1]}...")
+
+    written = {}
+    for table, (grain, columns, expressions) in AGGREGATE_TABLES.items():
+        added = _add_missing_aggregate_columns(cursor, table, columns, dialect)
+        if added and not full:
+            print(f"🔹 {table} : colonnes ajoutées ({', '.join(added)}), reconstruction complète...")
+        scopes = [("", "")] if full or added else []
+        if months is not None and not added:
+            scopes.append(_period_filters(grain, *months))
+        if undated and not added:
+            scopes.append(('WHERE "Year" IS NULL', "WHERE d.DateKey IS NULL"))
+
+        written[table] = 0
+        for aggregate_where, fact_where in scopes:
+            cursor.execute(f"DELETE FROM {table} {aggregate_where}")
+            cursor.execute(f"""
+                INSERT INTO {table} ({", ".join(columns + AGGREGATE_COUNTERS)})
+                SELECT {", ".join(expressions)},
+                       COUNT(*),
+                       SUM(CASE WHEN f.OrdersDelivered > 0 THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN f.OrdersNotDelivered > 0 THEN 1 ELSE 0 END)
+                {_AGGREGATE_SOURCE}
+                {fact_where}
+                GROUP BY {", ".join(expressions)}
+            """)
+            written[table] += _affected_rows(cursor, dialect)
+
+    print("✅ Agrégats rafraîchis : " + ", ".join(f"{t} {n} lignes" for t, n in written.items()))
+    return written
+
+
+def record_load(cursor, fact_rows):
+    """
+    Trace le chargement dans EtlLoadLog, dans sa transaction : le LoadID croissant est lu par
+    la sonde du snapshot du dashboard, y compris pour les mises à jour en place (SCD 1,
+    commandes modifiées) qui ne changent ni le nombre de lignes ni les clés.
+    """
+    cursor.execute("INSERT INTO EtlLoadLog (LoadedAt, FactRows) VALUES (?, ?)",
+                   [pd.Timestamp.now().to_pydatetime(), int(fact_rows)])
 
 
-def load_all(dims, df_fact):
+@instrumented()
+def load_all(dims, df_fact, load_mode='bulk', fact_mode='staging', backend=None, scd_type=DEFAULT_SCD_TYPE,
+             fact_options=None):
     """
     Chargement complet des dimensions + table de faits
     avec transaction et rollback.
     Corrige le mapping RegionID pour DimTerritory.
+    load_mode : 'bulk' (défaut) ou 'rowwise' pour les dimensions (voir load_dimension).
+    fact_mode : 'staging' (défaut), 'partitioned' ou 'rowwise' pour Tabledefait (voir load_fact) ;
+    fact_options : partitions, by, workers, retries du mode 'partitioned'.
+    scd_type : 1 (défaut) ou 2, membres modifiés de DimTerritory / DimCustomer /
+    DimEmployee mis à jour en place ou versionnés (voir upsert_dimension).
+    backend : DW cible (dw_backend.WarehouseBackend, défaut NW_DW_BACKEND = SQL Server) ;
+    le schéma est créé s'il n'existe pas encore.
+    Retourne True si le chargement a été validé (commit), False sinon.
     """
     print("⏱ Vérification avant insertion :")
     for table_name, df in dims.items():
         print(f"{table_name} : {len(df)} lignes à charger")
     print(f"Table de faits : {len(df_fact)} lignes à charger")
 
-    conn = get_bi_connection()
-    if not conn:
-        raise Exception("Connexion DW impossible")
+    backend = backend or get_backend()
+    print(f"🏛️ DW cible : {backend.describe()}")
+    conn = backend.connect()
+    backend.ensure_schema(conn)
 
-    cursor = conn.cursor()
+    cursor = instrument_cursor(backend.cursor(conn))
 
     try:
-        conn.autocommit = False   # START TRANSACTION
+        backend.begin(conn)   # START TRANSACTION
 
         # ---------------------------------------------
         # 1️⃣ CHARGEMENT DES DIMENSIONS (ordre correct)
         # ---------------------------------------------
-        load_dimension(cursor, "DimDate",       dims['dim_date'],       natural_key='DateKey',      id_col='DateKey')
-        load_dimension(cursor, "DimRegion",     dims['dim_region'],     natural_key='RegionCode',   id_col='RegionID')
+        if load_mode == 'rowwise':
+            load_dimension(cursor, "DimDate",   dims['dim_date'],       natural_key='DateKey',      id_col='DateKey', mode=load_mode)
+        else:
+            load_dim_date(cursor, dims['dim_date'])   # jours absents du DW seulement
+        load_dimension(cursor, "DimRegion",     dims['dim_region'],     natural_key='RegionCode',   id_col='RegionID', mode=load_mode)
 
         # ----- CORRECTION REGIONID POUR DIMTERRITORY -----
-        # Récupérer le mapping RegionCode -> RegionID réel
-        cursor.execute("SELECT RegionCode, RegionID FROM DimRegion")
-        region_map = {row[0]: row[1] for row in cursor.fetchall()}
-
-        # Appliquer le mapping dans dim_territory
-        def map_region_id(old_region_id):
-            # old_region_id correspond à l'ancien RegionID (original de Northwind)
-            code = f"REG_{int(old_region_id)}"
-            return region_map.get(code, None)
-
-        dims['dim_territory']['RegionID'] = dims['dim_territory']['RegionID'].apply(map_region_id)
-
-        # Charger DimTerritory après correction
-        load_dimension(cursor, "DimTerritory",  dims['dim_territory'],  natural_key='TerritoryCode', id_col='TerritoryID')
-
-        # Charger les autres dimensions
-        load_dimension(cursor, "DimCustomer",   dims['dim_customer'],   natural_key='CustomerCode', id_col='CustomerID')
-        load_dimension(cursor, "DimEmployee",   dims['dim_employee'],   natural_key='EmployeeCode', id_col='EmployeeID')
-        load_dimension(cursor, "DimOrder",      dims['dim_order'],      natural_key='OrderID',      id_col='OrderID')
+        # RegionID d'origine (Northwind) -> RegionCode -> RegionID réel du DW
+        region_ids = _fetch_key_map(cursor, "DimRegion", "RegionCode", "RegionID")
+        old_region_id = pd.to_numeric(dims['dim_territory']['RegionID'], errors='coerce').astype('Int64')
+        region_codes = "REG_" + old_region_id.astype(str)
+        dims['dim_territory']['RegionID'] = region_ids.reindex(region_codes.where(old_region_id.notna())).to_numpy()
+
+        # Charger DimTerritory après correction, puis les autres dimensions versionnées.
+        # Membres mis à jour en place (SCD 1, empreintes manquantes) : attributs des agrégats
+        # modifiés sur tous les mois (ex. CountryRegion) -> reconstruction complète des agrégats
+        updated_members = 0
+        for table_name, dim, natural_key, id_col in [("DimTerritory", 'dim_territory', 'TerritoryCode', 'TerritoryID'),
+                                                     ("DimCustomer",  'dim_customer',  'CustomerCode',  'CustomerID'),
+                                                     ("DimEmployee",  'dim_employee',  'EmployeeCode',  'EmployeeID')]:
+            if load_mode == 'rowwise':
+                load_dimension(cursor, table_name, dims[dim], natural_key=natural_key, id_col=id_col, mode=load_mode)
+            else:
+                updated_members += upsert_dimension(cursor, table_name, dims[dim], natural_key, id_col,
+                                                    scd_type=scd_type)['updated']
+        load_dimension(cursor, "DimOrder",      dims['dim_order'],      natural_key='OrderID',      id_col='OrderID', mode=load_mode)
+        # Commandes ré-extraites (look-back) : expédition / statut et indicateurs des faits existants
+        update_changed_orders(cursor, dims['dim_order'])
 
         # ---------------------------------------------
-        # 2️⃣ RÉCUPÉRATION MAPPING DES IDS SQL SERVER
+        # 2️⃣ RÉSOLUTION DES CLÉS DE SUBSTITUTION (jointures vectorisées)
         # ---------------------------------------------
-        cursor.execute("SELECT CustomerCode, CustomerID FROM DimCustomer")
-        customer_map = {row[0]: row[1] for row in cursor.fetchall()}
-
-        cursor.execute("SELECT EmployeeCode, EmployeeID FROM DimEmployee")
-        employee_map = {row[0]: row[1] for row in cursor.fetchall()}
-
-        cursor.execute("SELECT OrderID, CustomerCode, EmployeeCode, OrderDate FROM DimOrder")
-        order_map = {
-            row[0]: {
-                "CustomerCode": row[1],
-                "EmployeeCode": row[2],
-                "OrderDate":    row[3]  # string ou datetime
-            }
-            for row in cursor.fetchall()
-        }
+        df_fact_updated, _ = resolve_fact_keys(cursor, df_fact)
 
         # ---------------------------------------------
-        # 3️⃣ REMPLISSAGE DES IDS DANS LA FACT TABLE
+        # 3️⃣ INSERTION DE LA TABLE DE FAITS
         # ---------------------------------------------
-        df_fact_updated = df_fact.copy()
-
-        df_fact_updated['CustomerID'] = df_fact_updated['OrderID'].apply(
-            lambda oid: customer_map.get(order_map[oid]["CustomerCode"])
-        )
-
-        df_fact_updated['EmployeeID'] = df_fact_updated['OrderID'].apply(
-            lambda oid: employee_map.get(order_map[oid]["EmployeeCode"])
-        )
-
-        # Correction pour DateKey (string ou datetime)
-        def compute_datekey(order_date):
-            if isinstance(order_date, str):
-                return int(order_date.replace("-", ""))
-            elif hasattr(order_date, "strftime"):
-                return int(order_date.strftime("%Y%m%d"))
-            else:
-                return None
-
-        df_fact_updated['DateKey'] = df_fact_updated['OrderID'].apply(
-            lambda oid: compute_datekey(order_map[oid]["OrderDate"])
-        )
+        partition_options = dict(backend=backend, **(fact_options or {})) if fact_mode == 'partitioned' else {}
+        inserted_facts, _ = load_fact(cursor, df_fact_updated, mode=fact_mode, **partition_options)
 
         # ---------------------------------------------
-        # 4️⃣ INSERTION DE LA TABLE DE FAITS
+        # 4️⃣ AGRÉGATS DU DASHBOARD (mois touchés par le chargement, tout si membres mis à jour)
         # ---------------------------------------------
-        load_fact(cursor, df_fact_updated)
+        if updated_members:
+            print(f"🔹 {updated_members} membres de dimension mis à jour en place : agrégats reconstruits")
+        refresh_aggregates(cursor, None if updated_members else df_fact_updated['DateKey'])
+        record_load(cursor, inserted_facts)
 
         conn.commit()
         print("\n✅ Chargement terminé avec succès !")
+        return True
 
     except Exception as e:
         conn.rollback()
         print("❌ Erreur chargement, rollback :", e)
         import traceback
         traceback.print_exc()
+        return False
 
     finally:
         cursor.close()
         conn.close()
 
 
+# ------------------------------
+# POINTS DE REPRISE (CHECKPOINTS)
+# ------------------------------
+
+def source_fingerprints(sqlite_path=None):
+    """
+    Empreinte des sources pour la clé du checkpoint d'extraction :
+    taille + mtime des classeurs Excel et, hors ligne, de la base SQLite.
+    'complete' est faux pour une Source 1 SQL Server (contenu non empreintable
+    sans la relire) : l'extraction n'est alors reprise qu'avec --resume.
+    """
+    excel = {name: file_fingerprint(path) for name, path in get_source2_files().items()}
+    sql = file_fingerprint(sqlite_path) if sqlite_path else None
+    return {'excel': excel, 'sql': sql, 'complete': sql is not None and all(excel.values())}
+
+
+def _data_frames(sql_data, excel_data):
+    """Sources extraites à plat (clé 'sql.x' / 'excel.x') pour l'empreinte de la transformation."""
+    frames = {f"sql.{k}": v for k, v in sql_data.items()}
+    frames.update({f"excel.{k}": v for k, v in excel_data.items()})
+    return frames
+
+
 # ------------------------------
 # EXECUTION
 # ------------------------------
 
+def parse_args(argv=None):
+    """Options de la ligne de commande (valeurs par défaut = comportement historique)."""
+    parser = argparse.ArgumentParser(description="ETL Northwind -> Northwind_BI3")
+    parser.add_argument("--no-tests", action="store_true",
+                        help="désactive les tests après transformation")
+    parser.add_argument("--streaming", action="store_true",
+                        help="extraction SQL par blocs (grosses tables Orders)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--parallel", action="store_true",
+                        help="extraction concurrente SQL (threads) + Excel (processus)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Orders depuis les watermarks (sinon full refresh)")
+    parser.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS)
+    parser.add_argument("--compact", action="store_true",
+                        help="dimensions et faits en représentation compacte (category, entiers réduits)")
+    parser.add_argument("--iso-week", action="store_true",
+                        help="DimDate : année et semaine ISO 8601 (IsoYear, IsoWeek)")
+    parser.add_argument("--fiscal-year-start", type=int, choices=range(1, 13), metavar="MONTH",
+                        default=None, help="DimDate : exercice fiscal débutant ce mois (1-12)")
+    parser.add_argument("--load-mode", choices=["bulk", "rowwise"], default="bulk",
+                        help="dimensions : anti-jointure + executemany, ou ligne à ligne (repli)")
+    parser.add_argument("--scd-type", type=int, choices=[1, 2], default=DEFAULT_SCD_TYPE,
+                        help="membres modifiés de DimTerritory / DimCustomer / DimEmployee : "
+                             "1 = mise à jour en place, 2 = nouvelle version datée")
+    parser.add_argument("--fact-mode", choices=["staging", "partitioned", "rowwise"], default="staging",
+                        help="faits : table temporaire + INSERT ensembliste, partitions (connexions "
+                             "parallèles sous SQL Server) + INSERT ensembliste, ou ligne à ligne")
+    parser.add_argument("--fact-partitions", type=int, default=DEFAULT_FACT_PARTITIONS)
+    parser.add_argument("--partition-by", choices=["datekey", "orderid"], default="datekey",
+                        help="partitions : plages de DateKey ou hachage de OrderID")
+    parser.add_argument("--fact-workers", type=int, default=DEFAULT_FACT_WORKERS,
+                        help="connexions de staging simultanées (mode partitioned, SQL Server)")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DW_BACKEND,
+                        help="DW cible : SQL Server (ODBC) ou fichier embarqué SQLite / DuckDB")
+    parser.add_argument("--dw-path", default=None,
+                        help="fichier du DW embarqué (défaut : NW_DW_PATH ou data/final/northwind_bi3.*)")
+    parser.add_argument("--sources", metavar="DIR", default=None,
+                        help="jeu synthétique (manifest.json de synthetic_northwind) à la place "
+                             "de SQL Server + Excel, pour une exécution hors ligne")
+
+    checkpoints = parser.add_argument_group("checkpoints")
+    checkpoints.add_argument("--resume", action="store_true",
+                             help="reprend après la dernière étape réussie (extraction SQL Server comprise)")
+    checkpoints.add_argument("--no-checkpoints", action="store_true",
+                             help="désactive la persistance des étapes (comportement historique)")
+    checkpoints.add_argument("--checkpoint-dir", default=CHECKPOINT_PATH)
+    instrumentation = parser.add_argument_group("instrumentation")
+    instrumentation.add_argument("--no-run-log", action="store_true",
+                                 help="pas de journal d'exécution JSON")
+    instrumentation.add_argument("--run-log-dir", default=RUN_LOG_PATH)
+    instrumentation.add_argument("--trace-memory", action="store_true",
+                                 help="pic mémoire par étape (tracemalloc, ralentit le run)")
+    instrumentation.add_argument("--profile", choices=["cprofile", "pyinstrument"],
+                                 help="profil par étape (.prof ou .html à côté du journal)")
+    instrumentation.add_argument("--profile-stages", nargs="+", metavar="STAGE",
+                                 help="étapes à profiler (défaut : étapes de premier niveau)")
+    args = parser.parse_args(argv)
+    if args.streaming and args.parallel:
+        parser.error("--streaming et --parallel ne se combinent pas (Orders lus par blocs sur une seule connexion)")
+    return args
+
+
 if __name__ == "__main__":
-    RUN_TESTS = True      # active les tests après transformation
+    args = parse_args()
+    RUN_TESTS = not args.no_tests       # active les tests après transformation
+    STREAMING = args.streaming          # extraction SQL par blocs (grosses tables Orders)
+    CHUNK_SIZE = args.chunk_size
+    PARALLEL = args.parallel            # extraction concurrente SQL (threads) + Excel (processus)
+    INCREMENTAL = args.incremental      # False = full refresh ; True = Orders depuis les watermarks
+    LOOKBACK_DAYS = args.lookback_days
+    COMPACT = args.compact              # category + entiers réduits, rapport mémoire
+    CALENDAR = {'iso_week': args.iso_week,            # attributs optionnels de DimDate
+                'fiscal_year_start_month': args.fiscal_year_start}
+    LOAD_MODE = args.load_mode          # 'bulk' (anti-jointure + executemany) ou 'rowwise' (mode de repli)
+    FACT_MODE = args.fact_mode          # 'staging' (table temporaire + INSERT ensembliste), 'partitioned' ou 'rowwise'
+    FACT_OPTIONS = {'partitions': args.fact_partitions, 'by': args.partition_by,
+                    'workers': args.fact_workers}
+    SCD_TYPE = args.scd_type            # membres modifiés : 1 = mise à jour en place, 2 = versions datées
+    DW = get_backend(args.backend, args.dw_path)   # SQL Server ou DW embarqué (SQLite / DuckDB)
+    CHECKPOINTS = CheckpointStore(args.checkpoint_dir, code=code_version(__file__),   # étapes persistées
+                                  resume=args.resume, enabled=not args.no_checkpoints)
+
+    if args.sources:
+        # Sources hors ligne : Source 1 en SQLite, Source 2 en XLSX (jeu synthétique)
+        manifest = load_manifest(args.sources)
+        get_source1_connection = lambda: sqlite3.connect(manifest["sqlite"])
+        get_source2_files = lambda: dict(manifest["excel_files"])
+
+    if not args.no_run_log:
+        start_run(log_dir=args.run_log_dir, trace_memory=args.trace_memory,
+                  profile=args.profile, profile_stages=args.profile_stages,
+                  config={k: v for k, v in vars(args).items() if not k.startswith("run_log")})
 
     print("\n===== ETL: START =====\n")
 
-    try:
-        # --------------------------------------------------------------------
-        # 1) EXTRACTION
-        # --------------------------------------------------------------------
-        sql_data, excel_data = main_extraction()
-        print("\n✅ Extraction terminée avec succès !")
+    etl_state = load_etl_state()
+    previous_marks = etl_state.get('watermarks', {})
 
-        # --------------------------------------------------------------------
-        # 2) TRANSFORMATION
-        # --------------------------------------------------------------------
-        print("\n🔁 Lancement de la transformation...")
-        dims, df_fact = transform_pipeline(sql_data, excel_data)
-        print("\n✅ Transformation terminée avec succès !")
+    # Paramètres qui changent les données extraites / transformées (clés des checkpoints)
+    extract_params = {'incremental': INCREMENTAL, 'lookback_days': LOOKBACK_DAYS,
+                      'watermarks': previous_marks if INCREMENTAL else None}
+    transform_params = {'compact': COMPACT, **CALENDAR}
+    sources = source_fingerprints(manifest["sqlite"] if args.sources else None)
+
+    try:
+        if STREAMING:
+            # ----------------------------------------------------------------
+            # 1+2) EXTRACTION EN FLUX + TRANSFORMATION (une seule étape)
+            # Le générateur Orders n'est pas persistable : l'étape est reprise
+            # d'un bloc, avec les watermarks observés pendant la lecture.
+            # ----------------------------------------------------------------
+            def extract_transform():
+                sql_data, excel_data = main_extraction(streaming=True, chunksize=CHUNK_SIZE, parallel=PARALLEL,
+                                                       watermarks=previous_marks if INCREMENTAL else None,
+                                                       lookback_days=LOOKBACK_DAYS)
+                print("\n✅ Extraction terminée avec succès !")
+                sql_marks = dict(previous_marks.get('sql', {}))
+                sql_data['orders'] = track_order_watermarks(sql_data['orders'], sql_marks)
+
+                print("\n🔁 Lancement de la transformation...")
+                dims, df_fact = transform_pipeline_streaming(sql_data, excel_data, compact=COMPACT, **CALENDAR)
+                print("\n✅ Transformation terminée avec succès !")
+                del sql_data['orders']
+                return ({'sql_data': sql_data, 'excel_data': excel_data, 'dims': dims, 'df_fact': df_fact},
+                        {'sql_marks': sql_marks})
+
+            outputs, meta = CHECKPOINTS.run_stage('extract_transform', extract_transform, inputs=sources,
+                                                  params={**extract_params, **transform_params},
+                                                  reusable=sources['complete'])
+            sql_data, excel_data = outputs['sql_data'], outputs['excel_data']
+            dims, df_fact = outputs['dims'], outputs['df_fact']
+            sql_marks = meta['sql_marks']
+            # Le générateur Orders est consommé : les tests utilisent DimOrder
+            sql_data['orders'] = dims['dim_order']
+
+            if INCREMENTAL and dims['dim_order'].empty:
+                print("\n✅ Aucun Order nouveau ou modifié depuis le dernier chargement.")
+                raise SystemExit(0)
+        else:
+            # ----------------------------------------------------------------
+            # 1) EXTRACTION (clé : empreinte des sources + watermarks)
+            # ----------------------------------------------------------------
+            def extract():
+                sql_data, excel_data = main_extraction(streaming=False, chunksize=CHUNK_SIZE, parallel=PARALLEL,
+                                                       watermarks=previous_marks if INCREMENTAL else None,
+                                                       lookback_days=LOOKBACK_DAYS)
+                print("\n✅ Extraction terminée avec succès !")
+                return {'sql_data': sql_data, 'excel_data': excel_data}
+
+            outputs, _ = CHECKPOINTS.run_stage('extract', extract, inputs=sources, params=extract_params,
+                                               reusable=sources['complete'])
+            sql_data, excel_data = outputs['sql_data'], outputs['excel_data']
+
+            if INCREMENTAL and sql_data['orders'].empty and excel_data['orders'].empty:
+                print("\n✅ Aucun Order nouveau ou modifié depuis le dernier chargement.")
+                raise SystemExit(0)
+
+            sql_marks = dict(previous_marks.get('sql', {}))
+
+            # ----------------------------------------------------------------
+            # 2) TRANSFORMATION (clé : contenu des DataFrames extraits)
+            # ----------------------------------------------------------------
+            def transform():
+                print("\n🔁 Lancement de la transformation...")
+                dims, df_fact = transform_pipeline(sql_data, excel_data, compact=COMPACT, **CALENDAR)
+                print("\n✅ Transformation terminée avec succès !")
+                return {'dims': dims, 'df_fact': df_fact}
+
+            inputs = frames_digest(_data_frames(sql_data, excel_data)) if CHECKPOINTS.enabled else None
+            outputs, _ = CHECKPOINTS.run_stage('transform', transform, inputs=inputs, params=transform_params)
+            dims, df_fact = outputs['dims'], outputs['df_fact']
 
         # --------------------------------------------------------------------
         # 3) TESTS (optionnels mais recommandés)
@@ -1010,6 +3027,14 @@ if __name__ == "__main__":
             run_transformation_tests(dims, df_fact, sql_data, excel_data)
             print("\n✅ Tous les tests ont réussi !")
 
+        # Nouveaux watermarks (persistés seulement après un chargement réussi)
+        if not STREAMING:
+            sql_marks = compute_order_watermarks(sql_data['orders'], sql_marks)
+        new_marks = {
+            'sql': sql_marks,
+            'excel': compute_order_watermarks(excel_data['orders'], previous_marks.get('excel')),
+        }
+
         print("\n===== ETL: END =====\n")
 
     except Exception as e:
@@ -1035,8 +3060,29 @@ if __name__ == "__main__":
 
 
 
-    # 🔁 Chargement dans le DW
-    load_all(dims, df_fact)
+    # 🔁 Chargement dans le DW (ignoré avec --resume s'il a déjà réussi pour ces données)
+    load_key = None
+    if CHECKPOINTS.enabled:
+        load_key = stage_key('load', CHECKPOINTS.code, frames_digest({**dims, 'df_fact': df_fact}),
+                             {'dw': DW.describe(), 'load_mode': LOAD_MODE, 'fact_mode': FACT_MODE,
+                              'scd_type': SCD_TYPE})
+    if args.resume and CHECKPOINTS.is_done('load', load_key):
+        print(f"⏭️ Chargement déjà réalisé pour ces données ({DW.describe()}) : étape ignorée")
+        loaded = True
+    else:
+        loaded = load_all(dims, df_fact, load_mode=LOAD_MODE, fact_mode=FACT_MODE, backend=DW,
+                          scd_type=SCD_TYPE, fact_options=FACT_OPTIONS)
+        if loaded:
+            CHECKPOINTS.mark_done('load', load_key)
+    annotate_run('checkpoints', CHECKPOINTS.report)
+    if loaded:
+        etl_state['watermarks'] = new_marks
+        save_etl_state(etl_state)
+        print(f"💾 Watermarks enregistrés : {new_marks}")
+
+    end_run(status="ok" if loaded else "load_failed")
+    if not loaded:
+        raise SystemExit(1)   # chargement annulé (rollback) : code de sortie non nul
 
 
 
@@ -0,0 +1,136 @@
+# benchmark_dashboard.py
+# =====================================================================
+# Contrôle d'équivalence + benchmark des filtres de l'Overview sur le détail
+# des commandes : index des filtres (FilterIndex) vs masques booléens chaînés
+# =====================================================================
+
+import io
+import time
+import argparse
+import contextlib
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from dashboard_data import FilterIndex
+
+
+# ------------------------------
+# DONNÉES SYNTHÉTIQUES
+# ------------------------------
+
+def make_detail_frame(n, seed=0, years=30, employees=200, territories=53, regions=4):
+    """
+    Génère un détail des commandes de n lignes, trié par date décroissante comme
+    read_dw_details : colonnes filtrées (Year, EmployeeID, RegionName, TerritoryName)
+    et quelques colonnes affichées. ~1 % de territoires manquants.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("1996-01-01")
+    days = np.sort(rng.integers(0, years * 365, n))[::-1]
+    dates = start + days.astype("timedelta64[D]")
+
+    territory = rng.integers(0, territories, n)
+    territory_names = np.array([f"Territory {i:02d}" for i in range(territories)], dtype=object)
+    region_names = np.array([f"Region {i % regions}" for i in range(territories)], dtype=object)
+    missing = rng.random(n) < 0.01
+
+    return pd.DataFrame({
+        "OrderID": np.arange(n, dtype=np.int64),
+        "DateValue": pd.to_datetime(dates),
+        "Year": pd.DatetimeIndex(dates).year.astype(np.int64),
+        "EmployeeID": rng.integers(1, employees + 1, n),
+        "RegionName": pd.array(np.where(missing, None, region_names[territory]), dtype="str"),
+        "TerritoryName": pd.array(np.where(missing, None, territory_names[territory]), dtype="str"),
+        "DeliveredFlag": (rng.random(n) < 0.9).astype(np.int8),
+    })
+
+
+def filter_cases(df):
+    """Combinaisons de filtres de l'Overview (de la plus large à la plus sélective)."""
+    years = sorted(df["Year"].unique())
+    territories = sorted(df["TerritoryName"].dropna().unique())
+    return {
+        "année": {"year": years[len(years) // 2]},
+        "2 régions": {"regions": ["Region 0", "Region 1"]},
+        "5 employés": {"employee_ids": [1, 2, 3, 4, 5]},
+        "année + région": {"year": years[-1], "regions": ["Region 2"]},
+        "année + 3 employés + 2 territoires": {"year": years[1], "employee_ids": [7, 8, 9],
+                                               "territories": territories[:2]},
+        "tous les filtres": {"year": years[0], "employee_ids": [10, 11], "regions": ["Region 0"],
+                             "territories": territories[:8]},
+    }
+
+
+# ------------------------------
+# IMPLÉMENTATIONS COMPARÉES
+# ------------------------------
+
+def apply_filters_masks(df, filters):
+    """Référence : copie du DataFrame puis masques booléens chaînés (ancienne version du dashboard)."""
+    frame = df.copy()
+    if filters.get("year"):
+        frame = frame[frame["Year"] == filters["year"]]
+    if filters.get("employee_ids"):
+        frame = frame[frame["EmployeeID"].isin(filters["employee_ids"])]
+    if filters.get("regions"):
+        frame = frame[frame["RegionName"].isin(filters["regions"])]
+    if filters.get("territories"):
+        frame = frame[frame["TerritoryName"].isin(filters["territories"])]
+    return frame
+
+
+# ------------------------------
+# OUTILS
+# ------------------------------
+
+def time_call(fn, *args, repeat=1, **kwargs):
+    """Exécute fn repeat fois (print masqués) ; retourne (résultat, meilleure durée, pic mémoire Mo)."""
+    best, peak = None, 0.0
+    for _ in range(repeat):
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best, peak
+
+
+def bench_filters(n, repeat=3):
+    """Construit l'index, vérifie chaque cas contre les masques et retourne les mesures."""
+    df = make_detail_frame(n)
+    index, t_build, mem_build = time_call(FilterIndex, df)
+    print(f"   ⏱ index des filtres : {t_build:.3f} s, {mem_build:.1f} Mo ({n:,} lignes)")
+
+    results = []
+    for name, filters in filter_cases(df).items():
+        expected, t_ref, mem_ref = time_call(apply_filters_masks, df, filters, repeat=repeat)
+        actual, t_new, mem_new = time_call(index.select, filters, repeat=repeat)
+        pd.testing.assert_frame_equal(expected, actual)
+        results.append({
+            "filtres": name,
+            "rows_out": len(actual),
+            "masks_s": round(t_ref, 4),
+            "index_s": round(t_new, 4),
+            "speedup": round(t_ref / max(t_new, 1e-9), 1),
+            "masks_mb": round(mem_ref, 1),
+            "index_mb": round(mem_new, 1),
+        })
+        del expected, actual
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des filtres de l'Overview (détail des commandes)")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="meilleure durée sur N exécutions")
+    args = parser.parse_args()
+
+    print("\n===== BENCHMARK FILTRES DU DASHBOARD =====\n")
+    for n in args.rows:
+        results = bench_filters(n, repeat=args.repeat)
+        print("✔ Lignes identiques (index == masques booléens)\n")
+        print(pd.DataFrame(results).to_string(index=False) + "\n")
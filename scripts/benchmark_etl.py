@@ -0,0 +1,332 @@
+# benchmark_etl.py
+# =====================================================================
+# Benchmark de bout en bout par facteur d'échelle (Northwind synthétique)
+# - Source 1 : SQLite généré, Source 2 : classeurs XLSX générés
+# - DW : SQLite ou DuckDB embarqué (voir dw_backend), recréé à chaque exécution
+# - Temps et pic mémoire de chaque étape : extract_*, build_dim_*, build_fact_table,
+#   load_dim_date, load_dimension, resolve_fact_keys, load_fact, refresh_aggregates, lectures dashboard
+#   (requêtes des vues, jointure complète, snapshot local du détail)
+# - Contrôle SCD type 2 : clients modifiés puis faits rechargés -> aucune ligne de faits en double
+# - Résultats JSON dans data/benchmarks, comparables entre deux exécutions
+#
+# Usage :  python benchmark_etl.py --scales 1 100
+#          python benchmark_etl.py --scales 100 --backend duckdb
+#          python benchmark_etl.py --scales 100 --compare ../data/benchmarks/<ancien>.json
+# =====================================================================
+
+import io
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import ETL
+from dashboard_data import read_dashboard_views, read_dw_data
+from dashboard_snapshot import DetailSnapshot, read_snapshot_probe
+from dw_backend import get_backend
+from etl_instrumentation import count_rows
+from synthetic_northwind import DEFAULT_SEED, generate_dataset
+
+
+RESULTS_PATH = "../data/benchmarks"
+DEFAULT_SCALES = [1, 100]   # 10000 : plusieurs minutes et plusieurs Go de RAM
+EMBEDDED_BACKENDS = ["sqlite", "duckdb"]
+
+
+# ------------------------------
+# SOURCES ET DW SYNTHÉTIQUES
+# ------------------------------
+
+@contextlib.contextmanager
+def synthetic_sources(manifest):
+    """Redirige les extractions de l'ETL vers le jeu synthétique (SQLite + XLSX)."""
+    saved = ETL.get_source1_connection, ETL.get_source2_files
+    ETL.get_source1_connection = lambda: sqlite3.connect(manifest["sqlite"])
+    ETL.get_source2_files = lambda: dict(manifest["excel_files"])
+    try:
+        yield
+    finally:
+        ETL.get_source1_connection, ETL.get_source2_files = saved
+
+
+def create_embedded_dw(backend):
+    """Crée un DW embarqué vierge (schéma Northwind_BI3) et retourne la connexion."""
+    for suffix in ("", "-wal", "-shm", ".wal"):
+        if os.path.exists(backend.path + suffix):
+            os.remove(backend.path + suffix)
+    conn = backend.connect()
+    backend.ensure_schema(conn)
+    return conn
+
+
+def clear_excel_cache(manifest):
+    """Supprime le cache Feather du jeu synthétique (extraction Excel « à froid »)."""
+    raw_dir = os.path.dirname(os.path.abspath(next(iter(manifest["excel_files"].values()))))
+    for path in glob.glob(os.path.join(os.path.dirname(raw_dir), "clean", "*")):
+        os.remove(path)
+
+
+# ------------------------------
+# MESURE D'UNE ÉTAPE
+# ------------------------------
+
+def measure(results, stage, fn, *args, **kwargs):
+    """
+    Exécute fn (print masqués) et ajoute à results :
+    durée (s), pic mémoire Python pendant l'étape (Mo, si tracemalloc actif), lignes produites.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+    record = {
+        "stage": stage,
+        "seconds": round(elapsed, 4),
+        "peak_mb": round((tracemalloc.get_traced_memory()[1] - base) / 2**20, 2) if tracing else None,
+        "rows_out": count_rows(result),
+    }
+    results.append(record)
+    print(f"   ⏱ {stage:<34} {record['seconds']:>9.3f} s"
+          + (f"  {record['peak_mb']:>9.1f} Mo" if tracing else "")
+          + (f"  {record['rows_out']:>10,} lignes" if record["rows_out"] is not None else ""))
+    return result
+
+
+# ------------------------------
+# BENCHMARK D'UN FACTEUR D'ÉCHELLE
+# ------------------------------
+
+def run_benchmark(scale, seed=DEFAULT_SEED, track_memory=True, backend_name="sqlite", fact_mode="staging"):
+    """
+    Génère (ou réutilise) le jeu synthétique du facteur scale, puis exécute et mesure
+    chaque étape de l'ETL et la lecture du dashboard sur un DW embarqué vierge
+    (backend_name : 'sqlite' ou 'duckdb' ; fact_mode : 'staging' ou 'partitioned', voir
+    ETL.load_fact). Retourne le rapport (dict).
+    """
+    manifest = generate_dataset(scale, seed=seed)
+    backend = get_backend(backend_name, os.path.join(os.path.dirname(manifest["sqlite"]), f"dw.{backend_name}"))
+    stages = []
+    checks = {}
+
+    print(f"\n===== BENCHMARK ETL sf={scale:g} ({backend_name}) =====")
+    if track_memory:
+        tracemalloc.start()
+    total_start = time.perf_counter()
+
+    try:
+        with synthetic_sources(manifest):
+            # --- Extraction ---
+            sql_data = measure(stages, "extract_sql_server_data", ETL.extract_sql_server_data)
+            clear_excel_cache(manifest)
+            measure(stages, "extract_excel_data[cold]", ETL.extract_excel_data)
+            excel_data = measure(stages, "extract_excel_data[warm]", ETL.extract_excel_data)
+
+        # --- Transformation ---
+        excel_data = measure(stages, "harmonize_excel_columns", ETL.harmonize_excel_columns, excel_data)
+        dim_customer = measure(stages, "build_dim_customer", ETL.build_dim_customer,
+                               sql_data['customers'], excel_data['customers'])
+        dim_employee = measure(stages, "build_dim_employee", ETL.build_dim_employee,
+                               sql_data['employees'], excel_data['employees'])
+        dim_order = measure(stages, "build_dim_order", ETL.build_dim_order,
+                            sql_data['orders'], excel_data['orders'])
+        dim_date = measure(stages, "build_dim_date", ETL.build_dim_date,
+                           sql_data['orders'], excel_data['orders'])
+        dim_region = measure(stages, "build_dim_region", ETL.build_dim_region, sql_data['region'])
+        dim_territory = measure(stages, "build_dim_territory", ETL.build_dim_territory,
+                                sql_data['territories'])
+        df_fact = measure(stages, "build_fact_table", ETL.build_fact_table,
+                          dim_order, dim_customer, dim_employee, dim_date, sql_data)
+
+        # --- Chargement (DW embarqué vierge) ---
+        conn = create_embedded_dw(backend)
+        try:
+            cursor = backend.cursor(conn)
+            backend.begin(conn)
+            measure(stages, "load_dim_date", ETL.load_dim_date, cursor, dim_date)
+            # Comme load_all : détection des changements (SCD) sur Territory / Customer / Employee
+            scd = ETL.DEFAULT_SCD_TYPE
+            for table, df, natural_key, id_col, scd_type in [
+                ("DimRegion", dim_region, 'RegionCode', 'RegionID', None),
+                ("DimTerritory", dim_territory, 'TerritoryCode', 'TerritoryID', scd),
+                ("DimCustomer", dim_customer, 'CustomerCode', 'CustomerID', scd),
+                ("DimEmployee", dim_employee, 'EmployeeCode', 'EmployeeID', scd),
+                ("DimOrder", dim_order, 'OrderID', 'OrderID', None),
+            ]:
+                measure(stages, f"load_dimension[{table}]", ETL.load_dimension,
+                        cursor, table, df, natural_key, id_col, scd_type=scd_type)
+            df_fact, _ = measure(stages, "resolve_fact_keys", ETL.resolve_fact_keys, cursor, df_fact)
+            fact_stage = "load_fact" if fact_mode == "staging" else f"load_fact[{fact_mode}]"
+            measure(stages, fact_stage, ETL.load_fact, cursor, df_fact, mode=fact_mode,
+                    **({'backend': backend} if fact_mode == 'partitioned' else {}))
+            measure(stages, "refresh_aggregates", ETL.refresh_aggregates, cursor, df_fact['DateKey'])
+            conn.commit()
+
+            # --- Lectures du dashboard : requêtes des onglets (exécutées par le DW) et,
+            #     pour comparaison, jointure complète rapatriée dans pandas ---
+            measure(stages, "dashboard_queries", read_dashboard_views, conn, None, backend)
+            measure(stages, "load_dw_data", read_dw_data, conn, backend)
+
+            # Snapshot local du détail : sonde, construction (lecture complète), démarrage à froid
+            snapshot_path = os.path.join(os.path.dirname(manifest["sqlite"]), f"snapshot_{backend_name}")
+            shutil.rmtree(snapshot_path, ignore_errors=True)
+            probe = measure(stages, "detail_snapshot_probe", read_snapshot_probe, conn, backend)
+            measure(stages, "detail_snapshot_build", DetailSnapshot(snapshot_path).refresh, conn, probe, backend)
+            measure(stages, "detail_snapshot_load", DetailSnapshot(snapshot_path).load)
+
+            # --- Ré-exécution en SCD type 2 : 1 % des clients changent de ville (nouvelles
+            #     versions, nouvelles clés), puis les mêmes faits sont rechargés ---
+            checks["scd2_rerun"] = check_scd2_rerun(stages, backend, conn, dim_customer, df_fact, seed)
+        finally:
+            conn.close()
+    finally:
+        total = time.perf_counter() - total_start
+        if track_memory:
+            tracemalloc.stop()
+
+    print(f"   ⏱ {'TOTAL':<34} {total:>9.3f} s")
+    return {
+        "benchmark": "etl",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "seed": seed,
+        "backend": backend_name,
+        "fact_mode": fact_mode,
+        "generator_version": manifest["version"],
+        "memory_tracking": track_memory,
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "dataset_rows": manifest["rows"],
+        "total_seconds": round(total, 4),
+        "stages": stages,
+        "checks": checks,
+    }
+
+
+def check_scd2_rerun(stages, backend, conn, dim_customer, df_fact, seed=DEFAULT_SEED):
+    """
+    Versionne (SCD type 2) une partie des clients puis recharge df_fact : les commandes
+    déjà chargées ne doivent pas être réinsérées sous les nouvelles clés client.
+    Lève une RuntimeError si Tabledefait a plus de lignes que de commandes distinctes.
+    Retourne le résumé du contrôle (dict).
+    """
+    moved = dim_customer.copy()
+    sample = moved.sample(n=max(1, len(moved) // 100), random_state=seed).index
+    moved.loc[sample, 'City'] = moved.loc[sample, 'City'].fillna("").astype(str) + " (SCD2)"
+
+    cursor = backend.cursor(conn)
+    backend.begin(conn)
+    upsert = measure(stages, "scd2_rerun[DimCustomer]", ETL.upsert_dimension,
+                     cursor, "DimCustomer", moved, 'CustomerCode', 'CustomerID', scd_type=2)
+    df_rerun, _ = measure(stages, "scd2_rerun[resolve_fact_keys]", ETL.resolve_fact_keys, cursor, df_fact)
+    inserted, _ = measure(stages, "scd2_rerun[load_fact]", ETL.load_fact, cursor, df_rerun)
+    conn.commit()
+
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT OrderID) FROM Tabledefait")
+    facts, orders = cursor.fetchone()
+    result = {"versioned": upsert["versioned"], "facts_inserted": inserted,
+              "fact_rows": facts, "distinct_orders": orders}
+    print(f"   🔁 SCD type 2 : {result['versioned']} clients versionnés, "
+          f"{inserted} lignes de faits ajoutées ({facts} lignes / {orders} commandes)")
+    if inserted or facts != orders:
+        raise RuntimeError(f"Faits dupliqués après la ré-exécution SCD type 2 : {result}")
+    return result
+
+
+def save_report(report, out_dir=RESULTS_PATH):
+    """Écrit le rapport JSON (un fichier par exécution et par facteur d'échelle)."""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(out_dir, f"etl_sf{report['scale']:g}_{report.get('backend', 'sqlite')}_{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Résultats : {path}")
+    return path
+
+
+# ------------------------------
+# COMPARAISON DE DEUX EXÉCUTIONS
+# ------------------------------
+
+def compare_reports(baseline, current):
+    """Tableau étape par étape : secondes avant / après et ratio (> 1 = plus lent)."""
+    before = {s["stage"]: s for s in baseline["stages"]}
+    rows = []
+    for stage in current["stages"]:
+        ref = before.get(stage["stage"])
+        if ref is None:
+            continue
+        rows.append({
+            "stage": stage["stage"],
+            "baseline_s": ref["seconds"],
+            "current_s": stage["seconds"],
+            "ratio": round(stage["seconds"] / max(ref["seconds"], 1e-9), 2),
+            "baseline_peak_mb": ref.get("peak_mb"),
+            "current_peak_mb": stage.get("peak_mb"),
+        })
+    return pd.DataFrame(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ETL Northwind par facteur d'échelle")
+    parser.add_argument("--scales", type=float, nargs="+", default=DEFAULT_SCALES,
+                        help="facteurs d'échelle (1 = Northwind d'origine ; ex. 1 100 10000)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--backend", choices=EMBEDDED_BACKENDS, default="sqlite",
+                        help="DW embarqué cible (duckdb : module optionnel)")
+    parser.add_argument("--fact-mode", choices=["staging", "partitioned"], default="staging",
+                        help="chargement de Tabledefait (partitioned : staging par partitions)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="désactive tracemalloc (temps plus fidèles, pas de pic mémoire)")
+    parser.add_argument("--output-dir", default=RESULTS_PATH)
+    parser.add_argument("--compare", metavar="JSON",
+                        help="rapport de référence (même facteur d'échelle) à comparer")
+    parser.add_argument("--max-slowdown", type=float, default=None,
+                        help="code retour 1 si une étape est plus lente que ce ratio (avec --compare)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regression = False
+    for scale in args.scales:
+        report = run_benchmark(scale, seed=args.seed, track_memory=not args.no_memory,
+                               backend_name=args.backend, fact_mode=args.fact_mode)
+        save_report(report, args.output_dir)
+
+        if (baseline is not None and baseline.get("scale") == scale
+                and baseline.get("backend", "sqlite") == args.backend):
+            table = compare_reports(baseline, report)
+            print("\n📊 Comparaison avec", args.compare)
+            print(table.to_string(index=False))
+            if args.max_slowdown and (table["ratio"] > args.max_slowdown).any():
+                print(f"⚠️ Régression : au moins une étape est plus de {args.max_slowdown}x plus lente")
+                regression = True
+
+    sys.exit(1 if regression else 0)
@@ -0,0 +1,205 @@
+# benchmark_transform.py
+# =====================================================================
+# Contrôle d'équivalence + benchmark des transformations vectorisées
+# (versions vectorisées vs implémentations d'origine ligne à ligne)
+# =====================================================================
+
+import io
+import time
+import contextlib
+import numpy as np
+import pandas as pd
+
+import ETL
+
+
+# ------------------------------
+# DONNÉES SYNTHÉTIQUES
+# ------------------------------
+
+def make_customers_frames(n, seed=0):
+    """
+    Génère (sql_customers, excel_customers) de n lignes chacun, avec les colonnes
+    telles qu'elles arrivent dans transform_pipeline (Excel déjà harmonisé).
+    Inclut des valeurs manquantes et des noms de contact à 1, 2 ou 3 mots.
+    """
+    rng = np.random.default_rng(seed)
+    contacts = np.array(["Maria Anders", "Ana Trujillo", "Thomas", "Hanna Moos van Der", None], dtype=object)
+    cities = np.array(["Berlin", "London", "Seattle", None], dtype=object)
+    regions = np.array([None, "WA", "BC", "SP"], dtype=object)
+    countries = np.array(["Germany", "UK", "USA", "Brazil"], dtype=object)
+
+    sql_customers = pd.DataFrame({
+        'CustomerID': [f"C{i:07d}" for i in range(n)],
+        'CompanyName': [f"Company {i}" for i in range(n)],
+        'ContactName': rng.choice(contacts, n),
+        'City': rng.choice(cities, n),
+        'Region': rng.choice(regions, n),
+        'Country': rng.choice(countries, n),
+    })
+
+    excel_customers = pd.DataFrame({
+        'CustomerID': np.arange(1, n + 1),
+        'CompanyName': [f"Company {chr(65 + i % 26)}{i}" for i in range(n)],
+        'ContactName': rng.choice(contacts, n),
+        'FirstName': rng.choice(contacts, n),
+        'City': rng.choice(cities, n),
+        'CountryRegion': rng.choice(countries, n),
+    })
+
+    return sql_customers, excel_customers
+
+
+def make_employees_frames(n, seed=0):
+    """
+    Génère (sql_employees, excel_employees) ; la moitié des EmployeeID Excel
+    recouvre ceux de SQL pour exercer le dédoublonnage (SQL prioritaire).
+    """
+    rng = np.random.default_rng(seed)
+    titles = np.array(["Sales Representative", "Sales Manager", None], dtype=object)
+    cities = np.array(["Seattle", "London", "Tacoma", None], dtype=object)
+
+    sql_employees = pd.DataFrame({
+        'EmployeeID': np.arange(1, n + 1),
+        'LastName': [f"Last{i}" for i in range(n)],
+        'FirstName': [f"First{i}" for i in range(n)],
+        'Title': rng.choice(titles, n),
+        'City': rng.choice(cities, n),
+        'Country': rng.choice(np.array(["USA", "UK"], dtype=object), n),
+    })
+
+    excel_employees = pd.DataFrame({
+        'EmployeeID': np.arange(n // 2 + 1, n // 2 + n + 1),
+        'Company': "Northwind Traders",
+        'LastName': [f"XLast{i}" for i in range(n)],
+        'FirstName': [f"XFirst{i}" for i in range(n)],
+        'Job Title': rng.choice(titles, n),
+        'City': rng.choice(cities, n),
+        'CountryRegion': rng.choice(np.array(["USA", None], dtype=object), n),
+    })
+
+    return sql_employees, excel_employees
+
+
+DATE_STRING_FORMATS = ["%Y-%m-%d", "%d/%m/%Y %H:%M", "%b %d %Y"]
+
+
+def _mixed_date_strings(dates, rng, share=0.2):
+    """
+    Colonne object comme une saisie Excel hétérogène : ~share des dates en texte
+    (share=1.0 : colonne entièrement textuelle), dans les formats de DATE_STRING_FORMATS
+    mélangés, plus 1 % de valeurs illisibles.
+    """
+    values = pd.Series(dates).astype(object)
+    as_text = np.flatnonzero((rng.random(len(values)) < share) & values.notna().to_numpy())
+    formats = rng.integers(0, len(DATE_STRING_FORMATS), len(as_text))
+    values.iloc[as_text] = [values.iloc[i].strftime(DATE_STRING_FORMATS[f]) for i, f in zip(as_text, formats)]
+    values.iloc[np.flatnonzero(rng.random(len(values)) < 0.01)] = "n/a"
+    return values
+
+
+def make_orders_frames(n, seed=0):
+    """
+    Génère (sql_orders, excel_orders) de n lignes chacun : dates réelles côté SQL,
+    dates Excel en texte de formats variés (OrderDate) ou mêlant datetime et texte
+    (ShippedDate), EmployeeID parfois nul,
+    1 % d'OrderID Excel déjà présents côté SQL.
+    """
+    rng = np.random.default_rng(seed)
+    order_dates = pd.Timestamp("1996-07-04") + pd.to_timedelta(rng.integers(0, 3000, n), unit="D")
+    shipped = order_dates + pd.to_timedelta(rng.integers(1, 30, n), unit="D")
+    shipped = shipped.where(rng.random(n) > 0.05)
+
+    employee_ids = rng.integers(1, 10, n).astype(float)
+    employee_ids[rng.random(n) < 0.01] = np.nan
+
+    sql_orders = pd.DataFrame({
+        'OrderID': np.arange(10248, 10248 + n),
+        'CustomerID': rng.choice(np.array([f"C{i:04d}" for i in range(500)], dtype=object), n),
+        'EmployeeID': employee_ids,
+        'OrderDate': order_dates,
+        'RequiredDate': order_dates + pd.Timedelta(days=28),
+        'ShippedDate': shipped,
+    })
+
+    excel_ids = np.arange(10248 + n - n // 100, 10248 + 2 * n - n // 100)
+    excel_orders = pd.DataFrame({
+        'OrderID': excel_ids,
+        'EmployeeID': rng.integers(1, 10, n),
+        'CustomerID': rng.integers(1, 30, n),
+        'OrderDate': _mixed_date_strings(order_dates, rng, share=1.0),
+        'ShippedDate': _mixed_date_strings(shipped, rng),
+        'Status ID': rng.integers(0, 4, n),
+    })
+
+    return sql_orders, excel_orders
+
+
+# ------------------------------
+# OUTILS
+# ------------------------------
+
+def time_call(fn, *args, **kwargs):
+    """Exécute fn en masquant ses print ; retourne (résultat, durée en secondes)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def compare_implementations(name, reference_fn, candidate_fn, args):
+    """
+    Vérifie que candidate_fn produit exactement la sortie de reference_fn
+    et retourne un dictionnaire de mesures.
+    """
+    expected, t_ref = time_call(reference_fn, *args)
+    actual, t_new = time_call(candidate_fn, *args)
+
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual.reset_index(drop=True))
+
+    return {
+        'transform': name,
+        'rows_out': len(actual),
+        'rowwise_s': round(t_ref, 4),
+        'vectorized_s': round(t_new, 4),
+        'speedup': round(t_ref / max(t_new, 1e-9), 1),
+    }
+
+
+# ------------------------------
+# BENCHMARKS
+# ------------------------------
+
+def bench_dim_customer(n):
+    sql_customers, excel_customers = make_customers_frames(n)
+    return compare_implementations(f"build_dim_customer (n={n})",
+                                   ETL.build_dim_customer_rowwise, ETL.build_dim_customer,
+                                   (sql_customers, excel_customers))
+
+
+def bench_dim_employee(n):
+    sql_employees, excel_employees = make_employees_frames(n)
+    return compare_implementations(f"build_dim_employee (n={n})",
+                                   ETL.build_dim_employee_rowwise, ETL.build_dim_employee,
+                                   (sql_employees, excel_employees))
+
+
+def bench_dim_order(n):
+    sql_orders, excel_orders = make_orders_frames(n)
+    return compare_implementations(f"build_dim_order (n={n})",
+                                   ETL.build_dim_order_rowwise, ETL.build_dim_order,
+                                   (sql_orders, excel_orders))
+
+
+if __name__ == "__main__":
+    SIZES = [1_000, 10_000, 100_000]
+    ORDER_SIZES = SIZES + [1_000_000]   # la version ligne à ligne prend plusieurs minutes à 1M
+
+    print("\n===== BENCHMARK TRANSFORMATIONS =====\n")
+    results = [bench_dim_customer(n) for n in SIZES]
+    results += [bench_dim_employee(n) for n in SIZES]
+    results += [bench_dim_order(n) for n in ORDER_SIZES]
+
+    print("✔ Sorties identiques (vectorisé == ligne à ligne)\n")
+    print(pd.DataFrame(results).to_string(index=False))
@@ -13,7 +13,13 @@ CREATE TABLE DimDate (
     MonthName NVARCHAR(20),
     [Day] INT,
     DayOfWeek INT,
-    IsWeekend BIT
+    IsWeekend BIT,
+    -- Attributs ISO 8601 et exercice fiscal (optionnels, remplis par l'ETL)
+    IsoYear INT NULL,
+    IsoWeek INT NULL,
+    FiscalYear INT NULL,
+    FiscalQuarter INT NULL,
+    FiscalMonth INT NULL
 );
 GO
 
@@ -28,7 +34,12 @@ CREATE TABLE DimCustomer (
     FirstName NVARCHAR(100),
     City NVARCHAR(100),
     StateProvince NVARCHAR(100),
-    CountryRegion NVARCHAR(100)
+    CountryRegion NVARCHAR(100),
+    -- Détection des changements (empreinte des attributs) et versions SCD type 2
+    RowHash BIGINT NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent BIT NOT NULL DEFAULT 1
 );
 GO
 
@@ -40,7 +51,12 @@ CREATE TABLE DimEmployee (
     FirstName NVARCHAR(100),
     JobTitle NVARCHAR(100),
     City NVARCHAR(100),
-    CountryRegion NVARCHAR(100)
+    CountryRegion NVARCHAR(100),
+    -- Colonnes SCD (voir DimCustomer)
+    RowHash BIGINT NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent BIT NOT NULL DEFAULT 1
 );
 GO
 
@@ -69,6 +85,11 @@ CREATE TABLE DimTerritory (
   TerritoryCode NVARCHAR(20),
   TerritoryName NVARCHAR(150),
   RegionID INT NULL,
+  -- Colonnes SCD (voir DimCustomer)
+  RowHash BIGINT NULL,
+  ValidFrom DATE NULL,
+  ValidTo DATE NULL,
+  IsCurrent BIT NOT NULL DEFAULT 1,
   CONSTRAINT FK_Territory_Region FOREIGN KEY (RegionID) REFERENCES DimRegion(RegionID)
 );
 GO
@@ -102,3 +123,70 @@ CREATE TABLE Tabledefait (
     CONSTRAINT FK_Fact_Date FOREIGN KEY (DateKey) REFERENCES DimDate(DateKey)
 );
 GO
+
+-- Contrôle des doublons au chargement (NOT EXISTS de load_fact). Lot séparé et gardé :
+-- ajouté aussi aux DW existants, dont le lot de Tabledefait est ignoré par ensure_schema
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Tabledefait_DedupKeys'
+               AND object_id = OBJECT_ID('Tabledefait'))
+    CREATE INDEX IX_Tabledefait_DedupKeys ON Tabledefait (OrderID, DateKey);
+GO
+
+
+
+-- ---------------------------------------------------------------------
+-- Agrégats matérialisés pour le dashboard (rafraîchis par l'ETL après
+-- Tabledefait, par mois touchés ; Year/Month NULL = faits sans date)
+-- ---------------------------------------------------------------------
+
+-- Année/mois × région × territoire × employé × pays
+CREATE TABLE AggFactMonthly (
+    [Year] INT NULL,
+    [Month] INT NULL,
+    RegionID INT NULL,
+    TerritoryID INT NULL,
+    EmployeeID INT NULL,
+    CountryRegion NVARCHAR(100) NULL,
+    Orders INT NOT NULL,
+    OrdersDelivered INT NOT NULL,
+    OrdersNotDelivered INT NOT NULL
+);
+CREATE INDEX IX_AggFactMonthly_Period ON AggFactMonthly ([Year], [Month]);
+GO
+
+-- Jour de semaine × mois (heatmap, semaine / week-end)
+CREATE TABLE AggFactWeekdayMonth (
+    [Year] INT NULL,
+    [Month] INT NULL,
+    DayOfWeek INT NULL,
+    IsWeekend BIT NULL,
+    RegionID INT NULL,
+    TerritoryID INT NULL,
+    EmployeeID INT NULL,
+    Orders INT NOT NULL,
+    OrdersDelivered INT NOT NULL,
+    OrdersNotDelivered INT NOT NULL
+);
+CREATE INDEX IX_AggFactWeekdayMonth_Period ON AggFactWeekdayMonth ([Year], [Month]);
+GO
+
+-- Année × client (top clients)
+CREATE TABLE AggFactCustomerYearly (
+    [Year] INT NULL,
+    CustomerID INT NULL,
+    RegionID INT NULL,
+    TerritoryID INT NULL,
+    EmployeeID INT NULL,
+    Orders INT NOT NULL,
+    OrdersDelivered INT NOT NULL,
+    OrdersNotDelivered INT NOT NULL
+);
+CREATE INDEX IX_AggFactCustomerYearly_Period ON AggFactCustomerYearly ([Year]);
+GO
+
+-- Journal des chargements (ETL.load_all) : dernier LoadID lu par la sonde du snapshot du dashboard
+CREATE TABLE EtlLoadLog (
+    LoadID INT IDENTITY(1,1) PRIMARY KEY,
+    LoadedAt DATETIME NOT NULL,
+    FactRows INT NULL
+);
+GO
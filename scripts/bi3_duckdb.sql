@@ -0,0 +1,167 @@
+-- bi3_duckdb.sql
+-- Schéma du Data Warehouse Northwind_BI3 (voir bi3.sql) transposé pour DuckDB :
+-- DW embarqué en colonnes, pour l'exécution hors SQL Server et les benchmarks.
+-- IDENTITY(1,1) -> séquence + DEFAULT nextval(), NVARCHAR -> VARCHAR.
+-- Pas de clés étrangères : DuckDB les vérifie ligne à ligne et interdit ensuite
+-- la mise à jour des clés référencées (l'intégrité est contrôlée par l'ETL).
+-- Pas d'index secondaire (IX_Tabledefait_DedupKeys, IX_AggFact*_Period) : les index ART
+-- servent aux recherches ponctuelles ; le NOT EXISTS de load_fact est une anti-jointure par
+-- hachage et les filtres de période s'appuient sur les zone maps (min/max par bloc).
+
+
+CREATE SEQUENCE IF NOT EXISTS seq_DimCustomer START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_DimEmployee START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_DimRegion START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_DimTerritory START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_Tabledefait START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_EtlLoadLog START 1;
+
+CREATE TABLE IF NOT EXISTS DimDate (
+    DateKey INTEGER PRIMARY KEY,      -- YYYYMMDD
+    DateValue DATE NOT NULL,
+    "Year" INTEGER,
+    "Quarter" INTEGER,
+    "Month" INTEGER,
+    MonthName VARCHAR,
+    "Day" INTEGER,
+    DayOfWeek INTEGER,
+    IsWeekend INTEGER,
+    -- Attributs ISO 8601 et exercice fiscal (optionnels, remplis par l'ETL)
+    IsoYear INTEGER,
+    IsoWeek INTEGER,
+    FiscalYear INTEGER,
+    FiscalQuarter INTEGER,
+    FiscalMonth INTEGER
+);
+
+-- Dimension Customer
+CREATE TABLE IF NOT EXISTS DimCustomer (
+    CustomerID INTEGER PRIMARY KEY DEFAULT nextval('seq_DimCustomer'),
+    CustomerCode VARCHAR,
+    Company VARCHAR,
+    LastName VARCHAR,
+    FirstName VARCHAR,
+    City VARCHAR,
+    StateProvince VARCHAR,
+    CountryRegion VARCHAR,
+    -- Détection des changements (empreinte des attributs) et versions SCD type 2
+    RowHash BIGINT NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent INTEGER NOT NULL DEFAULT 1
+);
+
+-- Dimension Employee
+CREATE TABLE IF NOT EXISTS DimEmployee (
+    EmployeeID INTEGER PRIMARY KEY DEFAULT nextval('seq_DimEmployee'),
+    EmployeeCode VARCHAR,
+    LastName VARCHAR,
+    FirstName VARCHAR,
+    JobTitle VARCHAR,
+    City VARCHAR,
+    CountryRegion VARCHAR,
+    -- Colonnes SCD (voir DimCustomer)
+    RowHash BIGINT NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent INTEGER NOT NULL DEFAULT 1
+);
+
+-- Dimension Order (ici on garde OrderID comme natural key d'origine)
+CREATE TABLE IF NOT EXISTS DimOrder (
+    OrderID INTEGER PRIMARY KEY,
+    CustomerCode VARCHAR,                 -- Natural key pour mapping
+    EmployeeCode VARCHAR,                 -- Natural key pour mapping
+    OrderDate DATE,
+    ShippedDate DATE,
+    StatusID INTEGER
+);
+
+-- Dimension Region
+CREATE TABLE IF NOT EXISTS DimRegion (
+    RegionID INTEGER PRIMARY KEY DEFAULT nextval('seq_DimRegion'),
+    RegionCode VARCHAR,
+    RegionName VARCHAR
+);
+
+-- Dimension Territory (liaison vers Region)
+CREATE TABLE IF NOT EXISTS DimTerritory (
+    TerritoryID INTEGER PRIMARY KEY DEFAULT nextval('seq_DimTerritory'),
+    TerritoryCode VARCHAR,
+    TerritoryName VARCHAR,
+    RegionID INTEGER,
+    -- Colonnes SCD (voir DimCustomer)
+    RowHash BIGINT NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent INTEGER NOT NULL DEFAULT 1
+);
+
+-- Bridge Employee <-> Territory (many-to-many)
+CREATE TABLE IF NOT EXISTS EmployeeTerritoryBridge (
+    EmployeeID INTEGER NOT NULL,
+    TerritoryID INTEGER NOT NULL,
+    PRIMARY KEY (EmployeeID, TerritoryID)
+);
+
+-- Table de faits (Fact)
+CREATE TABLE IF NOT EXISTS Tabledefait (
+    FactID INTEGER PRIMARY KEY DEFAULT nextval('seq_Tabledefait'),
+    OrderID INTEGER,
+    CustomerID INTEGER,
+    EmployeeID INTEGER,
+    OrdersDelivered INTEGER,
+    OrdersNotDelivered INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    DateKey INTEGER
+);
+
+-- Agrégats matérialisés pour le dashboard (rafraîchis par l'ETL après
+-- Tabledefait, par mois touchés ; Year/Month NULL = faits sans date)
+
+-- Année/mois × région × territoire × employé × pays
+CREATE TABLE IF NOT EXISTS AggFactMonthly (
+    "Year" INTEGER,
+    "Month" INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    EmployeeID INTEGER,
+    CountryRegion VARCHAR,
+    Orders INTEGER NOT NULL,
+    OrdersDelivered INTEGER NOT NULL,
+    OrdersNotDelivered INTEGER NOT NULL
+);
+
+-- Jour de semaine × mois (heatmap, semaine / week-end)
+CREATE TABLE IF NOT EXISTS AggFactWeekdayMonth (
+    "Year" INTEGER,
+    "Month" INTEGER,
+    DayOfWeek INTEGER,
+    IsWeekend INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    EmployeeID INTEGER,
+    Orders INTEGER NOT NULL,
+    OrdersDelivered INTEGER NOT NULL,
+    OrdersNotDelivered INTEGER NOT NULL
+);
+
+-- Année × client (top clients)
+CREATE TABLE IF NOT EXISTS AggFactCustomerYearly (
+    "Year" INTEGER,
+    CustomerID INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    EmployeeID INTEGER,
+    Orders INTEGER NOT NULL,
+    OrdersDelivered INTEGER NOT NULL,
+    OrdersNotDelivered INTEGER NOT NULL
+);
+
+-- Journal des chargements (ETL.load_all) : dernier LoadID lu par la sonde du snapshot du dashboard
+CREATE TABLE IF NOT EXISTS EtlLoadLog (
+    LoadID INTEGER PRIMARY KEY DEFAULT nextval('seq_EtlLoadLog'),
+    LoadedAt TIMESTAMP NOT NULL,
+    FactRows INTEGER
+);
@@ -0,0 +1,160 @@
+-- bi3_sqlite.sql
+-- Schéma du Data Warehouse Northwind_BI3 (voir bi3.sql) transposé pour SQLite :
+-- DW embarqué utilisé pour les benchmarks et l'exécution hors SQL Server.
+-- IDENTITY(1,1) -> INTEGER PRIMARY KEY AUTOINCREMENT, NVARCHAR -> TEXT.
+
+
+CREATE TABLE IF NOT EXISTS DimDate (
+    DateKey INTEGER PRIMARY KEY,      -- YYYYMMDD
+    DateValue DATE NOT NULL,
+    [Year] INTEGER,
+    [Quarter] INTEGER,
+    [Month] INTEGER,
+    MonthName TEXT,
+    [Day] INTEGER,
+    DayOfWeek INTEGER,
+    IsWeekend INTEGER,
+    -- Attributs ISO 8601 et exercice fiscal (optionnels, remplis par l'ETL)
+    IsoYear INTEGER,
+    IsoWeek INTEGER,
+    FiscalYear INTEGER,
+    FiscalQuarter INTEGER,
+    FiscalMonth INTEGER
+);
+
+-- Dimension Customer
+CREATE TABLE IF NOT EXISTS DimCustomer (
+    CustomerID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CustomerCode TEXT,
+    Company TEXT,
+    LastName TEXT,
+    FirstName TEXT,
+    City TEXT,
+    StateProvince TEXT,
+    CountryRegion TEXT,
+    -- Détection des changements (empreinte des attributs) et versions SCD type 2
+    RowHash INTEGER NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent INTEGER NOT NULL DEFAULT 1
+);
+
+-- Dimension Employee
+CREATE TABLE IF NOT EXISTS DimEmployee (
+    EmployeeID INTEGER PRIMARY KEY AUTOINCREMENT,
+    EmployeeCode TEXT,
+    LastName TEXT,
+    FirstName TEXT,
+    JobTitle TEXT,
+    City TEXT,
+    CountryRegion TEXT,
+    -- Colonnes SCD (voir DimCustomer)
+    RowHash INTEGER NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent INTEGER NOT NULL DEFAULT 1
+);
+
+-- Dimension Order (ici on garde OrderID comme natural key d'origine)
+CREATE TABLE IF NOT EXISTS DimOrder (
+    OrderID INTEGER PRIMARY KEY,
+    CustomerCode TEXT,                    -- Natural key pour mapping
+    EmployeeCode TEXT,                    -- Natural key pour mapping
+    OrderDate DATE,
+    ShippedDate DATE,
+    StatusID INTEGER
+);
+
+-- Dimension Region
+CREATE TABLE IF NOT EXISTS DimRegion (
+    RegionID INTEGER PRIMARY KEY AUTOINCREMENT,
+    RegionCode TEXT,
+    RegionName TEXT
+);
+
+-- Dimension Territory (liaison vers Region)
+CREATE TABLE IF NOT EXISTS DimTerritory (
+    TerritoryID INTEGER PRIMARY KEY AUTOINCREMENT,
+    TerritoryCode TEXT,
+    TerritoryName TEXT,
+    RegionID INTEGER NULL REFERENCES DimRegion(RegionID),
+    -- Colonnes SCD (voir DimCustomer)
+    RowHash INTEGER NULL,
+    ValidFrom DATE NULL,
+    ValidTo DATE NULL,
+    IsCurrent INTEGER NOT NULL DEFAULT 1
+);
+
+-- Bridge Employee <-> Territory (many-to-many)
+CREATE TABLE IF NOT EXISTS EmployeeTerritoryBridge (
+    EmployeeID INTEGER NOT NULL REFERENCES DimEmployee(EmployeeID),
+    TerritoryID INTEGER NOT NULL REFERENCES DimTerritory(TerritoryID),
+    PRIMARY KEY (EmployeeID, TerritoryID)
+);
+
+-- Table de faits (Fact)
+CREATE TABLE IF NOT EXISTS Tabledefait (
+    FactID INTEGER PRIMARY KEY AUTOINCREMENT,
+    OrderID INTEGER REFERENCES DimOrder(OrderID),
+    CustomerID INTEGER REFERENCES DimCustomer(CustomerID),
+    EmployeeID INTEGER REFERENCES DimEmployee(EmployeeID),
+    OrdersDelivered INTEGER,
+    OrdersNotDelivered INTEGER,
+    RegionID INTEGER NULL REFERENCES DimRegion(RegionID),
+    TerritoryID INTEGER NULL REFERENCES DimTerritory(TerritoryID),
+    DateKey INTEGER NULL REFERENCES DimDate(DateKey)
+);
+-- Contrôle des doublons au chargement (NOT EXISTS de load_fact)
+CREATE INDEX IF NOT EXISTS IX_Tabledefait_DedupKeys ON Tabledefait (OrderID, DateKey);
+
+-- Agrégats matérialisés pour le dashboard (rafraîchis par l'ETL après
+-- Tabledefait, par mois touchés ; Year/Month NULL = faits sans date)
+
+-- Année/mois × région × territoire × employé × pays
+CREATE TABLE IF NOT EXISTS AggFactMonthly (
+    [Year] INTEGER,
+    [Month] INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    EmployeeID INTEGER,
+    CountryRegion TEXT,
+    Orders INTEGER NOT NULL,
+    OrdersDelivered INTEGER NOT NULL,
+    OrdersNotDelivered INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_AggFactMonthly_Period ON AggFactMonthly ([Year], [Month]);
+
+-- Jour de semaine × mois (heatmap, semaine / week-end)
+CREATE TABLE IF NOT EXISTS AggFactWeekdayMonth (
+    [Year] INTEGER,
+    [Month] INTEGER,
+    DayOfWeek INTEGER,
+    IsWeekend INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    EmployeeID INTEGER,
+    Orders INTEGER NOT NULL,
+    OrdersDelivered INTEGER NOT NULL,
+    OrdersNotDelivered INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_AggFactWeekdayMonth_Period ON AggFactWeekdayMonth ([Year], [Month]);
+
+-- Année × client (top clients)
+CREATE TABLE IF NOT EXISTS AggFactCustomerYearly (
+    [Year] INTEGER,
+    CustomerID INTEGER,
+    RegionID INTEGER,
+    TerritoryID INTEGER,
+    EmployeeID INTEGER,
+    Orders INTEGER NOT NULL,
+    OrdersDelivered INTEGER NOT NULL,
+    OrdersNotDelivered INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_AggFactCustomerYearly_Period ON AggFactCustomerYearly ([Year]);
+
+-- Journal des chargements (ETL.load_all) : dernier LoadID lu par la sonde du snapshot du dashboard
+CREATE TABLE IF NOT EXISTS EtlLoadLog (
+    LoadID INTEGER PRIMARY KEY AUTOINCREMENT,
+    LoadedAt TIMESTAMP NOT NULL,
+    FactRows INTEGER
+);
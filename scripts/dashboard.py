@@ -9,8 +9,17 @@ import pyodbc
 import plotly.express as px
 import numpy as np
 import io
+import time
 import calendar
-from typing import Dict
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from db_connect_pool import DB_CONFIGS, build_conn_str, get_pool_for, pool_stats
+from dashboard_data import (query_aggregate, read_dw_details, read_dw_quality,   # requêtes exécutées par le DW
+                            read_filter_options, read_data_version, FilterIndex, GROUPINGS, QUERY_SOURCES)
+from dashboard_snapshot import DetailSnapshot, read_snapshot_probe, snapshot_dir
+from dw_backend import BACKENDS, DW_BACKEND, get_backend
 
 # =====================================================================
 # CONFIGURATION GLOBALE
@@ -49,88 +58,260 @@ st.markdown(f"""
 # CONNEXION
 # =====================================================================
 
-def get_connection(server: str = ".", database: str = "Northwind_BI3",
-                   uid: str = "sa", pwd: str = "maroua") -> pyodbc.Connection:
-    conn_str = (
-        f"DRIVER={{SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={uid};"
-        f"PWD={pwd};"
-        f"Trusted_Connection=no;"
-    )
-    return pyodbc.connect(conn_str, timeout=5)
+DW_CONFIG = DB_CONFIGS["bi"]
+
+def get_connection(server: str = DW_CONFIG["server"], database: str = DW_CONFIG["database"],
+                   uid: str = DW_CONFIG["uid"], pwd: str = DW_CONFIG["pwd"]) -> pyodbc.Connection:
+    """
+    Emprunte une connexion au pool partagé (un pool par jeu de paramètres,
+    commun à toutes les sessions Streamlit) ; conn.close() la rend au pool.
+    """
+    conn_str = build_conn_str(server=server, database=database, uid=uid, pwd=pwd,
+                              driver=DW_CONFIG["driver"])
+    return get_pool_for(conn_str, timeout=5).acquire()
 
 # =====================================================================
 # CHARGEMENT (CACHÉ)
 # =====================================================================
 
-@st.cache_data(ttl=600)
-def load_dw_data(params: Dict) -> pd.DataFrame:
+def open_dw(params: Dict):
     """
-    Charge et normalise les données du Data Warehouse.
-    params: dict(server, database, uid, pwd)
+    Ouvre une connexion au DW décrit par params et retourne (backend, conn).
+    params: dict(backend, server, database, uid, pwd) ou dict(backend, path) pour un DW embarqué
     """
-    conn = None
+    backend = get_backend(params.get("backend", DW_BACKEND), params.get("path"))
+    if backend.name == "sqlserver":
+        conn = get_connection(server=params.get("server", DW_CONFIG["server"]),
+                              database=params.get("database", DW_CONFIG["database"]),
+                              uid=params.get("uid", DW_CONFIG["uid"]),
+                              pwd=params.get("pwd", DW_CONFIG["pwd"]))
+    else:
+        conn = backend.connect()
+    return backend, conn
+
+LATEST_ORDERS_LIMIT = 200      # « Dernières commandes »
+MISSING_CUSTOMERS_LIMIT = 200  # exemples de la qualité des données
+
+def run_on_dw(params: Dict, reader, *args, **kwargs):
+    """Exécute reader(conn, *args, backend=...) sur une connexion du DW décrit par params."""
+    backend, conn = open_dw(params)
     try:
-        conn = get_connection(server=params.get("server", "."),
-                              database=params.get("database", "Northwind_BI3"),
-                              uid=params.get("uid", "sa"),
-                              pwd=params.get("pwd", "maroua"))
-        query = """
-        SELECT f.*,
-               d.DateValue, d.[Year], d.[Month], d.MonthName, d.DayOfWeek, d.IsWeekend,
-               c.Company, c.City AS CustomerCity, c.CountryRegion,
-               e.FirstName AS EmpFirst, e.LastName AS EmpLast,
-               ter.TerritoryName, reg.RegionName
-        FROM Tabledefait f
-        LEFT JOIN DimDate d ON f.DateKey = d.DateKey
-        LEFT JOIN DimCustomer c ON f.CustomerID = c.CustomerID
-        LEFT JOIN DimEmployee e ON f.EmployeeID = e.EmployeeID
-        LEFT JOIN DimTerritory ter ON f.TerritoryID = ter.TerritoryID
-        LEFT JOIN DimRegion reg ON ter.RegionID = reg.RegionID
-        """
-        df = pd.read_sql(query, conn)
+        return reader(conn, *args, backend=backend, **kwargs)
     finally:
-        if conn:
-            conn.close()
+        conn.close()
+
+# Les filtres et regroupements sont traduits en SQL paramétré (dashboard_data) :
+# seuls des résultats de la taille de l'affichage quittent le DW, quel que soit
+# le volume de Tabledefait. Un résultat est mis en cache par jeu de filtres.
+
+@st.cache_data(ttl=600)
+def load_filter_options(params: Dict, version: tuple) -> Dict:
+    """Années, employés, régions, territoires et pays proposés dans les filtres."""
+    return run_on_dw(params, read_filter_options)
 
-    # Normalisation
-    df["DateValue"] = pd.to_datetime(df.get("DateValue"), errors="coerce")
-    df["EmpFirst"] = df.get("EmpFirst", "").fillna("").astype(str)
-    df["EmpLast"] = df.get("EmpLast", "").fillna("").astype(str)
-    df["Employee"] = (df["EmpFirst"] + " " + df["EmpLast"]).str.strip().replace("", np.nan)
+@st.cache_data(ttl=30)
+def load_data_version(params: Dict) -> tuple:
+    """Version des données du DW (relue au plus toutes les 30 s) : change après chaque chargement ETL."""
+    return run_on_dw(params, read_data_version)
 
-    # KPI flags robustes
-    df["OrdersDelivered"] = df.get("OrdersDelivered", 0).fillna(0).astype(int)
-    df["OrdersNotDelivered"] = df.get("OrdersNotDelivered", 0).fillna(0).astype(int)
-    df["DeliveredFlag"] = df["OrdersDelivered"].clip(0,1).astype(int)
-    df["NotDeliveredFlag"] = df["OrdersNotDelivered"].clip(0,1).astype(int)
+@st.cache_data(ttl=600)
+def load_dw_details(params: Dict, filters: Dict, limit: int = None, conditions: tuple = ()) -> pd.DataFrame:
+    """
+    Détail des commandes filtré et limité par le DW (les plus récentes d'abord) :
+    dernières commandes et exemples de la qualité des données.
+    """
+    return run_on_dw(params, read_dw_details, filters, limit=limit, conditions=list(conditions))
 
-    # Country normalization
-    if "CountryRegion" in df.columns:
-        df["CountryRegion"] = df["CountryRegion"].astype(str).replace("nan", np.nan)
+@st.cache_data(ttl=30)
+def load_snapshot_probe(params: Dict) -> tuple:
+    """Sonde de changement du détail (dernier FactID, nombre de faits, jeton des dimensions et des chargements)."""
+    return run_on_dw(params, read_snapshot_probe)
 
-    # Adds: Year, MonthName if not present
-    if "MonthName" not in df.columns and "DateValue" in df.columns:
-        df["MonthName"] = df["DateValue"].dt.strftime("%b").fillna("Unknown")
-    if "Year" not in df.columns and "DateValue" in df.columns:
-        df["Year"] = df["DateValue"].dt.year
+@st.cache_resource(max_entries=2)
+def load_detail_index(params: Dict, probe: tuple):
+    """
+    Détail complet des commandes (trié par date décroissante) et index des filtres, construits
+    une fois par état du DW (sonde) et partagés par les sessions : cache_resource ne copie pas
+    le DataFrame à chaque rerun. Le résultat ne doit pas être modifié.
+    Le détail vient du snapshot local (dashboard_snapshot) : relu localement s'il correspond
+    à la sonde, sinon complété par les nouveaux faits ou reconstruit.
+    Retourne (index, rapport du snapshot).
+    """
+    snapshot = DetailSnapshot(snapshot_dir(params))
+    frame = snapshot.load() if snapshot.matches(probe) else run_on_dw(params, snapshot.refresh, probe)
+    return FilterIndex(frame), snapshot.report
 
-    return df
+@st.cache_data(ttl=600)
+def load_data_quality(params: Dict) -> pd.DataFrame:
+    """Valeurs manquantes par colonne de la jointure détaillée (comptées par le DW)."""
+    return run_on_dw(params, read_dw_quality)
 
 # =====================================================================
-# UTILITAIRES
+# SERVICE D'AGRÉGATS (CACHE LRU PARTAGÉ PAR LES SESSIONS ET LES ONGLETS)
 # =====================================================================
 
-def summarize_data_quality(df: pd.DataFrame) -> pd.DataFrame:
-    total = len(df)
-    rows = []
-    for col in df.columns:
-        nulls = int(df[col].isna().sum())
-        pct = round(100 * nulls / max(1, total), 2)
-        rows.append({"column": col, "missing": nulls, "missing_pct": pct})
-    return pd.DataFrame(rows).sort_values("missing", ascending=False)
+AGGREGATE_CACHE_SIZE = 256   # entrées : agrégat × DW × version des données × filtres
+AGGREGATE_TTL = 600          # s (changements non visibles dans la version, ex. SCD 1)
+
+class AggregateCache:
+    """
+    Cache LRU borné et thread-safe des agrégats nommés, avec compteurs par agrégat
+    (hits, misses, evictions). Le calcul d'une entrée absente se fait hors verrou :
+    une session lente ne bloque pas les autres.
+    """
+
+    def __init__(self, max_entries: int = AGGREGATE_CACHE_SIZE, ttl: float = AGGREGATE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # clé -> (horodatage, valeur)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, counter: str):
+        counters = self._counters.setdefault(name, {"hits": 0, "misses": 0, "evictions": 0})
+        counters[counter] += 1
+
+    def get(self, key: tuple, compute: Callable):
+        """Valeur en cache pour key (key[0] = nom de l'agrégat), sinon compute() puis mise en cache."""
+        name = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self._count(name, "hits")
+                return entry[1]
+            self._count(name, "misses")
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._count(evicted[0], "evictions")
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = sum(c["hits"] for c in self._counters.values())
+            misses = sum(c["misses"] for c in self._counters.values())
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": hits, "misses": misses,
+                    "hit_rate": round(hits / max(1, hits + misses), 3),
+                    "by_aggregate": {name: dict(c) for name, c in sorted(self._counters.items())}}
+
+@st.cache_resource
+def aggregate_cache() -> AggregateCache:
+    """Instance unique du cache d'agrégats (partagée par toutes les sessions)."""
+    return AggregateCache()
+
+# ---------- Agrégats nommés : compute(query, aggregate) ----------
+# query(**kwargs) : regroupement SQL de l'agrégat (filtres appliqués par le DW) ;
+# aggregate(nom) : autre agrégat nommé, mêmes DW / version / filtres (lui aussi en cache).
+# Les résultats sont partagés : ne pas les modifier en place.
+
+def _kpis(query, aggregate) -> Dict:
+    totals = query().iloc[0]
+    delivered, not_delivered = int(totals["OrdersDelivered"]), int(totals["OrdersNotDelivered"])
+    pct_delivered = round((delivered / max(1, delivered + not_delivered)) * 100, 1)
+    return {"total_orders": int(totals["Orders"]), "delivered": delivered, "not_delivered": not_delivered,
+            "pct_delivered": pct_delivered, "pct_not_delivered": round(100 - pct_delivered, 1)}
+
+def _monthly(query, aggregate) -> pd.DataFrame:
+    return (query()[["MonthStart", "OrdersDelivered", "OrdersNotDelivered"]]
+            .sort_values("MonthStart").reset_index(drop=True))
+
+def _weekend_split(query, aggregate) -> Dict:
+    weekday = aggregate("weekday")
+    return {"weekend": int(weekday.loc[weekday["IsWeekend"] == 1, "OrdersDelivered"].sum()),
+            "weekdays": int(weekday.loc[weekday["IsWeekend"] == 0, "OrdersDelivered"].sum())}
+
+def _heatmap(query, aggregate) -> pd.DataFrame:
+    """Livrées par jour de semaine (lignes, lundi → dimanche) × mois (colonnes)."""
+    df_heat = aggregate("weekday").dropna(subset=["MonthStart", "DayOfWeek"]).copy()
+    # Weekday ordering Mon..Sun (DimDate.DayOfWeek : 1=Monday .. 7=Sunday)
+    df_heat["WeekdayNum"] = df_heat["DayOfWeek"].astype(int) - 1  # Mon=0
+    df_heat["MonthName"] = df_heat["MonthStart"].dt.strftime("%b")
+    # Pivot table: index weekday, columns month, values sum of delivered orders
+    pivot = df_heat.pivot_table(index="WeekdayNum", columns="MonthName", values="OrdersDelivered", aggfunc="sum", fill_value=0)
+    # Reindex rows to Monday-Sunday
+    weekdays_order = [calendar.day_name[i] for i in range(7)]
+    pivot.index = [calendar.day_name[i] for i in pivot.index]
+    return pivot.reindex(weekdays_order).fillna(0)
+
+def _delivered_by(column: str) -> Callable:
+    """Livraisons par valeur de column, décroissantes (barres Région / Territoire / Pays)."""
+    def compute(query, aggregate) -> pd.DataFrame:
+        return (query()[[column, "OrdersDelivered"]].rename(columns={"OrdersDelivered": "DeliveredFlag"})
+                .sort_values("DeliveredFlag", ascending=False).reset_index(drop=True))
+    return compute
+
+def _country_stats(query, aggregate) -> pd.DataFrame:
+    table = query().rename(columns={"Orders": "TotalOrders", "OrdersDelivered": "Delivered",
+                                    "OrdersNotDelivered": "NotDelivered"})[
+        ["CountryRegion", "TotalOrders", "Delivered", "NotDelivered"]]
+    table["DeliveryRate"] = (table["Delivered"] / table["TotalOrders"].clip(lower=1) * 100).round(2)
+    return table.sort_values("Delivered", ascending=False).reset_index(drop=True)
+
+def _top_clients(query, aggregate) -> pd.DataFrame:
+    top = query(order_by='"OrdersDelivered" DESC', limit=10)
+    return top[["Company", "OrdersDelivered"]].rename(columns={"OrdersDelivered": "DeliveredFlag"})
+
+def _top_employees(query, aggregate) -> pd.DataFrame:
+    # Nom complet reconstitué côté Python : groupes par (prénom, nom), sans exclure un prénom vide
+    df_emp = query(dropna=False).dropna(subset=["Employee"])
+    return (df_emp.groupby("Employee")[["OrdersDelivered"]].sum().reset_index()
+            .rename(columns={"OrdersDelivered": "DeliveredFlag"})
+            .sort_values("DeliveredFlag", ascending=False).head(10))
+
+# nom -> (regroupement SQL de dashboard_data.GROUPINGS, calcul)
+AGGREGATES = {
+    "kpis": ("total", _kpis),
+    "monthly": ("month", _monthly),
+    "weekday": ("weekday", lambda query, aggregate: query()),
+    "weekend_split": ("weekday", _weekend_split),
+    "heatmap": ("weekday", _heatmap),
+    "by_region": ("region", _delivered_by("RegionName")),
+    "by_territory": ("territory", _delivered_by("TerritoryName")),
+    "by_country": ("country", _delivered_by("CountryRegion")),
+    "country_stats": ("country", _country_stats),
+    "top_clients": ("customer", _top_clients),
+    "top_employees": ("employee", _top_employees),
+}
+
+def _freeze(value):
+    """Valeur hachable et indépendante de l'ordre de sélection (clé du cache)."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(value))
+    return value
+
+def get_aggregate(name: str, params: Dict, version: tuple, filters: Dict):
+    """
+    Agrégat nommé, calculé une fois par (DW, version des données, filtres utiles à l'agrégat) :
+    seuls les filtres de la source SQL entrent dans la clé.
+    """
+    grouping, compute = AGGREGATES[name]
+    source_filters = QUERY_SOURCES[GROUPINGS[grouping][0]]["filters"]
+    key = (name, _freeze(params), version, _freeze({k: v for k, v in filters.items() if k in source_filters}))
+
+    def query(**kwargs) -> pd.DataFrame:
+        return run_on_dw(params, query_aggregate, grouping, filters, **kwargs)
+
+    def aggregate(other: str):
+        return get_aggregate(other, params, version, filters)
+
+    return aggregate_cache().get(key, lambda: compute(query, aggregate))
+
+# =====================================================================
+# UTILITAIRES
+# =====================================================================
 
 def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
     towrite = io.BytesIO()
@@ -143,21 +324,35 @@ def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
 
 st.sidebar.title("🔧 Connexion & Filtres")
 
-server = st.sidebar.text_input("SQL Server (server)", value=".")
-database = st.sidebar.text_input("Database", value="Northwind_BI3")
-uid = st.sidebar.text_input("SQL UID", value="sa")
-pwd = st.sidebar.text_input("SQL PWD", value="maroua", type="password")
+backend_name = st.sidebar.selectbox("Backend DW", list(BACKENDS), index=list(BACKENDS).index(DW_BACKEND))
 
-connection_params = {"server": server, "database": database, "uid": uid, "pwd": pwd}
+if backend_name == "sqlserver":
+    server = st.sidebar.text_input("SQL Server (server)", value=DW_CONFIG["server"])
+    database = st.sidebar.text_input("Database", value=DW_CONFIG["database"])
+    uid = st.sidebar.text_input("SQL UID", value=DW_CONFIG["uid"])
+    pwd = st.sidebar.text_input("SQL PWD", value=DW_CONFIG["pwd"], type="password")
+    connection_params = {"backend": backend_name, "server": server, "database": database,
+                         "uid": uid, "pwd": pwd}
+else:
+    # DW embarqué (fichier produit par ETL.py --backend sqlite|duckdb)
+    dw_path = st.sidebar.text_input("Fichier DW", value=get_backend(backend_name).path)
+    connection_params = {"backend": backend_name, "path": dw_path}
 
 if st.sidebar.button("🔄 Recharger / Tester connexion"):
-    load_dw_data.clear()
+    st.cache_data.clear()
+    load_detail_index.clear()
+    aggregate_cache().clear()
     st.experimental_rerun()
 
+load_details = st.sidebar.checkbox(
+    "Charger le détail des commandes", value=False,
+    help="Toutes les commandes (Tabledefait × dimensions), lues depuis un snapshot local mis à jour "
+         "quand le DW change, et indexées par filtre : "
+         "table détaillée et export CSV. Les KPI, graphiques et dernières commandes sont calculés par le DW.")
+
 st.sidebar.markdown("---")
-st.sidebar.markdown("Filtres globaux (utilisés dans Overview)") 
-# Filters initial placeholders (will be populated after load)
-st.sidebar.markdown("NB: Ajuste les filtres dans l'onglet Overview.")
+st.sidebar.markdown("Filtres globaux (utilisés par toutes les vues)")
+st.sidebar.markdown("NB: Ajuste les filtres dans « Filtres rapides », au-dessus des vues.")
 
 # =====================================================================
 # CHARGEMENT AVEC SPINNER
@@ -165,68 +360,69 @@ st.sidebar.markdown("NB: Ajuste les filtres dans l'onglet Overview.")
 
 with st.spinner("🔄 Chargement des données depuis le DW..."):
     try:
-        df = load_dw_data(connection_params)
+        data_version = load_data_version(connection_params)
+        options = load_filter_options(connection_params, data_version)
         st.success("✅ Données chargées depuis le DW.")
     except Exception as e:
         st.error(f"❌ Erreur lors du chargement: {e}")
         st.stop()
 
+if options["rows"] == 0:
+    st.warning("⚠️ Agrégats vides : relancer l'ETL pour les (re)construire.")
+
+with st.sidebar.expander("🔌 Pool de connexions"):
+    st.json(pool_stats())
+
 # =====================================================================
 # GLOBAL FILTERS (OVERVIEW)
 # =====================================================================
 
 # Prepare filters' options
-years = sorted(df["Year"].dropna().unique().tolist()) if "Year" in df.columns else []
+years = options["years"]
 years_str = ["Toutes les années"] + [str(int(y)) for y in years]
 
-employees = sorted(df["Employee"].dropna().unique().tolist()) if "Employee" in df.columns else []
-regions = sorted(df["RegionName"].dropna().unique().tolist()) if "RegionName" in df.columns else []
-territories = sorted(df["TerritoryName"].dropna().unique().tolist()) if "TerritoryName" in df.columns else []
-countries = sorted(df["CountryRegion"].dropna().unique().tolist()) if "CountryRegion" in df.columns else []
+employees = sorted(options["employees"]["Employee"].unique().tolist())
+regions = options["regions"]
+territories = options["territories"]
+countries = options["countries"]
+
+# Filtres rapides : rendus avant la navigation pour rester actifs (et conservés) dans toutes les vues
+with st.expander("Filtres rapides"):
+    colf1, colf2, colf3, colf4 = st.columns(4)
+    selected_year_str = colf1.selectbox("Année", years_str, index=0)
+    selected_year = None if selected_year_str == "Toutes les années" else int(selected_year_str)
+
+    selected_employee = colf2.multiselect("Employés", employees, default=[])
+    selected_region = colf3.multiselect("Régions", regions, default=[])
+    selected_territory = colf4.multiselect("Territoires", territories, default=[])
 
-# Use placeholders in overview via expander (we'll create local controls per tab for clarity)
+# Filtres envoyés au DW (paramètres SQL) ; un employé peut avoir plusieurs EmployeeID (SCD 2)
+employee_ids = options["employees"].loc[options["employees"]["Employee"].isin(selected_employee), "EmployeeID"]
+filters = {"year": selected_year, "employee_ids": employee_ids.tolist(),
+           "regions": selected_region, "territories": selected_territory}
+
+def aggregate(name: str):
+    """Agrégat nommé (AGGREGATES) pour les filtres courants, partagé par les vues et les sessions."""
+    return get_aggregate(name, connection_params, data_version, filters)
 
 # =====================================================================
-# NAVIGATION PAR TABS
+# VUES (une fonction par vue ; seule la vue active est calculée à chaque rerun)
 # =====================================================================
 
-tabs = st.tabs(["Overview", "Dates & Trends", "Heatmap", "Regions & Map", "Top / Details", "Data Quality"])
-tab_overview, tab_dates, tab_heatmap, tab_regions, tab_top, tab_quality = tabs
-
 # ------------------------------
-# TAB: OVERVIEW
+# VUE: OVERVIEW
 # ------------------------------
-with tab_overview:
+def render_overview():
+    """KPI, tendance mensuelle, livrées / non livrées, dernières commandes."""
     st.title("📊 Northwind BI — Overview")
-    st.markdown("Utilisez les filtres rapides ci-dessous pour explorer les données.")
-
-    # Quick filters inline
-    with st.expander("Filtres rapides"):
-        colf1, colf2, colf3, colf4 = st.columns(4)
-        selected_year_str = colf1.selectbox("Année", years_str, index=0)
-        selected_year = None if selected_year_str == "Toutes les années" else int(selected_year_str)
-
-        selected_employee = colf2.multiselect("Employés", employees, default=[])
-        selected_region = colf3.multiselect("Régions", regions, default=[])
-        selected_territory = colf4.multiselect("Territoires", territories, default=[])
-
-    # Apply filters
-    df_filtered = df.copy()
-    if selected_year:
-        df_filtered = df_filtered[df_filtered["Year"] == selected_year]
-    if selected_employee:
-        df_filtered = df_filtered[df_filtered["Employee"].isin(selected_employee)]
-    if selected_region:
-        df_filtered = df_filtered[df_filtered["RegionName"].isin(selected_region)]
-    if selected_territory:
-        df_filtered = df_filtered[df_filtered["TerritoryName"].isin(selected_territory)]
+    st.markdown("Utilisez les filtres rapides ci-dessus pour explorer les données.")
+
+    agg_by_month = aggregate("monthly")
 
     # KPIs
-    total_orders = len(df_filtered)
-    delivered = int(df_filtered["DeliveredFlag"].sum())
-    not_delivered = int(df_filtered["NotDeliveredFlag"].sum())
-    pct_delivered = round((delivered / max(1, delivered + not_delivered)) * 100, 1)
-    pct_not_delivered = round(100 - pct_delivered, 1)
+    kpis = aggregate("kpis")
+    total_orders, delivered, not_delivered = kpis["total_orders"], kpis["delivered"], kpis["not_delivered"]
+    pct_delivered, pct_not_delivered = kpis["pct_delivered"], kpis["pct_not_delivered"]
 
     k1, k2, k3, k4 = st.columns(4)
     with k1:
@@ -244,11 +440,9 @@ with tab_overview:
     colA, colB = st.columns([2,1.1])
     with colA:
         st.subheader("Commandes livrées - Vue mensuelle")
-        if not df_filtered.empty and df_filtered["DateValue"].notna().any():
-            df_month = df_filtered.dropna(subset=["DateValue"])
-            df_month["Month"] = df_month["DateValue"].dt.to_period("M")
-            monthly = df_month.groupby("Month")[["DeliveredFlag"]].sum().reset_index()
-            monthly["Date"] = monthly["Month"].dt.to_timestamp()
+        if not agg_by_month.empty:
+            monthly = agg_by_month[["MonthStart", "OrdersDelivered"]]
+            monthly = monthly.rename(columns={"MonthStart": "Date", "OrdersDelivered": "DeliveredFlag"})
             fig_trend = px.line(monthly, x="Date", y="DeliveredFlag", markers=True, title="Livraisons - évolution mensuelle")
             st.plotly_chart(fig_trend, use_container_width=True)
         else:
@@ -261,31 +455,35 @@ with tab_overview:
 
     st.markdown("---")
     st.subheader("Dernières commandes")
+    latest = load_dw_details(connection_params, filters, limit=LATEST_ORDERS_LIMIT)
     st.dataframe(
-        df_filtered.sort_values("DateValue", ascending=False).head(200)[[
+        latest[[
             "OrderID", "DateValue", "Company", "Employee", "DeliveredFlag", "NotDeliveredFlag",
             "RegionName", "TerritoryName", "CountryRegion"
         ]], use_container_width=True
     )
 
 # ------------------------------
-# TAB: DATES & TRENDS (détails)
+# VUE: DATES & TRENDS (détails)
 # ------------------------------
-with tab_dates:
+def render_dates():
+    """Histogramme mensuel, semaine / week-end, livrées / non livrées par mois."""
     st.header("📅 Dates & Tendances détaillées")
+    total_orders = aggregate("kpis")["total_orders"]
+    agg_by_month = aggregate("monthly")
 
-    if df_filtered.empty:
+    if total_orders == 0:
         st.info("Aucun enregistrement après filtrage.")
     else:
         col1, col2 = st.columns([2, 1.2])
         with col1:
             st.subheader("Histogramme : Livrées par mois")
-            df_month = df_filtered.dropna(subset=["DateValue"])
-            if not df_month.empty:
+            if not agg_by_month.empty:
                 # Keep month order chronological
-                df_month["MonthOrder"] = df_month["DateValue"].dt.month
-                df_month["MonthNameFull"] = df_month["DateValue"].dt.strftime("%b %Y")
-                monthly = df_month.groupby(["MonthOrder","MonthNameFull"])[["DeliveredFlag"]].sum().reset_index().sort_values("MonthOrder")
+                monthly = agg_by_month[["MonthStart", "OrdersDelivered"]].copy()
+                monthly["MonthOrder"] = monthly["MonthStart"].dt.month
+                monthly["MonthNameFull"] = monthly["MonthStart"].dt.strftime("%b %Y")
+                monthly = monthly.rename(columns={"OrdersDelivered": "DeliveredFlag"}).sort_values("MonthOrder", kind="stable")
                 fig = px.bar(monthly, x="MonthNameFull", y="DeliveredFlag", title="Commandes livrées par mois")
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -293,43 +491,31 @@ with tab_dates:
 
         with col2:
             st.subheader("Weekend vs Weekdays")
-            weekend_count = df_filtered[df_filtered["IsWeekend"] == 1]["DeliveredFlag"].sum()
-            weekday_count = df_filtered[df_filtered["IsWeekend"] == 0]["DeliveredFlag"].sum()
+            split = aggregate("weekend_split")
+            weekend_count, weekday_count = split["weekend"], split["weekdays"]
             fig_pie = px.pie(names=["Weekends", "Semaine"], values=[weekend_count, weekday_count], title="Livraisons weekend / semaine", color_discrete_sequence=[COLOR_ACCENT, COLOR_MAIN])
             st.plotly_chart(fig_pie, use_container_width=True)
 
     st.markdown("---")
     st.subheader("Distribution Livrées / Non livrées par mois")
-    if not df_filtered.empty:
-        df_m = df_filtered.dropna(subset=["DateValue"])
-        df_m["Month"] = df_m["DateValue"].dt.to_period("M").dt.to_timestamp()
-        monthly_both = df_m.groupby("Month")[["DeliveredFlag","NotDeliveredFlag"]].sum().reset_index()
+    if not agg_by_month.empty:
+        monthly_both = (agg_by_month
+                        .rename(columns={"MonthStart": "Month", "OrdersDelivered": "DeliveredFlag",
+                                         "OrdersNotDelivered": "NotDeliveredFlag"}))
         fig_both = px.bar(monthly_both, x="Month", y=["DeliveredFlag","NotDeliveredFlag"], title="Livrées / Non livrées par mois")
         st.plotly_chart(fig_both, use_container_width=True)
 
 # ------------------------------
-# TAB: HEATMAP Jour × Mois
+# VUE: HEATMAP Jour × Mois
 # ------------------------------
-with tab_heatmap:
+def render_heatmap():
+    """Livrées par jour de semaine × mois (tous les filtres rapides)."""
     st.header("🔥 Heatmap : Activité par Jour × Mois")
 
-    if df_filtered.empty or df_filtered["DateValue"].notna().sum() == 0:
+    if aggregate("weekday")["MonthStart"].notna().sum() == 0:
         st.info("Données de date insuffisantes pour la heatmap.")
     else:
-        df_heat = df_filtered.dropna(subset=["DateValue"]).copy()
-        # Weekday ordering Mon..Sun
-        df_heat["WeekdayNum"] = df_heat["DateValue"].dt.weekday  # Mon=0
-        df_heat["WeekdayName"] = df_heat["DateValue"].dt.day_name()
-        df_heat["MonthName"] = df_heat["DateValue"].dt.strftime("%b")
-        # Pivot table: index weekday, columns month, values sum of DeliveredFlag
-        pivot = df_heat.pivot_table(index="WeekdayNum", columns="MonthName", values="DeliveredFlag", aggfunc="sum", fill_value=0)
-        # Reindex rows to Monday-Sunday
-        weekdays_order = [calendar.day_name[i] for i in range(7)]
-        pivot.index = [calendar.day_name[i] for i in pivot.index]
-        pivot = pivot.reindex(weekdays_order).fillna(0)
-
-        # Ensure months order by calendar short names present in data
-        month_order = list(dict.fromkeys(df_heat["DateValue"].dt.strftime("%b").tolist()))
+        pivot = aggregate("heatmap")
         # plot heatmap
         try:
             fig_heat = px.imshow(pivot.values, x=pivot.columns, y=pivot.index, labels=dict(x="Mois", y="Jour", color="Livrées"), aspect="auto", title="Heatmap : Livrées par Jour × Mois")
@@ -338,17 +524,17 @@ with tab_heatmap:
             st.warning("Impossible d'afficher la heatmap graphiquement.")
 
 # ------------------------------
-# TAB: REGIONS & MAP
+# VUE: REGIONS & MAP
 # ------------------------------
-with tab_regions:
+def render_regions():
+    """Livraisons par région, territoire et pays (carte + tableau)."""
     st.header("🌍 Régions & Territoires")
     colA, colB = st.columns(2)
 
     with colA:
         st.subheader("Livraisons par Région")
-        df_reg = df_filtered.dropna(subset=["RegionName"])
-        if not df_reg.empty:
-            reg = df_reg.groupby("RegionName")[["DeliveredFlag"]].sum().reset_index().sort_values("DeliveredFlag", ascending=False)
+        reg = aggregate("by_region")
+        if not reg.empty:
             fig_reg = px.bar(reg, x="RegionName", y="DeliveredFlag", title="Livraisons par Région", color_discrete_sequence=[COLOR_MAIN])
             st.plotly_chart(fig_reg, use_container_width=True)
         else:
@@ -356,9 +542,8 @@ with tab_regions:
 
     with colB:
         st.subheader("Livraisons par Territoire")
-        df_ter = df_filtered.dropna(subset=["TerritoryName"])
-        if not df_ter.empty:
-            ter = df_ter.groupby("TerritoryName")[["DeliveredFlag"]].sum().reset_index().sort_values("DeliveredFlag", ascending=False)
+        ter = aggregate("by_territory")
+        if not ter.empty:
             fig_ter = px.bar(ter, x="TerritoryName", y="DeliveredFlag", title="Livraisons par Territoire", color_discrete_sequence=[COLOR_ACCENT])
             st.plotly_chart(fig_ter, use_container_width=True)
         else:
@@ -366,11 +551,10 @@ with tab_regions:
 
     st.markdown("---")
     st.subheader("Carte — Livraisons par Pays")
-    df_country = df_filtered.dropna(subset=["CountryRegion"])
-    if df_country.empty:
+    country_bar = aggregate("by_country")
+    if country_bar.empty:
         st.info("Aucune donnée Pays disponible pour la carte.")
     else:
-        country_bar = df_country.groupby("CountryRegion")[["DeliveredFlag"]].sum().reset_index().sort_values("DeliveredFlag", ascending=False)
         try:
             fig_map = px.choropleth(country_bar, locations="CountryRegion", locationmode="country names",
                                     color="DeliveredFlag", title="Livraisons par Pays")
@@ -383,28 +567,25 @@ with tab_regions:
     # Country table with stats
     st.markdown("---")
     st.subheader("📋 Statistiques par Pays")
-    if not df_country.empty:
-        df_country_table = df_country.groupby("CountryRegion").agg(
-            TotalOrders=("OrderID", "count"),
-            Delivered=("DeliveredFlag", "sum"),
-            NotDelivered=("NotDeliveredFlag", "sum"),
-            DeliveryRate=("DeliveredFlag", lambda x: round((x.sum() / max(1, len(x))) * 100, 2))
-        ).reset_index().sort_values("Delivered", ascending=False)
+    df_country_table = aggregate("country_stats")
+    if not df_country_table.empty:
         st.dataframe(df_country_table, use_container_width=True)
     else:
         st.info("Aucune donnée Pays pour le tableau.")
 
 # ------------------------------
-# TAB: TOP / DETAILS
+# VUE: TOP / DETAILS
 # ------------------------------
-with tab_top:
+def render_top():
+    """Top clients / employés, comparaisons, table détaillée et export CSV."""
     st.header("🏆 Top & Détails")
+    kpis = aggregate("kpis")
+    delivered, not_delivered = kpis["delivered"], kpis["not_delivered"]
 
     # Top Clients
     st.subheader("Top 10 Clients (par livraisons)")
-    df_clients = df_filtered.dropna(subset=["Company"])
-    if not df_clients.empty:
-        top_clients = df_clients.groupby("Company")[["DeliveredFlag"]].sum().reset_index().sort_values("DeliveredFlag", ascending=False).head(10)
+    top_clients = aggregate("top_clients")
+    if not top_clients.empty:
         fig_clients = px.bar(top_clients, x="Company", y="DeliveredFlag", title="Top 10 Clients", color_discrete_sequence=[COLOR_MAIN])
         st.plotly_chart(fig_clients, use_container_width=True)
     else:
@@ -412,9 +593,8 @@ with tab_top:
 
     # Top Employees
     st.subheader("Top Employés (par livraisons)")
-    df_emp = df_filtered.dropna(subset=["Employee"])
-    if not df_emp.empty:
-        top_emp = df_emp.groupby("Employee")[["DeliveredFlag"]].sum().reset_index().sort_values("DeliveredFlag", ascending=False).head(10)
+    top_emp = aggregate("top_employees")
+    if not top_emp.empty:
         fig_emp = px.bar(top_emp, x="Employee", y="DeliveredFlag", title="Top Employés", color_discrete_sequence=[COLOR_ACCENT])
         st.plotly_chart(fig_emp, use_container_width=True)
     else:
@@ -434,33 +614,42 @@ with tab_top:
 
     st.markdown("---")
     st.subheader("Table détaillée des commandes (filtré)")
-    cols_to_show = ["OrderID", "DateValue", "Company", "Employee", "DeliveredFlag", "NotDeliveredFlag", "RegionName", "TerritoryName", "CountryRegion"]
-    available_cols = [c for c in cols_to_show if c in df_filtered.columns]
-    st.dataframe(df_filtered[available_cols].sort_values("DateValue", ascending=False).reset_index(drop=True), use_container_width=True)
-
-    st.markdown("---")
-    st.subheader("Télécharger le dataset filtré")
-    csv_bytes = df_to_csv_bytes(df_filtered)
-    st.download_button("⬇️ Télécharger CSV (filtré)", data=csv_bytes, file_name="northwind_filtered.csv", mime="text/csv")
+    if load_details:
+        # Filtres résolus par l'index (positions des lignes), détail déjà trié par date décroissante
+        detail_index, snapshot_report = load_detail_index(connection_params, load_snapshot_probe(connection_params))
+        df_filtered = detail_index.select(filters)
+        st.caption(f"📸 Snapshot local : {snapshot_report.get('status', 'DW')}, "
+                   f"{snapshot_report.get('rows', len(detail_index.frame)):,} lignes")
+        cols_to_show = ["OrderID", "DateValue", "Company", "Employee", "DeliveredFlag", "NotDeliveredFlag", "RegionName", "TerritoryName", "CountryRegion"]
+        available_cols = [c for c in cols_to_show if c in df_filtered.columns]
+        st.dataframe(df_filtered[available_cols].reset_index(drop=True), use_container_width=True)
+
+        st.markdown("---")
+        st.subheader("Télécharger le dataset filtré")
+        csv_bytes = df_to_csv_bytes(df_filtered)
+        st.download_button("⬇️ Télécharger CSV (filtré)", data=csv_bytes, file_name="northwind_filtered.csv", mime="text/csv")
+    else:
+        st.info("Cocher « Charger le détail des commandes » dans la barre latérale.")
 
 # ------------------------------
-# TAB: DATA QUALITY
+# VUE: DATA QUALITY
 # ------------------------------
-with tab_quality:
+def render_quality():
+    """Valeurs manquantes par colonne et exemples de clients manquants."""
     st.header("🧾 Data Quality & Diagnostics")
     st.write("Résumé rapide des valeurs manquantes et exemples d'incohérences.")
 
-    dq_summary = summarize_data_quality(df)
+    dq_summary = load_data_quality(connection_params)
     st.dataframe(dq_summary, use_container_width=True)
 
     st.markdown("---")
     st.subheader("Exemples : lignes avec client manquant")
-    # Choose columns that likely exist
-    check_cols = [c for c in ["OrderID", "DateValue", "CustomerID", "Company", "CustomerCity"] if c in df.columns]
-    missing_customers = df[df["Company"].isna() | df.get("CustomerCity", pd.Series([np.nan]*len(df))).isna()][check_cols].head(200)
+    missing_customers = load_dw_details(connection_params, {}, limit=MISSING_CUSTOMERS_LIMIT,
+                                        conditions=("c.Company IS NULL OR c.City IS NULL",))
+    check_cols = [c for c in ["OrderID", "DateValue", "CustomerID", "Company", "CustomerCity"] if c in missing_customers.columns]
     if not missing_customers.empty:
         st.warning(f"Extrait de lignes avec client manquant ({len(missing_customers)} exemples affichés).")
-        st.dataframe(missing_customers, use_container_width=True)
+        st.dataframe(missing_customers[check_cols], use_container_width=True)
     else:
         st.success("Aucun client manquant détecté dans l'extrait.")
 
@@ -470,10 +659,68 @@ with tab_quality:
     st.write("- Normaliser les natural keys (strip, upper, remove non-printable chars).")
     st.write("- Conserver une staging table pour les enregistrements non appariés et logger les erreurs.")
 
+# =====================================================================
+# NAVIGATION + TEMPS DE RENDU
+# =====================================================================
+
+VIEWS: Dict[str, Callable[[], None]] = {
+    "Overview": render_overview,
+    "Dates & Trends": render_dates,
+    "Heatmap Jour×Mois": render_heatmap,
+    "Régions & Carte": render_regions,
+    "Top & Détails": render_top,
+    "Data Quality": render_quality,
+}
+
+
+class RenderTimings:
+    """Temps de rendu par vue (nombre, dernier, moyenne, max), partagés entre sessions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, Dict] = {}
+
+    def record(self, view: str, seconds: float):
+        with self._lock:
+            t = self._timings.setdefault(view, {"renders": 0, "total_s": 0.0, "max_s": 0.0})
+            t["renders"] += 1
+            t["total_s"] += seconds
+            t["last_s"] = seconds
+            t["max_s"] = max(t["max_s"], seconds)
+
+    def stats(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [{"Vue": view, "Rendus": t["renders"], "Dernier (s)": round(t["last_s"], 3),
+                     "Moyen (s)": round(t["total_s"] / t["renders"], 3), "Max (s)": round(t["max_s"], 3)}
+                    for view, t in self._timings.items()]
+        return pd.DataFrame(rows, columns=["Vue", "Rendus", "Dernier (s)", "Moyen (s)", "Max (s)"])
+
+
+@st.cache_resource
+def render_timings() -> RenderTimings:
+    return RenderTimings()
+
+
+# Un sélecteur (et non st.tabs, qui exécute toutes les vues) : seule la vue choisie est rendue
+view = st.radio("Vue", list(VIEWS), horizontal=True, key="view", label_visibility="collapsed")
+start = time.perf_counter()
+VIEWS[view]()
+elapsed = time.perf_counter() - start
+render_timings().record(view, elapsed)
+st.caption(f"⏱️ Vue « {view} » rendue en {elapsed:.3f} s")
+
 # =====================================================================
 # FOOTER
 # =====================================================================
 
+# Après la vue : compteurs à jour de ce rerun
+with st.sidebar.expander("🧮 Cache des agrégats"):
+    st.caption(f"Version des données : {data_version}")
+    st.json(aggregate_cache().stats())
+
+with st.sidebar.expander("⏱️ Temps de rendu par vue"):
+    st.dataframe(render_timings().stats(), use_container_width=True, hide_index=True)
+
 # =====================================================================
 # FIN
 # =====================================================================
@@ -0,0 +1,393 @@
+# dashboard_data.py
+# =====================================================================
+# Lecture + normalisation des données du DW pour le dashboard
+# (sans dépendance à Streamlit : réutilisable par les benchmarks)
+# =====================================================================
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dw_backend import backend_for_connection
+
+
+DW_SELECT = """
+SELECT f.*,
+       d.DateValue, d."Year", d."Month", d.MonthName, d.DayOfWeek, d.IsWeekend,
+       c.Company, c.City AS CustomerCity, c.CountryRegion,
+       e.FirstName AS EmpFirst, e.LastName AS EmpLast,
+       ter.TerritoryName, reg.RegionName
+"""
+DW_FROM = """
+FROM Tabledefait f
+LEFT JOIN DimDate d ON f.DateKey = d.DateKey
+LEFT JOIN DimCustomer c ON f.CustomerID = c.CustomerID
+LEFT JOIN DimEmployee e ON f.EmployeeID = e.EmployeeID
+LEFT JOIN DimTerritory ter ON f.TerritoryID = ter.TerritoryID
+LEFT JOIN DimRegion reg ON f.RegionID = reg.RegionID
+"""
+DW_QUERY = DW_SELECT + DW_FROM
+
+
+# Sources des requêtes du dashboard : agrégats matérialisés par l'ETL (refresh_aggregates)
+# ou jointure détaillée, avec la colonne SQL de chaque filtre de l'Overview.
+# Les trois agrégats portent Région, Territoire et Employé : tous les filtres s'appliquent.
+QUERY_SOURCES = {
+    "monthly": {
+        "from": """
+            FROM AggFactMonthly a
+            LEFT JOIN DimRegion reg ON a.RegionID = reg.RegionID
+            LEFT JOIN DimTerritory ter ON a.TerritoryID = ter.TerritoryID
+            LEFT JOIN DimEmployee e ON a.EmployeeID = e.EmployeeID
+        """,
+        "filters": {"year": 'a."Year"', "employee_ids": "a.EmployeeID",
+                    "regions": "reg.RegionName", "territories": "ter.TerritoryName"},
+    },
+    "weekday": {
+        "from": """
+            FROM AggFactWeekdayMonth a
+            LEFT JOIN DimRegion reg ON a.RegionID = reg.RegionID
+            LEFT JOIN DimTerritory ter ON a.TerritoryID = ter.TerritoryID
+        """,
+        "filters": {"year": 'a."Year"', "employee_ids": "a.EmployeeID",
+                    "regions": "reg.RegionName", "territories": "ter.TerritoryName"},
+    },
+    "customers": {
+        "from": """
+            FROM AggFactCustomerYearly a
+            LEFT JOIN DimCustomer c ON a.CustomerID = c.CustomerID
+            LEFT JOIN DimRegion reg ON a.RegionID = reg.RegionID
+            LEFT JOIN DimTerritory ter ON a.TerritoryID = ter.TerritoryID
+        """,
+        "filters": {"year": 'a."Year"', "employee_ids": "a.EmployeeID",
+                    "regions": "reg.RegionName", "territories": "ter.TerritoryName"},
+    },
+    "detail": {
+        "from": DW_FROM,
+        "filters": {"year": 'd."Year"', "employee_ids": "f.EmployeeID",
+                    "regions": "reg.RegionName", "territories": "ter.TerritoryName"},
+    },
+}
+
+# Regroupements des onglets : source + colonnes (expression SQL, alias)
+GROUPINGS = {
+    "total": ("monthly", []),
+    "month": ("monthly", [('a."Year"', "Year"), ('a."Month"', "Month")]),
+    "region": ("monthly", [("reg.RegionName", "RegionName")]),
+    "territory": ("monthly", [("ter.TerritoryName", "TerritoryName")]),
+    "country": ("monthly", [("a.CountryRegion", "CountryRegion")]),
+    "employee": ("monthly", [("e.FirstName", "EmpFirst"), ("e.LastName", "EmpLast")]),
+    "weekday": ("weekday", [('a."Year"', "Year"), ('a."Month"', "Month"),
+                            ("a.DayOfWeek", "DayOfWeek"), ("a.IsWeekend", "IsWeekend")]),
+    "customer": ("customers", [("c.Company", "Company")]),
+}
+AGG_COUNTERS = ["Orders", "OrdersDelivered", "OrdersNotDelivered"]
+
+
+def _add_employee_name(df: pd.DataFrame) -> pd.DataFrame:
+    """Colonne Employee = « Prénom Nom » (NaN si les deux sont vides)."""
+    df["EmpFirst"] = df.get("EmpFirst", "").fillna("").astype(str)
+    df["EmpLast"] = df.get("EmpLast", "").fillna("").astype(str)
+    df["Employee"] = (df["EmpFirst"] + " " + df["EmpLast"]).str.strip().replace("", np.nan)
+    return df
+
+
+def normalize_dw_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalise le résultat de DW_QUERY (dates, employé, flags KPI, pays)."""
+    df["DateValue"] = pd.to_datetime(df.get("DateValue"), errors="coerce")
+    _add_employee_name(df)
+
+    # KPI flags robustes
+    df["OrdersDelivered"] = df.get("OrdersDelivered", 0).fillna(0).astype(int)
+    df["OrdersNotDelivered"] = df.get("OrdersNotDelivered", 0).fillna(0).astype(int)
+    df["DeliveredFlag"] = df["OrdersDelivered"].clip(0,1).astype(int)
+    df["NotDeliveredFlag"] = df["OrdersNotDelivered"].clip(0,1).astype(int)
+
+    # Country normalization
+    if "CountryRegion" in df.columns:
+        df["CountryRegion"] = df["CountryRegion"].astype(str).replace("nan", np.nan)
+
+    # Adds: Year, MonthName if not present
+    if "MonthName" not in df.columns and "DateValue" in df.columns:
+        df["MonthName"] = df["DateValue"].dt.strftime("%b").fillna("Unknown")
+    if "Year" not in df.columns and "DateValue" in df.columns:
+        df["Year"] = df["DateValue"].dt.year
+
+    return df
+
+
+def read_dw_data(conn, backend=None) -> pd.DataFrame:
+    """
+    Exécute DW_QUERY sur une connexion ouverte (pyodbc, sqlite3 ou duckdb) et normalise le résultat.
+    backend : dw_backend.WarehouseBackend de la connexion (déduit de conn si None).
+    """
+    backend = backend or backend_for_connection(conn)
+    return normalize_dw_data(backend.read_sql(conn, DW_QUERY))
+
+
+def normalize_query_result(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalise un résultat agrégé : Year / Month entiers nullables, MonthStart (1er du mois),
+    compteurs entiers, nom d'employé.
+    """
+    for col in ["Year", "Month"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    for col in AGG_COUNTERS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+    if "Year" in df.columns and "Month" in df.columns:
+        df["MonthStart"] = pd.to_datetime(
+            pd.DataFrame({"year": df["Year"], "month": df["Month"], "day": 1}), errors="coerce")
+    if "EmpFirst" in df.columns:
+        _add_employee_name(df)
+    return df
+
+
+# ------------------------------
+# REQUÊTES PARAMÉTRÉES (filtres et regroupements exécutés par le DW)
+# ------------------------------
+
+def _sql_value(value):
+    """Paramètre SQL natif (les scalaires numpy ne sont pas acceptés par sqlite3 / pyodbc)."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _where(source: str, filters: Optional[Dict], conditions: Optional[List[str]] = None):
+    """
+    Clause WHERE paramétrée (« ? ») d'une source pour les filtres de l'Overview :
+    filters = dict(year=int|None, employee_ids=[...], regions=[...], territories=[...]).
+    Retourne (clause, paramètres).
+    """
+    clauses, params = list(conditions or []), []
+    for key, column in QUERY_SOURCES[source]["filters"].items():
+        value = (filters or {}).get(key)
+        if value is None or (isinstance(value, (list, tuple)) and len(value) == 0):
+            continue
+        if isinstance(value, (list, tuple)):
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(_sql_value(v) for v in value)
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(_sql_value(value))
+    return ("WHERE " + " AND ".join(f"({c})" for c in clauses) if clauses else ""), params
+
+
+def _limit(backend, limit: Optional[int]):
+    """(préfixe, suffixe) limitant le nombre de lignes : TOP sous SQL Server, LIMIT sinon."""
+    if limit is None:
+        return "", ""
+    if backend.dialect == "mssql":
+        return f"TOP ({int(limit)}) ", ""
+    return "", f" LIMIT {int(limit)}"
+
+
+def query_aggregate(conn, grouping: str, filters: Optional[Dict] = None, order_by: Optional[str] = None,
+                    limit: Optional[int] = None, dropna: bool = True, backend=None) -> pd.DataFrame:
+    """
+    Agrégat d'un onglet calculé par le DW : SUM des compteurs par colonnes de GROUPINGS[grouping],
+    filtres de l'Overview en paramètres. Seul le résultat (quelques lignes) est transféré.
+    order_by : ex. "OrdersDelivered DESC" ; limit : top N ;
+    dropna : exclut les groupes dont une colonne est NULL (comme pandas.groupby).
+    """
+    backend = backend or backend_for_connection(conn)
+    source, keys = GROUPINGS[grouping]
+    conditions = [f"{expr} IS NOT NULL" for expr, _ in keys] if dropna else []
+    where, params = _where(source, filters, conditions)
+    top, tail = _limit(backend, limit)
+
+    select = [f'{expr} AS "{alias}"' for expr, alias in keys]
+    select += [f'SUM(a.{col}) AS "{col}"' for col in AGG_COUNTERS]
+    query = f"SELECT {top}{', '.join(select)} {QUERY_SOURCES[source]['from']} {where}"
+    if keys:
+        query += " GROUP BY " + ", ".join(expr for expr, _ in keys)
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    return normalize_query_result(backend.read_sql(conn, query + tail, params))
+
+
+def read_dw_details(conn, filters: Optional[Dict] = None, limit: Optional[int] = None,
+                    conditions: Optional[List[str]] = None, backend=None) -> pd.DataFrame:
+    """
+    Détail des commandes filtré par le DW (commandes les plus récentes d'abord) :
+    limit = N dernières commandes ; conditions = prédicats SQL supplémentaires.
+    """
+    backend = backend or backend_for_connection(conn)
+    where, params = _where("detail", filters, conditions)
+    top, tail = _limit(backend, limit)
+    query = f"{DW_SELECT.replace('SELECT', 'SELECT ' + top, 1)} {DW_FROM} {where} ORDER BY d.DateValue DESC{tail}"
+    return normalize_dw_data(backend.read_sql(conn, query, params))
+
+
+def read_dw_quality(conn, backend=None) -> pd.DataFrame:
+    """
+    Valeurs manquantes par colonne de la jointure détaillée, comptées par le DW
+    (une ligne par colonne : column, missing, missing_pct).
+    """
+    backend = backend or backend_for_connection(conn)
+    columns = list(backend.read_sql(conn, f"SELECT * FROM ({DW_QUERY}) q WHERE 1 = 0").columns)
+    counts = ", ".join(f'SUM(CASE WHEN q."{col}" IS NULL THEN 1 ELSE 0 END) AS "m{i}"'
+                       for i, col in enumerate(columns))
+    row = backend.read_sql(conn, f'SELECT COUNT(*) AS "total", {counts} FROM ({DW_QUERY}) q').iloc[0]
+    total = int(row["total"])
+    missing = [0 if pd.isna(row[f"m{i}"]) else int(row[f"m{i}"]) for i in range(len(columns))]
+    return (pd.DataFrame({"column": columns, "missing": missing,
+                          "missing_pct": [round(100 * m / max(1, total), 2) for m in missing]})
+            .sort_values("missing", ascending=False))
+
+
+# Version des données : change à chaque chargement (faits ajoutés, agrégats rafraîchis,
+# membres de dimension insérés, puis dernier LoadID de EtlLoadLog : mises à jour en place
+# comprises). Requêtes bornées : clé primaire et petites tables.
+DATA_VERSION_QUERY = """
+SELECT (SELECT MAX(FactID) FROM Tabledefait) AS "max_fact",
+       (SELECT COUNT(*) FROM AggFactMonthly) AS "agg_rows",
+       (SELECT SUM(Orders) FROM AggFactMonthly) AS "agg_orders",
+       (SELECT COUNT(*) FROM DimCustomer) AS "customers",
+       (SELECT COUNT(*) FROM DimEmployee) AS "employees",
+       (SELECT COUNT(*) FROM DimTerritory) AS "territories"
+"""
+
+LOAD_VERSION_QUERY = 'SELECT MAX(LoadID) AS "load_id" FROM EtlLoadLog'
+
+
+def read_last_load_id(conn, backend=None) -> Optional[int]:
+    """Dernier LoadID du journal des chargements (None : DW pas encore rechargé depuis son ajout)."""
+    backend = backend or backend_for_connection(conn)
+    if "etlloadlog" not in {name.lower() for name in backend.existing_tables(conn)}:
+        return None
+    load_id = backend.read_sql(conn, LOAD_VERSION_QUERY).iloc[0, 0]
+    return None if pd.isna(load_id) else int(load_id)
+
+
+def read_data_version(conn, backend=None) -> tuple:
+    """Jeton de version des données du DW (tuple d'entiers, comparable et hachable)."""
+    backend = backend or backend_for_connection(conn)
+    row = backend.read_sql(conn, DATA_VERSION_QUERY).iloc[0]
+    return tuple(None if pd.isna(v) else int(v) for v in row) + (read_last_load_id(conn, backend),)
+
+
+def read_filter_options(conn, backend=None) -> Dict:
+    """
+    Valeurs des filtres de l'Overview (lues dans l'agrégat mensuel) :
+    années, employés (EmployeeID + nom), régions, territoires, pays, nombre de lignes.
+    """
+    backend = backend or backend_for_connection(conn)
+    source = QUERY_SOURCES["monthly"]["from"]
+
+    def distinct(expr):
+        values = backend.read_sql(conn, f'SELECT DISTINCT {expr} AS "value" {source} WHERE {expr} IS NOT NULL')
+        return sorted(values["value"].tolist())
+
+    employees = _add_employee_name(backend.read_sql(
+        conn, f'SELECT DISTINCT a.EmployeeID, e.FirstName AS "EmpFirst", e.LastName AS "EmpLast" {source}'))
+    rows = backend.read_sql(conn, 'SELECT COUNT(*) AS "rows" FROM AggFactMonthly')["rows"].iloc[0]
+    return {
+        "years": [int(y) for y in distinct('a."Year"')],
+        "employees": employees.dropna(subset=["Employee", "EmployeeID"])[["EmployeeID", "Employee"]],
+        "regions": distinct("reg.RegionName"),
+        "territories": distinct("ter.TerritoryName"),
+        "countries": distinct("a.CountryRegion"),
+        "rows": int(rows),
+    }
+
+
+# ------------------------------
+# INDEX DES FILTRES (détail des commandes chargé en mémoire)
+# ------------------------------
+
+# Filtres de l'Overview -> colonne du détail (read_dw_details)
+FILTER_COLUMNS = {"year": "Year", "employee_ids": "EmployeeID",
+                  "regions": "RegionName", "territories": "TerritoryName"}
+
+
+class FilterIndex:
+    """
+    Index des filtres de l'Overview sur le détail des commandes, construit une fois par chargement.
+    Pour chaque colonne filtrée : codes des valeurs par ligne (pd.factorize) et positions des
+    lignes triées par code, d'où valeur -> positions par simple tranche (sans copie).
+    Une combinaison de filtres part des positions du filtre le plus sélectif puis vérifie les
+    autres sur ces seules lignes : ni copie ni parcours du DataFrame complet.
+    """
+
+    def __init__(self, frame: pd.DataFrame, columns: Optional[Dict[str, str]] = None):
+        self.frame = frame
+        self.columns = {k: c for k, c in (columns or FILTER_COLUMNS).items() if c in frame.columns}
+        self._codes, self._lookup, self._order, self._offsets = {}, {}, {}, {}
+        for key, col in self.columns.items():
+            codes, uniques = pd.factorize(frame[col])     # valeur manquante -> -1 (jamais sélectionnée)
+            # Codes étroits : le tri stable des entiers 16 bits est un tri par base (linéaire)
+            codes = codes.astype(np.int16 if len(uniques) < 2**15 - 1 else np.int32 if len(uniques) < 2**31 - 1 else np.int64)
+            self._codes[key] = codes
+            self._lookup[key] = {_sql_value(v): i for i, v in enumerate(uniques)}
+            self._order[key] = np.argsort(codes, kind="stable").astype(np.int32 if len(frame) < 2**31 else np.int64)
+            counts = np.bincount(codes + 1, minlength=len(uniques) + 1)   # case 0 : valeurs manquantes
+            self._offsets[key] = np.cumsum(counts)
+
+    def _value_codes(self, key: str, value) -> List[int]:
+        values = value if isinstance(value, (list, tuple)) else [value]
+        return [self._lookup[key][v] for v in (_sql_value(v) for v in values) if v in self._lookup[key]]
+
+    def _member(self, key: str, codes: List[int]) -> np.ndarray:
+        """Table code + 1 -> sélectionné (quelques octets par valeur distincte)."""
+        member = np.zeros(len(self._offsets[key]), dtype=bool)
+        member[np.asarray(codes, dtype=np.int64) + 1] = True
+        return member
+
+    def _rows_for(self, key: str, codes: List[int], size: int) -> np.ndarray:
+        """
+        Positions (croissantes) des lignes ayant l'un des codes : une seule valeur = tranche
+        sans copie ; quelques valeurs = fusion des tranches ; union large (> 1/8 des lignes) =
+        lecture des codes de la colonne (entiers étroits), moins chère qu'un tri.
+        """
+        slices = [self._order[key][self._offsets[key][c]:self._offsets[key][c + 1]] for c in codes]
+        if len(slices) == 1:
+            return slices[0]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        if size > len(self.frame) // 8:
+            return np.flatnonzero(self._member(key, codes)[self._codes[key] + 1])
+        return np.sort(np.concatenate(slices))
+
+    def positions(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Positions des lignes retenues par filters (None = aucun filtre actif)."""
+        active = {}
+        for key in self.columns:
+            value = (filters or {}).get(key)
+            if value is None or (isinstance(value, (list, tuple)) and len(value) == 0):
+                continue
+            active[key] = self._value_codes(key, value)
+        if not active:
+            return None
+
+        # Filtre le plus sélectif d'abord (tailles lues dans offsets, sans parcours)
+        sizes = {key: sum(int(self._offsets[key][c + 1] - self._offsets[key][c]) for c in codes)
+                 for key, codes in active.items()}
+        first = min(sizes, key=sizes.get)
+        rows = self._rows_for(first, active.pop(first), sizes[first])
+        for key, codes in active.items():
+            if len(rows) == 0:
+                break
+            rows = rows[self._member(key, codes)[self._codes[key][rows] + 1]]
+        return rows
+
+    def select(self, filters: Optional[Dict]) -> pd.DataFrame:
+        """
+        Lignes retenues : le DataFrame lui-même sans filtre, une tranche iloc si les positions
+        sont contiguës (ex. filtre Année sur un détail trié par date), sinon les seules lignes retenues.
+        """
+        rows = self.positions(filters)
+        if rows is None:
+            return self.frame
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return self.frame.iloc[rows[0]:rows[-1] + 1]
+        return self.frame.take(rows)
+
+
+def read_dashboard_views(conn, filters: Optional[Dict] = None, backend=None) -> Dict[str, pd.DataFrame]:
+    """Toutes les requêtes des onglets pour un jeu de filtres (benchmarks) : {regroupement: résultat}."""
+    backend = backend or backend_for_connection(conn)
+    views = {name: query_aggregate(conn, name, filters, backend=backend) for name in GROUPINGS}
+    views["latest_orders"] = read_dw_details(conn, filters, limit=200, backend=backend)
+    return views
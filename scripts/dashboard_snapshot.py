@@ -0,0 +1,342 @@
+# dashboard_snapshot.py
+# =====================================================================
+# Snapshot local (Arrow IPC / Feather non compressé) du détail des commandes
+# (jointure Tabledefait × dimensions) pour le dashboard
+# - une sonde peu coûteuse (MAX / COUNT sur les clés, dernier LoadID du
+#   journal des chargements) décide si le snapshot est à jour
+# - faits ajoutés (FactID > dernier FactID connu) et membres de dimension
+#   déjà présents inchangés (empreinte par membre) : seules les nouvelles
+#   lignes sont lues et ajoutées (part-N)
+# - sinon (membre modifié, faits supprimés ou modifiés, DW reconstruit) :
+#   snapshot reconstruit par une lecture complète
+# - démarrage à froid : relecture des fichiers locaux (Feather non
+#   compressé, sans décodage), sans requête de jointure sur le DW
+# (sans dépendance à Streamlit : réutilisable par les benchmarks)
+# =====================================================================
+
+import os
+import json
+import hashlib
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow absent : pas de snapshot (lecture directe du DW)
+    pa = feather = None
+
+from dashboard_data import read_dw_details, read_last_load_id
+from dw_backend import backend_for_connection
+
+
+SNAPSHOT_PATH = "../data/clean/dashboard_snapshot"
+SNAPSHOT_MAX_PARTS = 8       # au-delà, les parts ajoutées sont fusionnées en une seule
+MANIFEST_FILE = "manifest.json"
+
+# Dimensions jointes par DW_FROM : clé, puis colonnes lues par DW_SELECT. La modification
+# d'un membre déjà présent (SCD 1 en place) change des lignes du snapshot ; un nouveau membre
+# ne concerne que les nouveaux faits, sauf s'il est déjà référencé par le snapshot.
+DIMENSION_COLUMNS = {
+    "DimDate": ("DateKey", ["DateValue", '"Year"', '"Month"', "MonthName", "DayOfWeek", "IsWeekend"]),
+    "DimCustomer": ("CustomerID", ["Company", "City", "CountryRegion"]),
+    "DimEmployee": ("EmployeeID", ["FirstName", "LastName"]),
+    "DimTerritory": ("TerritoryID", ["TerritoryName"]),
+    "DimRegion": ("RegionID", ["RegionName"]),
+}
+# Colonne du détail qui porte la clé de chaque dimension
+DETAIL_KEY_COLUMNS = {"DimDate": "DateKey", "DimCustomer": "CustomerID", "DimEmployee": "EmployeeID",
+                      "DimTerritory": "TerritoryID", "DimRegion": "RegionID"}
+
+# Sonde : agrégats sur les clés primaires (aucune ligne lue) et dernier LoadID de EtlLoadLog,
+# écrit par ETL.load_all à chaque chargement, mises à jour en place comprises.
+PROBE_QUERY = ('SELECT (SELECT MAX(FactID) FROM Tabledefait) AS "max_fact", '
+               '(SELECT COUNT(*) FROM Tabledefait) AS "rows", '
+               + ", ".join(f'(SELECT COUNT(*) FROM {table}) AS "{table}_rows", '
+                           f'(SELECT MAX({key}) FROM {table}) AS "{table}_max"'
+                           for table, (key, _) in DIMENSION_COLUMNS.items()))
+
+# Faits déjà présents dans le snapshot : inchangés si le nombre de lignes et les sommes de
+# contrôle (clé de commande, clé de date, livraison) jusqu'au dernier FactID connu sont identiques.
+FACT_PREFIX_QUERY = """
+SELECT COUNT(*) AS "rows",
+       SUM(CAST(OrderID AS BIGINT)) AS "order_sum",
+       SUM(CAST(DateKey AS BIGINT)) AS "date_sum",
+       SUM(CAST(OrdersDelivered AS BIGINT)) AS "delivered_sum"
+FROM Tabledefait WHERE FactID <= ?
+"""
+
+
+# ------------------------------
+# SONDE DE CHANGEMENT
+# ------------------------------
+
+def read_snapshot_probe(conn, backend=None) -> tuple:
+    """
+    Sonde de changement du détail des commandes : (dernier FactID, nombre de faits,
+    jeton des dimensions). Une requête d'agrégats sur les clés (MAX / COUNT) et le dernier
+    LoadID du journal des chargements (absent d'un DW pas encore rechargé) : aucune ligne lue.
+    """
+    backend = backend or backend_for_connection(conn)
+    values = [None if pd.isna(v) else int(v) for v in backend.read_sql(conn, PROBE_QUERY).iloc[0]]
+    load_id = read_last_load_id(conn, backend)
+    token = hashlib.sha256(json.dumps([load_id] + values[2:]).encode()).hexdigest()[:24]
+    return values[0], values[1] or 0, token
+
+
+def _member_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Empreinte de chaque ligne (colonnes après la clé), stable quand un NULL change le type lu."""
+    values = pd.DataFrame({c: df[c].astype("float64") if pd.api.types.is_numeric_dtype(df[c])
+                           else df[c].astype(object).where(df[c].notna(), None)
+                           for c in df.columns[1:]})
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def read_dimension_hashes(conn, backend=None) -> pd.DataFrame:
+    """
+    Empreinte, membre par membre, des colonnes de dimension jointes au détail :
+    colonnes table, key, hash.
+    Lue seulement quand le jeton de la sonde change.
+    """
+    backend = backend or backend_for_connection(conn)
+    frames = []
+    for table, (key, columns) in DIMENSION_COLUMNS.items():
+        df = backend.read_sql(conn, f"SELECT {key}, {', '.join(columns)} FROM {table}")
+        frames.append(pd.DataFrame({
+            "table": table,
+            "key": pd.to_numeric(df.iloc[:, 0]).astype("Int64"),
+            "hash": pd.array(_member_hashes(df), dtype="UInt64"),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _fact_checksums(df: pd.DataFrame) -> Dict:
+    """Sommes de contrôle des faits d'un détail (mêmes colonnes que FACT_PREFIX_QUERY)."""
+    return {"rows": len(df),
+            "order_sum": int(pd.to_numeric(df["OrderID"]).sum()),
+            "date_sum": int(pd.to_numeric(df["DateKey"]).sum()),
+            "delivered_sum": int(pd.to_numeric(df["OrdersDelivered"]).sum())}
+
+
+def snapshot_dir(params: Dict, root: str = SNAPSHOT_PATH) -> str:
+    """Dossier du snapshot d'un DW (backend + serveur/base ou fichier ; sans identifiants)."""
+    if params.get("path"):
+        identity = [params.get("backend"), os.path.abspath(params["path"])]
+    else:
+        identity = [params.get("backend"), params.get("server"), params.get("database")]
+    digest = hashlib.sha256(json.dumps(identity, default=str).encode()).hexdigest()[:12]
+    return os.path.join(root, f"{params.get('backend') or 'dw'}_{digest}")
+
+
+# ------------------------------
+# SNAPSHOT
+# ------------------------------
+
+class DetailSnapshot:
+    """
+    Snapshot local du détail des commandes d'un DW : parts Feather non compressées
+    + empreintes des membres de dimension + manifest.json (sonde, dernier FactID,
+    sommes de contrôle), écrit en dernier. report : dernière opération (loaded / appended / rebuilt).
+    """
+
+    def __init__(self, directory: str, max_parts: int = SNAPSHOT_MAX_PARTS):
+        self.directory = directory
+        self.max_parts = max_parts
+        self.enabled = feather is not None
+        self.report = {}
+        self.manifest = self._load_manifest() if self.enabled else None
+
+    # ---------- manifest ----------
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _load_manifest(self) -> Optional[Dict]:
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        # Fichier manquant (suppression manuelle...) : snapshot inutilisable
+        files = [p["file"] for p in manifest["parts"]] + [f for f in [manifest.get("dimensions")] if f]
+        if not all(os.path.exists(os.path.join(self.directory, f)) for f in files):
+            return None
+        return manifest
+
+    def _save_manifest(self, manifest: Dict):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+        self.manifest = manifest
+
+    def matches(self, probe: tuple) -> bool:
+        """Vrai si le snapshot correspond à la sonde du DW (aucune lecture nécessaire)."""
+        return self.manifest is not None and tuple(self.manifest["probe"]) == tuple(probe)
+
+    # ---------- lecture ----------
+
+    def _read_parts(self, columns=None) -> pd.DataFrame:
+        """Parts du snapshot concaténées (columns : sous-ensemble de colonnes lu seulement)."""
+        tables = [feather.read_table(os.path.join(self.directory, p["file"]), columns=columns)
+                  for p in self.manifest["parts"]]
+        return pa.concat_tables(tables).to_pandas()
+
+    def load(self) -> pd.DataFrame:
+        """
+        Relit le snapshot, trié par date décroissante : lecture séquentielle des parts
+        (Feather non compressé, sans décodage) puis conversion en DataFrame pour FilterIndex.
+        """
+        start = time.perf_counter()
+        frame = self._read_parts()
+        if len(self.manifest["parts"]) > 1:
+            frame = _sort_details(frame)
+        self.report = {"status": "loaded", "rows": len(frame), "parts": len(self.manifest["parts"]),
+                       "seconds": round(time.perf_counter() - start, 3)}
+        return frame
+
+    # ---------- écriture ----------
+
+    def _write_file(self, df: pd.DataFrame, file: str) -> str:
+        tmp_path = os.path.join(self.directory, file + ".tmp")
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, os.path.join(self.directory, file))
+        return file
+
+    def _write_part(self, df: pd.DataFrame, number: int) -> Dict:
+        return {"file": self._write_file(df, f"part-{number:05d}.feather"), "rows": len(df)}
+
+    def _write_dimensions(self, hashes: Optional[pd.DataFrame], number: int) -> Optional[str]:
+        """Empreintes des membres (hashes=None : celles du manifest actuel sont conservées)."""
+        if hashes is None:
+            return (self.manifest or {}).get("dimensions")
+        return self._write_file(hashes, f"dimensions-{number:05d}.feather")
+
+    def _remove_files(self, keep):
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(("part-", "dimensions-")) and entry.name not in keep:
+                os.remove(entry.path)
+
+    def _rebuild(self, frame: pd.DataFrame, probe: tuple, hashes: Optional[pd.DataFrame]) -> Dict:
+        """Remplace le snapshot par frame (une seule part)."""
+        os.makedirs(self.directory, exist_ok=True)
+        number = max([int(p["file"][5:10]) for p in (self.manifest or {}).get("parts", [])] or [-1]) + 1
+        part = self._write_part(frame, number)
+        dimensions = self._write_dimensions(hashes, number)
+        self._save_manifest({"probe": list(probe), "max_fact": probe[0], "checksums": _fact_checksums(frame),
+                             "parts": [part], "dimensions": dimensions,
+                             "updated_at": pd.Timestamp.now().isoformat(timespec="seconds")})
+        self._remove_files({part["file"], dimensions})
+        return part
+
+    def refresh(self, conn, probe: Optional[tuple] = None, backend=None) -> pd.DataFrame:
+        """
+        Met le snapshot à jour pour la sonde du DW et retourne le détail complet :
+        - sonde identique                                -> relecture locale (load)
+        - faits ajoutés, membres déjà présents inchangés -> lecture des seuls FactID > dernier
+                                                            FactID, nouvelle part
+        - sinon                                          -> lecture complète et reconstruction
+        Sans pyarrow : lecture complète du DW à chaque appel.
+        """
+        backend = backend or backend_for_connection(conn)
+        if not self.enabled:
+            return read_dw_details(conn, backend=backend)
+        probe = tuple(probe or read_snapshot_probe(conn, backend))
+        if self.matches(probe):
+            return self.load()
+
+        start = time.perf_counter()
+        delta, hashes = self._read_delta(conn, probe, backend)
+        if delta is None:
+            # Empreintes lues avant le détail : un changement entre les deux lectures sera revu
+            hashes = hashes if hashes is not None else read_dimension_hashes(conn, backend)
+            frame = read_dw_details(conn, conditions=_fact_range(None, probe[0]), backend=backend)
+            self._rebuild(frame, probe, hashes)
+            self.report = {"status": "rebuilt", "rows": len(frame), "parts": 1}
+        else:
+            frame = self.load() if delta.empty else _sort_details(pd.concat([self.load(), delta], ignore_index=True))
+            checksums = self.manifest["checksums"]
+            checksums = {k: checksums[k] + v for k, v in _fact_checksums(delta).items()}
+            if len(delta) and len(self.manifest["parts"]) + 1 > self.max_parts:
+                self._rebuild(frame, probe, hashes)      # fusion des parts
+            else:
+                # Aucun nouveau fait (nouveaux membres seulement) : manifest seul mis à jour
+                number = int(self.manifest["parts"][-1]["file"][5:10]) + 1
+                parts = self.manifest["parts"] + ([self._write_part(delta, number)] if len(delta) else [])
+                dimensions = self._write_dimensions(hashes, number)
+                self._save_manifest({**self.manifest, "probe": list(probe), "max_fact": probe[0],
+                                     "checksums": checksums, "parts": parts, "dimensions": dimensions,
+                                     "updated_at": pd.Timestamp.now().isoformat(timespec="seconds")})
+                self._remove_files({p["file"] for p in parts} | {dimensions})
+            self.report = {"status": "appended", "rows": len(frame), "delta_rows": len(delta),
+                           "parts": len(self.manifest["parts"])}
+        self.report["seconds"] = round(time.perf_counter() - start, 3)
+        print(f"📸 Snapshot du détail {self.report['status']} : {len(frame):,} lignes "
+              f"({self.report['seconds']:.2f}s)")
+        return frame
+
+    def _read_delta(self, conn, probe: tuple, backend) -> tuple:
+        """
+        (nouvelles lignes FactID > dernier FactID connu, nouvelles empreintes des membres ou None
+        si le jeton des dimensions n'a pas changé), ou (None, empreintes éventuelles) si une
+        reconstruction est nécessaire.
+        """
+        manifest = self.manifest
+        if manifest is None or manifest["max_fact"] is None or probe[0] is None:
+            return None, None
+        if probe[0] < manifest["max_fact"]:
+            return None, None                            # DW reconstruit
+        hashes = None
+        if probe[2] != manifest["probe"][2]:
+            hashes = read_dimension_hashes(conn, backend)
+            if not self._members_unchanged(hashes):
+                return None, hashes                      # membre déjà présent modifié
+        prefix = backend.read_sql(conn, FACT_PREFIX_QUERY, (manifest["max_fact"],)).iloc[0]
+        prefix = {k: 0 if pd.isna(v) else int(v) for k, v in prefix.items()}
+        if prefix != manifest["checksums"]:
+            return None, hashes                          # faits existants supprimés ou modifiés
+        delta = read_dw_details(conn, conditions=_fact_range(manifest["max_fact"], probe[0]), backend=backend)
+        if len(delta) != probe[1] - prefix["rows"]:
+            return None, hashes                          # faits supprimés puis ajoutés
+        return delta, hashes
+
+    def _members_unchanged(self, hashes: pd.DataFrame) -> bool:
+        """
+        Vrai si l'état des dimensions (hashes) ne touche aucune ligne du snapshot : membres
+        déjà présents inchangés, nouveaux membres absents des clés du snapshot.
+        """
+        if not self.manifest.get("dimensions"):
+            return False                                 # snapshot sans empreintes par membre
+        old = feather.read_feather(os.path.join(self.directory, self.manifest["dimensions"]))
+        old_hash = old.set_index(["table", "key"])["hash"]
+        new_hash = hashes.set_index(["table", "key"])["hash"]
+        current = new_hash.reindex(old_hash.index)
+        if current.isna().any() or (current != old_hash).any():
+            return False                                 # membre modifié ou supprimé
+
+        added = new_hash.index.difference(old_hash.index).to_frame(index=False)
+        if added.empty:
+            return True
+        detail = self._read_parts(columns=list(DETAIL_KEY_COLUMNS.values()))
+        referenced = {table: detail[col] for table, col in DETAIL_KEY_COLUMNS.items()}
+        return not any(keys.isin(pd.to_numeric(referenced[table]).dropna()).any()
+                       for table, keys in added.groupby("table")["key"])
+
+
+def _fact_range(after: Optional[int], upto: Optional[int]) -> list:
+    """
+    Prédicats FactID de read_dw_details (entiers : interpolés sans risque d'injection).
+    Borné au FactID de la sonde : un chargement en cours entre la sonde et la lecture
+    n'entre pas dans le snapshot (il sera lu au prochain changement de sonde).
+    """
+    conditions = [] if after is None else [f"f.FactID > {int(after)}"]
+    return conditions + ([] if upto is None else [f"f.FactID <= {int(upto)}"])
+
+
+def _sort_details(frame: pd.DataFrame) -> pd.DataFrame:
+    """Ordre de read_dw_details : date décroissante (dates manquantes en dernier)."""
+    return frame.sort_values("DateValue", ascending=False, kind="stable", na_position="last",
+                             ignore_index=True)
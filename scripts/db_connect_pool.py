@@ -0,0 +1,286 @@
+# db_connect_pool.py
+# =====================================================================
+# Fabrique de connexions unique (ETL + dashboard) avec pool
+# - DSN lus depuis l'environnement (ou un fichier .env)
+# - pool borné, thread-safe, avec health check et éviction des connexions inactives
+# - métriques de latence d'acquisition
+# =====================================================================
+
+import os
+import time
+import threading
+import pyodbc
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:  # python-dotenv absent : seules les variables d'environnement comptent
+    pass
+
+
+# ------------------------------
+# CONFIGURATION (variables d'environnement, valeurs par défaut = configuration locale)
+# ------------------------------
+
+DB_CONFIGS = {
+    "source1": {
+        "driver": os.getenv("NW_DB_DRIVER", "SQL Server"),
+        "server": os.getenv("NW_SOURCE1_SERVER", os.getenv("NW_DB_SERVER", ".")),
+        "database": os.getenv("NW_SOURCE1_DATABASE", "Northwind"),
+        "uid": os.getenv("NW_SOURCE1_UID", os.getenv("NW_DB_UID", "sa")),
+        "pwd": os.getenv("NW_SOURCE1_PWD", os.getenv("NW_DB_PWD", "maroua")),
+    },
+    "bi": {
+        "driver": os.getenv("NW_DB_DRIVER", "SQL Server"),
+        "server": os.getenv("NW_BI_SERVER", os.getenv("NW_DB_SERVER", ".")),
+        "database": os.getenv("NW_BI_DATABASE", "Northwind_BI3"),
+        "uid": os.getenv("NW_BI_UID", os.getenv("NW_DB_UID", "sa")),
+        "pwd": os.getenv("NW_BI_PWD", os.getenv("NW_DB_PWD", "maroua")),
+    },
+}
+
+POOL_MAX_SIZE = int(os.getenv("NW_POOL_MAX_SIZE", "8"))
+POOL_MAX_IDLE_SECONDS = float(os.getenv("NW_POOL_MAX_IDLE", "300"))
+POOL_HEALTH_CHECK_SECONDS = float(os.getenv("NW_POOL_HEALTH_CHECK", "30"))
+POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("NW_POOL_ACQUIRE_TIMEOUT", "30"))
+
+
+def build_conn_str(server=".", database="Northwind_BI3", uid="sa", pwd="maroua", driver="SQL Server"):
+    """Chaîne de connexion ODBC SQL Server (même format que les connecteurs d'origine)."""
+    return (
+        f"DRIVER={{{driver}}};"
+        f"SERVER={server};"
+        f"DATABASE={database};"
+        f"UID={uid};"
+        f"PWD={pwd};"
+        f"Trusted_Connection=no;"
+    )
+
+
+def get_conn_str(name):
+    """
+    Chaîne de connexion de la base logique name ('source1' ou 'bi').
+    NW_<NAME>_CONN_STR, si défini, remplace entièrement la configuration.
+    """
+    override = os.getenv(f"NW_{name.upper()}_CONN_STR")
+    if override:
+        return override
+    return build_conn_str(**DB_CONFIGS[name])
+
+
+# ------------------------------
+# POOL
+# ------------------------------
+
+class PooledConnection:
+    """
+    Enveloppe d'une connexion empruntée au pool : close() la rend au pool
+    au lieu de la fermer, tout le reste est délégué à la connexion réelle.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pyodbc.ProgrammingError("Connexion déjà rendue au pool")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_pool", "_conn"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool de connexions borné et thread-safe.
+    - au plus max_size connexions ouvertes (empruntées + inactives)
+    - une connexion inactive depuis plus de health_check_after est testée (SELECT 1)
+    - une connexion inactive depuis plus de max_idle est fermée
+    """
+
+    def __init__(self, conn_str, max_size=POOL_MAX_SIZE, max_idle=POOL_MAX_IDLE_SECONDS,
+                 health_check_after=POOL_HEALTH_CHECK_SECONDS,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT_SECONDS, connect=None, **connect_kwargs):
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect or (lambda: pyodbc.connect(conn_str, **connect_kwargs))
+
+        self._idle = []           # [(connexion, instant de retour au pool)]
+        self._open_count = 0
+        self._cond = threading.Condition()
+        self._stats = {"acquired": 0, "created": 0, "reused": 0, "evicted": 0,
+                       "health_check_failures": 0, "acquire_total_s": 0.0, "acquire_max_s": 0.0}
+
+    # --- cycle de vie ---
+
+    def _evict_idle(self, now):
+        """Ferme les connexions inactives depuis plus de max_idle (verrou détenu)."""
+        keep = []
+        for conn, since in self._idle:
+            if now - since > self.max_idle:
+                self._close_quietly(conn)
+                self._open_count -= 1
+                self._stats["evicted"] += 1
+            else:
+                keep.append((conn, since))
+        self._idle = keep
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Emprunte une connexion (PooledConnection) ; lève TimeoutError si le pool est saturé."""
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                self._evict_idle(now)
+
+                if self._idle:
+                    conn, since = self._idle.pop()       # LIFO : la plus récemment utilisée
+                    reuse = True
+                elif self._open_count < self.max_size:
+                    self._open_count += 1
+                    conn, since, reuse = None, now, False
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError(f"Pool saturé ({self.max_size} connexions en cours d'utilisation)")
+                    self._cond.wait(remaining)
+                    continue
+
+            # Hors verrou : health check ou ouverture d'une nouvelle connexion
+            if reuse and now - since > self.health_check_after and not self._is_alive(conn):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                    self._open_count -= 1
+                    self._cond.notify()
+                continue
+
+            if not reuse:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open_count -= 1
+                        self._cond.notify()
+                    raise
+
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._stats["acquired"] += 1
+                self._stats["reused" if reuse else "created"] += 1
+                self._stats["acquire_total_s"] += elapsed
+                self._stats["acquire_max_s"] = max(self._stats["acquire_max_s"], elapsed)
+            return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Rend une connexion au pool (transaction en cours annulée)."""
+        try:
+            conn.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._close_quietly(conn)
+                self._open_count -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Ferme toutes les connexions inactives."""
+        with self._cond:
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._open_count -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        """Métriques du pool, dont la latence moyenne / max d'acquisition (ms)."""
+        with self._cond:
+            s = dict(self._stats)
+            s["open"] = self._open_count
+            s["idle"] = len(self._idle)
+        s["acquire_avg_ms"] = round(1000 * s["acquire_total_s"] / max(1, s["acquired"]), 3)
+        s["acquire_max_ms"] = round(1000 * s.pop("acquire_max_s"), 3)
+        s.pop("acquire_total_s")
+        return s
+
+
+# ------------------------------
+# REGISTRE DES POOLS (un pool par chaîne de connexion, partagé par le processus)
+# ------------------------------
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_for(conn_str, **pool_kwargs):
+    """Pool associé à une chaîne de connexion (créé au premier appel)."""
+    with _pools_lock:
+        pool = _pools.get(conn_str)
+        if pool is None:
+            pool = ConnectionPool(conn_str, **pool_kwargs)
+            _pools[conn_str] = pool
+        return pool
+
+
+def get_pool(name):
+    """Pool de la base logique name ('source1' ou 'bi')."""
+    return get_pool_for(get_conn_str(name))
+
+
+def get_pooled_connection(name):
+    """Emprunte une connexion à la base logique name ; conn.close() la rend au pool."""
+    return get_pool(name).acquire()
+
+
+def pool_stats():
+    """Métriques de tous les pools, par base de données."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    stats = {}
+    for pool in pools:
+        database = next((part.split("=", 1)[1] for part in pool.conn_str.split(";")
+                         if part.upper().startswith("DATABASE=")), "pool")
+        stats[database] = pool.stats()
+    return stats
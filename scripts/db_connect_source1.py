@@ -1,27 +1,15 @@
-import pyodbc
+from db_connect_pool import get_pooled_connection
 
 def get_source1_connection():
     """
     Connexion au Data Warehouse (DW) Northwind_BI1
     Retourne un objet connexion si succès, sinon None.
+    Paramètres de connexion : voir db_connect_pool (variables d'environnement NW_*).
     """
 
-    server = "localhost"
-    database = "Northwind"   
-    username = "sa"        
-    password = "maroua"    
-
-    conn_str = (
-        f"DRIVER={{SQL Server}};"
-        f"SERVER=.;"
-        f"DATABASE={database};"
-        f"UID=sa;"
-        f"PWD=maroua;"
-        f"Trusted_Connection=no;"
-    )
-    
     try:
-        conn = pyodbc.connect(conn_str)
+        # Connexion empruntée au pool partagé : conn.close() la rend au pool
+        conn = get_pooled_connection("source1")
         return conn
     except Exception as e:
         print(f"❌ Erreur de connexion au Data Warehouse: {e}")
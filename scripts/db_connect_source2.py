@@ -1,11 +1,19 @@
 # db_connect_source2.py
 import os
+import json
+import hashlib
 import pandas as pd
 import sys
 sys.path.append(os.path.dirname(__file__))
 
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow absent : lecture Excel directe, sans cache
+    feather = None
+
 
 DATA_PATH = "../data/raw"
+CACHE_PATH = "../data/clean"   # cache des classeurs de DATA_PATH (dossier clean voisin de raw)
 
 def get_source2_files():
     """Retourne les chemins complets des fichiers Excel Source 2."""
@@ -19,9 +27,84 @@ def get_source2_files():
     return files
 
 
+# ------------------------------
+# CACHE COLONNAIRE DES CLASSEURS EXCEL
+# ------------------------------
+
+def _file_sha256(path, block_size=1 << 20):
+    """Empreinte SHA-256 du contenu d'un fichier (lecture par blocs)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_paths(path, cache_dir):
+    """Chemins du fichier Feather et de ses métadonnées pour un classeur donné."""
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    return (os.path.join(cache_dir, f"{name}.feather"),
+            os.path.join(cache_dir, f"{name}.meta.json"))
+
+
+def _default_cache_dir(path):
+    """Dossier 'clean' voisin du dossier du classeur (data/raw -> data/clean)."""
+    raw_dir = os.path.dirname(os.path.abspath(path))
+    return os.path.join(os.path.dirname(raw_dir), "clean")
+
+
+def read_excel_cached(path, cache_dir=None):
+    """
+    Lit un classeur Excel via un cache Feather (Arrow) dans data/clean.
+    Par défaut le cache est écrit dans le dossier 'clean' voisin du classeur,
+    ce qui sépare les caches de jeux de données différents (ex. benchmarks).
+    - Le cache est valide si taille + mtime du classeur sont inchangés,
+      ou à défaut si son empreinte SHA-256 est identique.
+    - Sinon le classeur est relu avec openpyxl et le cache est réécrit.
+    Le fichier Feather (non compressé) est relu et converti en DataFrame, sans re-parsing XLSX :
+    toutes les colonnes sont copiées en mémoire (pas de lecture paresseuse).
+    """
+    if feather is None:
+        return pd.read_excel(path)
+
+    cache_dir = cache_dir or _default_cache_dir(path)
+    data_file, meta_file = _cache_paths(path, cache_dir)
+    stat = os.stat(path)
+    meta = None
+
+    if os.path.exists(data_file) and os.path.exists(meta_file):
+        with open(meta_file, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("size") == stat.st_size and meta.get("mtime") == stat.st_mtime:
+            return feather.read_feather(data_file)
+
+        # Fichier touché mais contenu identique : on met juste à jour les métadonnées
+        digest = _file_sha256(path)
+        if meta.get("sha256") == digest:
+            meta.update({"size": stat.st_size, "mtime": stat.st_mtime})
+            with open(meta_file, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            return feather.read_feather(data_file)
+    else:
+        digest = _file_sha256(path)
+
+    if meta is not None and meta.get("sha256") != digest:
+        print(f"♻️ Cache invalidé pour {os.path.basename(path)} (classeur modifié)")
 
+    df = pd.read_excel(path)
 
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        feather.write_feather(df, data_file, compression="uncompressed")
+        with open(meta_file, "w", encoding="utf-8") as f:
+            json.dump({"source": os.path.abspath(path), "size": stat.st_size,
+                       "mtime": stat.st_mtime, "sha256": digest}, f)
+    except Exception as e:
+        # Colonne non typable en Arrow, disque en lecture seule... : pas de cache
+        print(f"⚠️ Cache non écrit pour {os.path.basename(path)} : {e}")
 
+    return df
 
 
 def test_source2():
@@ -39,7 +122,7 @@ def test_source2():
         file_path = f"../data/raw/{file}"
         if os.path.exists(file_path):
             try:
-                df = pd.read_excel(file_path)
+                df = read_excel_cached(file_path)
                 print(f"✅ {file}: {df.shape[0]} lignes")
             except Exception as e:
                 print(f"❌ {file}: Erreur - {e}")
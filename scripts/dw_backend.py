@@ -0,0 +1,207 @@
+# dw_backend.py
+# =====================================================================
+# Backends du Data Warehouse Northwind_BI3 (ETL + dashboard)
+# - sqlserver : SQL Server via ODBC (pool partagé, schéma bi3.sql)
+# - sqlite    : fichier SQLite embarqué (schéma bi3_sqlite.sql)
+# - duckdb    : fichier DuckDB embarqué (schéma bi3_duckdb.sql, module optionnel)
+# Choix par défaut : NW_DW_BACKEND (sqlserver) et NW_DW_PATH (fichier embarqué)
+# =====================================================================
+
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DW_BACKEND = os.getenv("NW_DW_BACKEND", "sqlserver")
+DW_PATH = os.getenv("NW_DW_PATH")
+DEFAULT_DW_DIR = "../data/final"
+
+_CREATE_TABLE = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?\[?(\w+)", re.IGNORECASE)
+
+
+class WarehouseBackend:
+    """
+    Accès au DW : connexion, création du schéma, début de transaction.
+    dialect est celui attendu par les fonctions de chargement de l'ETL
+    ('mssql', 'sqlite' ou 'duckdb').
+    """
+
+    name = None
+    dialect = None
+    schema_file = None
+    # Staging des faits sur plusieurs connexions pendant la transaction de chargement
+    # (tables validées par d'autres connexions visibles en READ COMMITTED)
+    parallel_staging = False
+
+    def connect(self):
+        raise NotImplementedError
+
+    def cursor(self, conn):
+        """Curseur de chargement (même transaction que conn)."""
+        return conn.cursor()
+
+    def begin(self, conn):
+        """Démarre une transaction explicite (commit / rollback par l'appelant)."""
+        raise NotImplementedError
+
+    def schema_statements(self):
+        """Instructions du fichier de schéma, une par élément."""
+        with open(os.path.join(SCRIPTS_DIR, self.schema_file), encoding="utf-8") as f:
+            script = f.read()
+        script = re.sub(r"--[^\n]*", "", script)
+        return [stmt.strip() for stmt in script.split(";") if stmt.strip()]
+
+    def existing_tables(self, conn):
+        raise NotImplementedError
+
+    def ensure_schema(self, conn):
+        """
+        Crée les tables du schéma (Dim*, Tabledefait, agrégats) qui n'existent pas
+        encore : un DW déjà chargé reçoit seulement les nouvelles tables.
+        Retourne la liste des tables créées.
+        """
+        existing = {name.lower() for name in self.existing_tables(conn)}
+        created = []
+        cursor = self.cursor(conn)
+        for stmt in self.schema_statements():
+            match = _CREATE_TABLE.search(stmt)
+            if match and match.group(1).lower() in existing:
+                continue
+            cursor.execute(stmt)
+            if match:
+                created.append(match.group(1))
+        conn.commit()
+        if created:
+            print(f"🧱 Tables créées ({self.describe()}) : {', '.join(created)}")
+        return created
+
+    def read_sql(self, conn, query, params=None):
+        """Résultat d'une requête (paramètres « ? » optionnels) sous forme de DataFrame."""
+        return pd.read_sql(query, conn, params=params)
+
+    def describe(self):
+        return self.name
+
+
+class SqlServerBackend(WarehouseBackend):
+    """DW SQL Server (ODBC) : connexions empruntées au pool partagé."""
+
+    name = "sqlserver"
+    dialect = "mssql"
+    schema_file = "bi3.sql"
+    parallel_staging = True
+
+    def connect(self):
+        from db_connect_BI import get_bi_connection   # pyodbc seulement si SQL Server
+        conn = get_bi_connection()
+        if not conn:
+            raise ConnectionError("Connexion DW impossible")
+        return conn
+
+    def begin(self, conn):
+        conn.autocommit = False   # START TRANSACTION
+
+    def schema_statements(self):
+        # Lots séparés par GO ; le USE est inutile (base déjà choisie par la connexion)
+        with open(os.path.join(SCRIPTS_DIR, self.schema_file), encoding="utf-8") as f:
+            batches = re.split(r"^\s*GO\s*$", f.read(), flags=re.MULTILINE)
+        return [b.strip() for b in batches if b.strip() and not b.strip().upper().startswith("USE ")]
+
+    def existing_tables(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES")
+        return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteBackend(WarehouseBackend):
+    """DW SQLite embarqué (un fichier, aucune dépendance)."""
+
+    name = "sqlite"
+    dialect = "sqlite"
+    schema_file = "bi3_sqlite.sql"
+    extension = ".sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_DW_DIR, "northwind_bi3" + self.extension)
+
+    def connect(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        # Chargement en masse : journal WAL, synchronisation allégée
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def begin(self, conn):
+        conn.execute("BEGIN")
+
+    def existing_tables(self, conn):
+        return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+
+    def describe(self):
+        return f"{self.name}:{self.path}"
+
+
+class DuckDBBackend(SQLiteBackend):
+    """
+    DW DuckDB embarqué (stockage en colonnes). Le curseur de chargement est la
+    connexion elle-même : sous DuckDB, conn.cursor() ouvre une autre connexion
+    et sortirait de la transaction.
+    """
+
+    name = "duckdb"
+    dialect = "duckdb"
+    schema_file = "bi3_duckdb.sql"
+    extension = ".duckdb"
+
+    def connect(self):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("Backend duckdb : installer le module (pip install duckdb)")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        return duckdb.connect(self.path)
+
+    def cursor(self, conn):
+        return conn
+
+    def begin(self, conn):
+        conn.execute("BEGIN TRANSACTION")
+
+    def existing_tables(self, conn):
+        return [row[0] for row in conn.execute("SELECT table_name FROM information_schema.tables").fetchall()]
+
+    def read_sql(self, conn, query, params=None):
+        return conn.execute(query, params or []).df()
+
+
+BACKENDS = {
+    "sqlserver": SqlServerBackend,
+    "sqlite": SQLiteBackend,
+    "duckdb": DuckDBBackend,
+}
+
+
+def get_backend(name=None, path=None):
+    """Backend name (défaut NW_DW_BACKEND) ; path = fichier du DW embarqué (défaut NW_DW_PATH)."""
+    name = name or DW_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Backend DW inconnu : {name} (choix : {', '.join(BACKENDS)})")
+    if name == "sqlserver":
+        return SqlServerBackend()
+    return BACKENDS[name](path or DW_PATH)
+
+
+def backend_for_connection(conn):
+    """Backend correspondant à une connexion déjà ouverte (pyodbc, sqlite3 ou duckdb)."""
+    module = type(conn).__module__.split(".")[0].lstrip("_")
+    if module == "sqlite3":
+        return SQLiteBackend(":memory:")
+    if module == "duckdb":
+        return DuckDBBackend(":memory:")
+    return SqlServerBackend()
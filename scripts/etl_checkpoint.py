@@ -0,0 +1,255 @@
+# etl_checkpoint.py
+# =====================================================================
+# Points de reprise (checkpoints) des étapes de l'ETL
+# - chaque étape (extraction, transformation) persiste ses DataFrames en
+#   Feather dans data/clean/checkpoints/<étape>/<clé>/
+# - la clé est une empreinte SHA-256 des entrées de l'étape (contenu des
+#   DataFrames ou empreinte des sources), de ses paramètres et du code
+# - une étape dont la clé existe déjà n'est pas recalculée
+# - run_state.json garde la dernière clé réussie de chaque étape :
+#   --resume reprend après la dernière étape réussie (ex. chargement en échec)
+# =====================================================================
+
+import os
+import json
+import shutil
+import hashlib
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow absent : pas de checkpoints
+    feather = None
+
+
+CHECKPOINT_PATH = "../data/clean/checkpoints"
+CHECKPOINT_KEEP = 2          # checkpoints conservés par étape (les plus récents)
+RUN_STATE_FILE = "run_state.json"
+_INDEX_COLUMN = "__index__"
+
+
+# ------------------------------
+# EMPREINTES : CODE, SOURCES, DATAFRAMES
+# ------------------------------
+
+def code_version(*paths):
+    """Empreinte SHA-256 (16 caractères) du code source des modules donnés."""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    """Taille + mtime d'un fichier source (None s'il n'existe pas)."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def frames_digest(frames):
+    """
+    Empreinte du contenu d'un dictionnaire de DataFrames (noms, colonnes,
+    dtypes, index et valeurs via pd.util.hash_pandas_object).
+    Retourne None si une valeur n'est pas un DataFrame (ex. générateur en streaming).
+    """
+    h = hashlib.sha256()
+    for name in sorted(frames):
+        df = frames[name]
+        if not isinstance(df, pd.DataFrame):
+            return None
+        h.update(name.encode())
+        h.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+        h.update(np.ascontiguousarray(pd.util.hash_pandas_object(df, index=True).to_numpy()).tobytes())
+    return h.hexdigest()
+
+
+def stage_key(stage, code, inputs, params=None):
+    """Clé d'un checkpoint : empreinte de l'étape, du code, des entrées et des paramètres."""
+    payload = json.dumps({"stage": stage, "code": code, "inputs": inputs, "params": params or {}},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+# ------------------------------
+# ÉCRITURE / LECTURE DES CHECKPOINTS
+# ------------------------------
+
+def _flatten(outputs):
+    """{'sql_data': {'orders': df}, 'df_fact': df} -> {'sql_data.orders': df, 'df_fact': df}"""
+    flat = {}
+    for group, value in outputs.items():
+        if isinstance(value, dict):
+            for name, df in value.items():
+                flat[f"{group}.{name}"] = df
+        else:
+            flat[group] = value
+    return flat
+
+
+def _unflatten(flat, groups):
+    outputs = {}
+    for group, kind in groups.items():
+        if kind == "dict":
+            prefix = group + "."
+            outputs[group] = {k[len(prefix):]: df for k, df in flat.items() if k.startswith(prefix)}
+        else:
+            outputs[group] = flat[group]
+    return outputs
+
+
+def _write_frame(df, path):
+    """Écrit un DataFrame en Feather ; un index non trivial est conservé en colonne."""
+    index = df.index
+    default_index = isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+    if not default_index:
+        df = df.reset_index(names=_INDEX_COLUMN)
+    feather.write_feather(df, path, compression="lz4")
+    return not default_index
+
+
+def _read_frame(path, has_index):
+    df = feather.read_feather(path)
+    if has_index:
+        df = df.set_index(_INDEX_COLUMN)
+        df.index.name = None
+    return df
+
+
+class CheckpointStore:
+    """
+    Dossier de checkpoints : un sous-dossier par étape et par clé,
+    plus run_state.json (dernière clé réussie de chaque étape).
+    Un checkpoint est complet si son manifest.json existe (écrit en dernier).
+    """
+
+    def __init__(self, root=CHECKPOINT_PATH, code=None, resume=False, enabled=True):
+        self.root = root
+        self.code = code
+        self.resume = resume
+        self.enabled = enabled and feather is not None
+        self.report = {}
+        if enabled and feather is None:
+            print("⚠️ pyarrow absent : checkpoints désactivés")
+        self.state = self._load_state() if self.enabled else {}
+
+    # ---------- état des étapes ----------
+
+    def _state_path(self):
+        return os.path.join(self.root, RUN_STATE_FILE)
+
+    def _load_state(self):
+        path = self._state_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._state_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self._state_path())
+
+    def mark_done(self, stage, key, **info):
+        """Enregistre la réussite d'une étape (clé + horodatage)."""
+        if not self.enabled:
+            return
+        self.state[stage] = {"key": key, "finished_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+                             **info}
+        self._save_state()
+
+    def is_done(self, stage, key):
+        """Vrai si la dernière exécution réussie de l'étape avait la même clé."""
+        return self.enabled and self.state.get(stage, {}).get("key") == key
+
+    # ---------- fichiers ----------
+
+    def _dir(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def load(self, stage, key):
+        """Relit un checkpoint complet -> (sorties, métadonnées), ou None."""
+        directory = self._dir(stage, key)
+        manifest_file = os.path.join(directory, "manifest.json")
+        if not self.enabled or not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+        flat = {name: _read_frame(os.path.join(directory, entry["file"]), entry["index"])
+                for name, entry in manifest["frames"].items()}
+        return _unflatten(flat, manifest["groups"]), manifest.get("meta", {})
+
+    def save(self, stage, key, outputs, meta=None):
+        """Écrit les DataFrames d'une étape ; le manifest est écrit en dernier."""
+        if not self.enabled:
+            return
+        directory = self._dir(stage, key)
+        tmp_dir = directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            frames = {}
+            for name, df in _flatten(outputs).items():
+                file = name.replace("/", "_") + ".feather"
+                has_index = _write_frame(df, os.path.join(tmp_dir, file))
+                frames[name] = {"file": file, "rows": len(df), "index": has_index}
+            manifest = {"stage": stage, "key": key, "code": self.code,
+                        "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+                        "groups": {g: "dict" if isinstance(v, dict) else "frame" for g, v in outputs.items()},
+                        "frames": frames, "meta": meta or {}}
+            with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, default=str)
+        except Exception as e:
+            # Colonne non typable en Arrow, disque plein... : l'étape reste valide, sans checkpoint
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            print(f"⚠️ Checkpoint '{stage}' non écrit : {e}")
+            return
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+        self._prune(stage, keep_key=key)
+
+    def _prune(self, stage, keep_key):
+        """Ne garde que les CHECKPOINT_KEEP checkpoints les plus récents de l'étape."""
+        stage_dir = os.path.join(self.root, stage)
+        entries = [e for e in os.scandir(stage_dir) if e.is_dir() and not e.name.endswith(".tmp")]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for e in entries[CHECKPOINT_KEEP:]:
+            if e.name != keep_key:
+                shutil.rmtree(e.path, ignore_errors=True)
+
+    # ---------- exécution d'une étape ----------
+
+    def run_stage(self, stage, func, inputs, params=None, reusable=True):
+        """
+        Exécute une étape ou relit son checkpoint.
+        - func() retourne un dictionnaire {groupe: DataFrame | dict de DataFrames}
+          et, optionnellement, des métadonnées : (sorties, meta)
+        - reusable=False : le checkpoint n'est relu qu'avec --resume
+          (entrées non empreintables, ex. base SQL Server source)
+        Retourne (sorties, meta).
+        """
+        key = stage_key(stage, self.code, inputs, params)
+        can_reuse = reusable or (self.resume and self.is_done(stage, key))
+        if self.enabled and can_reuse:
+            start = time.perf_counter()
+            cached = self.load(stage, key)
+            if cached is not None:
+                print(f"⏭️ Étape '{stage}' reprise depuis le checkpoint {key} "
+                      f"({time.perf_counter() - start:.2f}s)")
+                self.report[stage] = {"key": key, "status": "reused"}
+                self.mark_done(stage, key)
+                return cached
+
+        result = func()
+        outputs, meta = result if isinstance(result, tuple) else (result, {})
+        self.save(stage, key, outputs, meta)
+        self.report[stage] = {"key": key, "status": "computed"}
+        self.mark_done(stage, key)
+        return outputs, meta
@@ -0,0 +1,389 @@
+# etl_instrumentation.py
+# =====================================================================
+# Instrumentation des étapes de l'ETL
+# - décorateur @instrumented : temps réel, temps CPU, lignes en entrée / sortie,
+#   lignes/s, pic mémoire (tracemalloc, optionnel), appels SQL (curseurs instrumentés)
+# - journal d'exécution JSON (un fichier par run)
+# - profil optionnel par étape : cProfile (.prof) ou pyinstrument (.html)
+# Sans run actif (start_run non appelé), le décorateur n'ajoute qu'un test.
+# =====================================================================
+
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import functools
+import inspect
+import threading
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # pyinstrument absent : profil cProfile uniquement
+    PyinstrumentProfiler = None
+
+
+RUN_LOG_PATH = "../data/final/runs"
+
+_current_run = None
+
+
+# ------------------------------
+# COMPTAGE DES LIGNES
+# ------------------------------
+
+def count_rows(obj):
+    """
+    Nombre de lignes d'un résultat ou d'un argument d'étape :
+    DataFrame -> len ; dict / liste de DataFrames -> somme ;
+    (insérées, ignorées) -> insérées ; entier -> lui-même ; sinon None.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, bool):
+        return None
+    if isinstance(obj, int):
+        return obj
+    if isinstance(obj, tuple) and obj and isinstance(obj[0], int) and not isinstance(obj[0], bool):
+        return obj[0]
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (list, tuple)):
+        counts = [count_rows(v) for v in obj if isinstance(v, (pd.DataFrame, dict))]
+        counts = [c for c in counts if c is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def _rows_in(args, kwargs):
+    counts = [count_rows(v) for v in list(args) + list(kwargs.values())
+              if isinstance(v, (pd.DataFrame, dict))]
+    counts = [c for c in counts if c is not None]
+    return sum(counts) if counts else None
+
+
+# ------------------------------
+# RUN : JOURNAL DES ÉTAPES
+# ------------------------------
+
+class _Frame:
+    """Étape en cours d'exécution (pile par thread)."""
+
+    __slots__ = ("record", "wall0", "cpu0", "mem_base", "mem_peak", "profiler")
+
+    def __init__(self, record):
+        self.record = record
+        self.wall0 = self.cpu0 = 0.0
+        self.mem_base = self.mem_peak = 0
+        self.profiler = None
+
+
+class EtlRun:
+    """
+    Journal d'un run ETL : une entrée par appel d'étape instrumentée
+    (imbrication conservée via parent / depth).
+    Le temps CPU est celui du processus (inclut les threads concurrents de l'étape).
+    trace_memory : pic mémoire Python par étape via tracemalloc (ralentit l'exécution).
+    profile : None, 'cprofile' ou 'pyinstrument' ; profile_stages : noms d'étapes
+    à profiler (par défaut, les étapes de premier niveau).
+    """
+
+    def __init__(self, log_dir=RUN_LOG_PATH, trace_memory=False, profile=None,
+                 profile_stages=None, config=None):
+        self.run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.log_dir = log_dir
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.profile_stages = set(profile_stages or [])
+        self.config = config or {}
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.annotations = {}
+        self.log_path = None
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiling = False
+
+        if self.profile == "pyinstrument" and PyinstrumentProfiler is None:
+            print("⚠️ pyinstrument non installé : profil cProfile utilisé")
+            self.profile = "cprofile"
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # --- pile d'étapes (par thread) ---
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # --- début / fin d'étape ---
+
+    def _wants_profile(self, name, depth):
+        if not self.profile or self._profiling:
+            return False
+        if self.profile_stages:
+            return name in self.profile_stages or name.split("[")[0] in self.profile_stages
+        return depth == 0
+
+    def enter(self, name, rows_in):
+        stack = self._stack()
+        record = {
+            "stage": name,
+            "parent": stack[-1].record["stage"] if stack else None,
+            "depth": len(stack),
+            "thread": threading.current_thread().name,
+            "rows_in": rows_in,
+            "sql_calls": 0,
+        }
+        frame = _Frame(record)
+
+        if self.trace_memory and tracemalloc.is_tracing():
+            if stack:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            frame.mem_base = tracemalloc.get_traced_memory()[0]
+
+        if self._wants_profile(name, len(stack)):
+            self._profiling = True
+            if self.profile == "pyinstrument":
+                frame.profiler = PyinstrumentProfiler()
+                frame.profiler.start()
+            else:
+                frame.profiler = cProfile.Profile()
+                frame.profiler.enable()
+
+        stack.append(frame)
+        frame.cpu0 = time.process_time()
+        frame.wall0 = time.perf_counter()
+        record["started_s"] = round(frame.wall0 - self._t0, 4)
+        return frame
+
+    def exit(self, frame, result=None, error=None):
+        wall = time.perf_counter() - frame.wall0
+        cpu = time.process_time() - frame.cpu0
+        stack = self._stack()
+        stack.pop()
+        record = frame.record
+
+        if frame.profiler is not None:
+            record["profile"] = self._dump_profile(frame)
+            self._profiling = False
+
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = round((peak - frame.mem_base) / 2**20, 2)
+            if stack:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+
+        rows_out = count_rows(result) if error is None else None
+        rows = rows_out if rows_out is not None else record["rows_in"]
+        record.update({
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "rows_out": rows_out,
+            "rows_per_s": round(rows / wall, 1) if rows and wall > 0 else None,
+            "status": "error" if error is not None else "ok",
+        })
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+
+        with self._lock:
+            self.stages.append(record)
+
+    def count_sql_call(self):
+        """Ajoute un aller-retour SQL à toutes les étapes en cours du thread."""
+        for frame in self._stack():
+            frame.record["sql_calls"] += 1
+
+    def _dump_profile(self, frame):
+        os.makedirs(self.log_dir, exist_ok=True)
+        base = os.path.join(self.log_dir, f"etl_run_{self.run_id}_{frame.record['stage']}")
+        base = base.replace("[", "_").replace("]", "")
+        if self.profile == "pyinstrument":
+            frame.profiler.stop()
+            path = base + ".html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(frame.profiler.output_html())
+        else:
+            frame.profiler.disable()
+            path = base + ".prof"
+            frame.profiler.dump_stats(path)
+        return path
+
+    # --- sortie ---
+
+    def ordered_stages(self):
+        """Étapes dans l'ordre de démarrage (une étape avant ses sous-étapes)."""
+        with self._lock:
+            return sorted(self.stages, key=lambda r: r["started_s"])
+
+    def to_dict(self, status="ok"):
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "status": status,
+            "wall_s": round(time.perf_counter() - self._t0, 4),
+            "cpu_s": round(time.process_time() - self._cpu0, 4),
+            "argv": sys.argv,
+            "config": self.config,
+            "trace_memory": self.trace_memory,
+            "profile": self.profile,
+            "stages": self.ordered_stages(),
+            "annotations": self.annotations,
+        }
+
+    def write(self, status="ok"):
+        """Écrit le journal JSON du run ; retourne son chemin."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.log_path = os.path.join(self.log_dir, f"etl_run_{self.run_id}.json")
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(status), f, indent=2, default=str)
+        return self.log_path
+
+    def summary(self):
+        """Tableau récapitulatif des étapes (sous-étapes indentées)."""
+        columns = ["stage", "depth", "wall_s", "cpu_s", "rows_in", "rows_out",
+                   "rows_per_s", "peak_mb", "sql_calls", "status"]
+        df = pd.DataFrame(self.ordered_stages()).reindex(columns=columns)
+        df[["rows_in", "rows_out"]] = df[["rows_in", "rows_out"]].astype("Int64")
+        df["stage"] = df["depth"].fillna(0).astype(int).map(lambda d: "  " * d) + df["stage"]
+        return df.drop(columns="depth")
+
+
+# ------------------------------
+# API : RUN COURANT
+# ------------------------------
+
+def start_run(**kwargs):
+    """
+    Active l'instrumentation pour le processus (voir EtlRun pour les options).
+    Le journal est écrit par end_run(), ou à la sortie du processus à défaut.
+    """
+    global _current_run
+    _current_run = EtlRun(**kwargs)
+    atexit.register(_write_on_exit, _current_run)
+    return _current_run
+
+
+def end_run(status="ok", show_summary=True):
+    """Écrit le journal du run courant, affiche le récapitulatif et désactive l'instrumentation."""
+    global _current_run
+    run = _current_run
+    if run is None:
+        return None
+    _current_run = None
+    path = run.write(status)
+    if run.trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    if show_summary and run.stages:
+        print("\n⏱ Récapitulatif des étapes :")
+        print(run.summary().to_string(index=False))
+    print(f"📝 Journal d'exécution : {path}")
+    return path
+
+
+def _write_on_exit(run):
+    if run.log_path is None:
+        run.write(status="interrupted")
+
+
+def get_current_run():
+    return _current_run
+
+
+def annotate_run(key, value):
+    """Ajoute une information au journal du run courant (ex. compteurs de rapprochement)."""
+    if _current_run is not None:
+        with _current_run._lock:
+            _current_run.annotations[key] = value
+
+
+# ------------------------------
+# DÉCORATEUR D'ÉTAPE
+# ------------------------------
+
+def instrumented(stage=None, label_arg=None):
+    """
+    Instrumente une fonction d'étape ETL.
+    stage : nom de l'étape (par défaut le nom de la fonction) ;
+    label_arg : argument dont la valeur complète le nom, ex. load_dimension[DimDate].
+    """
+    def decorator(func):
+        name = stage or func.__name__
+        signature = inspect.signature(func) if label_arg else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            run = _current_run
+            if run is None:
+                return func(*args, **kwargs)
+
+            label = name
+            if signature is not None:
+                bound = signature.bind_partial(*args, **kwargs)
+                if label_arg in bound.arguments:
+                    label = f"{name}[{bound.arguments[label_arg]}]"
+
+            frame = run.enter(label, _rows_in(args, kwargs))
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                run.exit(frame, error=e)
+                raise
+            run.exit(frame, result=result)
+            return result
+
+        return wrapper
+    return decorator
+
+
+# ------------------------------
+# CURSEUR INSTRUMENTÉ (allers-retours SQL)
+# ------------------------------
+
+class CountingCursor:
+    """
+    Enveloppe de curseur DB-API : chaque execute / executemany compte un
+    aller-retour SQL pour les étapes en cours. Le reste est délégué.
+    """
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "wrapped_cursor", cursor)
+
+    def execute(self, *args, **kwargs):
+        run = _current_run
+        if run is not None:
+            run.count_sql_call()
+        self.wrapped_cursor.execute(*args, **kwargs)
+        return self
+
+    def executemany(self, *args, **kwargs):
+        run = _current_run
+        if run is not None:
+            run.count_sql_call()
+        self.wrapped_cursor.executemany(*args, **kwargs)
+        return self
+
+    def __iter__(self):
+        return iter(self.wrapped_cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped_cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.wrapped_cursor, name, value)
+
+
+def instrument_cursor(cursor):
+    """Curseur instrumenté si un run est actif, curseur d'origine sinon."""
+    return CountingCursor(cursor) if _current_run is not None else cursor
@@ -0,0 +1,323 @@
+# synthetic_northwind.py
+# =====================================================================
+# Générateur déterministe d'un Northwind synthétique à facteur d'échelle
+# - Source 1 : base SQLite avec les tables Northwind (Orders, Customers, ...)
+# - Source 2 : classeurs XLSX au format Access (Order ID, Customer ID, ...)
+#              + copie Parquet des mêmes données
+# Facteur 1 = volumétrie du Northwind d'origine (830 commandes SQL, 48 Excel).
+# =====================================================================
+
+import os
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+
+
+GENERATOR_VERSION = 1
+DEFAULT_SEED = 42
+SYNTHETIC_PATH = "../data/synthetic"
+
+# Volumétrie du Northwind d'origine (facteur 1)
+BASE_ROWS = {
+    "sql_orders": 830,
+    "sql_customers": 91,
+    "sql_employees": 9,
+    "sql_territories": 53,
+    "excel_orders": 48,
+    "excel_customers": 29,
+    "excel_employees": 9,
+}
+
+REGIONS = ["Eastern", "Western", "Northern", "Southern"]
+CITIES = np.array(["Seattle", "London", "Berlin", "Madrid", "Lyon", "Boston", "Sao Paulo",
+                   "Mexico D.F.", "Tacoma", "Redmond", "Kirkland", "Portland"], dtype=object)
+COUNTRIES = np.array(["USA", "UK", "Germany", "Spain", "France", "USA", "Brazil",
+                      "Mexico", "USA", "USA", "USA", "USA"], dtype=object)
+FIRST_NAMES = np.array(["Maria", "Ana", "Antonio", "Thomas", "Christina", "Hanna", "Frederique",
+                        "Martin", "Elizabeth", "Victoria", "Patricio", "Francisco"], dtype=object)
+LAST_NAMES = np.array(["Anders", "Trujillo", "Moreno", "Hardy", "Berglund", "Moos", "Citeaux",
+                       "Sommer", "Lincoln", "Ashworth", "Simpson", "Chang"], dtype=object)
+TITLES = np.array(["Sales Representative", "Sales Manager", "Inside Sales Coordinator",
+                   "Vice President, Sales", None], dtype=object)
+
+
+def scaled_rows(scale):
+    """Nombre de lignes de chaque table pour un facteur d'échelle donné."""
+    return {name: int(round(n * scale)) for name, n in BASE_ROWS.items()}
+
+
+def _choice(rng, values, n):
+    """Tirage uniforme dans values (tableau object)."""
+    return values[rng.integers(0, len(values), n)].astype(object)
+
+
+def _dates(rng, start, days, n):
+    return pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, n), unit="D")
+
+
+def _ids(prefix, values, width):
+    return pd.Series(values).astype(str).str.zfill(width).radd(prefix).to_numpy(dtype=object)
+
+
+# ------------------------------
+# SOURCE 1 : SQL (tables Northwind)
+# ------------------------------
+
+def make_sql_tables(scale, seed=DEFAULT_SEED):
+    """
+    Tables Northwind de la Source 1 (mêmes noms de colonnes que SQL Server).
+    Chaque employé couvre 1 à 3 territoires ; ~5 % des commandes ne sont pas livrées.
+    """
+    rng = np.random.default_rng(seed)
+    n = scaled_rows(scale)
+    excel_orders = n["excel_orders"]
+
+    # --- Region / Territories ---
+    region = pd.DataFrame({
+        "RegionID": np.arange(1, len(REGIONS) + 1),
+        "RegionDescription": [f"{name:<50}" for name in REGIONS],   # nchar(50) comme Northwind
+    })
+    n_terr = max(n["sql_territories"], 1)
+    territories = pd.DataFrame({
+        "TerritoryID": _ids("", np.arange(1, n_terr + 1) * 7 + 1000, 5),
+        "TerritoryDescription": [f"Territory {i:<40}" for i in range(1, n_terr + 1)],
+        "RegionID": rng.integers(1, len(REGIONS) + 1, n_terr),
+    })
+
+    # --- Employees / EmployeeTerritories ---
+    n_emp = max(n["sql_employees"], 1)
+    employees = pd.DataFrame({
+        "EmployeeID": np.arange(1, n_emp + 1),
+        "LastName": _choice(rng, LAST_NAMES, n_emp),
+        "FirstName": _choice(rng, FIRST_NAMES, n_emp),
+        "Title": _choice(rng, TITLES, n_emp),
+        "TitleOfCourtesy": _choice(rng, np.array(["Ms.", "Mr.", "Dr."], dtype=object), n_emp),
+        "BirthDate": _dates(rng, "1950-01-01", 12000, n_emp),
+        "HireDate": _dates(rng, "1992-01-01", 1500, n_emp),
+        "Address": _ids("Street ", np.arange(n_emp), 4),
+        "City": _choice(rng, CITIES, n_emp),
+        "Region": _choice(rng, np.array(["WA", None], dtype=object), n_emp),
+        "PostalCode": _ids("", rng.integers(0, 99999, n_emp), 5),
+        "Country": _choice(rng, np.array(["USA", "UK"], dtype=object), n_emp),
+        "HomePhone": "(206) 555-9857",
+        "Extension": _ids("", rng.integers(0, 9999, n_emp), 4),
+        "ReportsTo": np.where(np.arange(n_emp) == 1, np.nan, 2.0),
+    })
+
+    per_employee = rng.integers(1, 4, n_emp)
+    employee_territories = pd.DataFrame({
+        "EmployeeID": np.repeat(employees["EmployeeID"].to_numpy(), per_employee),
+        "TerritoryID": territories["TerritoryID"].to_numpy()[rng.integers(0, n_terr, per_employee.sum())],
+    }).drop_duplicates(ignore_index=True)
+
+    # --- Customers ---
+    n_cust = max(n["sql_customers"], 1)
+    city_idx = rng.integers(0, len(CITIES), n_cust)
+    contact = pd.Series(_choice(rng, FIRST_NAMES, n_cust)) + " " + pd.Series(_choice(rng, LAST_NAMES, n_cust))
+    contact[rng.random(n_cust) < 0.02] = None
+    customers = pd.DataFrame({
+        "CustomerID": _ids("C", np.arange(n_cust), 7),
+        "CompanyName": _ids("Company ", np.arange(n_cust), 7),
+        "ContactName": contact.to_numpy(dtype=object),
+        "ContactTitle": _choice(rng, TITLES, n_cust),
+        "Address": _ids("Obere Str. ", np.arange(n_cust), 5),
+        "City": CITIES[city_idx],
+        "Region": _choice(rng, np.array(["WA", "BC", "SP", None, None, None], dtype=object), n_cust),
+        "PostalCode": _ids("", rng.integers(0, 99999, n_cust), 5),
+        "Country": COUNTRIES[city_idx],
+        "Phone": "030-0074321",
+        "Fax": _choice(rng, np.array(["030-0076545", None], dtype=object), n_cust),
+    })
+
+    # --- Orders (OrderID disjoints de ceux d'Excel) ---
+    n_ord = max(n["sql_orders"], 1)
+    first_id = max(10248, 30 + excel_orders)
+    order_dates = _dates(rng, "1996-07-04", 670, n_ord)
+    shipped = pd.Series(order_dates + pd.to_timedelta(rng.integers(1, 35, n_ord), unit="D"))
+    shipped[rng.random(n_ord) < 0.05] = pd.NaT
+    ship_idx = rng.integers(0, len(CITIES), n_ord)
+    orders = pd.DataFrame({
+        "OrderID": np.arange(first_id, first_id + n_ord),
+        "CustomerID": customers["CustomerID"].to_numpy()[rng.integers(0, n_cust, n_ord)],
+        "EmployeeID": rng.integers(1, n_emp + 1, n_ord),
+        "OrderDate": order_dates,
+        "RequiredDate": order_dates + pd.Timedelta(days=28),
+        "ShippedDate": shipped.to_numpy(),
+        "ShipVia": rng.integers(1, 4, n_ord),
+        "Freight": np.round(rng.gamma(2.0, 40.0, n_ord), 2),
+        "ShipName": _ids("Ship ", rng.integers(0, 1000, n_ord), 3),
+        "ShipAddress": _ids("Address ", rng.integers(0, 1000, n_ord), 3),
+        "ShipCity": CITIES[ship_idx],
+        "ShipRegion": _choice(rng, np.array(["WA", None, None], dtype=object), n_ord),
+        "ShipPostalCode": _ids("", rng.integers(0, 99999, n_ord), 5),
+        "ShipCountry": COUNTRIES[ship_idx],
+    })
+
+    return {
+        "Orders": orders,
+        "Customers": customers,
+        "Employees": employees,
+        "Region": region,
+        "Territories": territories,
+        "EmployeeTerritories": employee_territories,
+    }
+
+
+# ------------------------------
+# SOURCE 2 : EXCEL (export Access)
+# ------------------------------
+
+def _contact_columns(rng, n, company=None):
+    """Colonnes communes des classeurs customers / employees (company=None : une société par ligne)."""
+    city_idx = rng.integers(0, len(CITIES), n)
+    return {
+        "ID": np.arange(1, n + 1),
+        "Company": _ids("Company ", np.arange(n), 6) if company is None else company,
+        "Last Name": _choice(rng, LAST_NAMES, n),
+        "First Name": _choice(rng, FIRST_NAMES, n),
+        "E-mail Address": None,
+        "Job Title": _choice(rng, TITLES, n),
+        "Business Phone": "(123)555-0100",
+        "Home Phone": None,
+        "Mobile Phone": None,
+        "Fax Number": "(123)555-0101",
+        "Address": _ids("Street ", np.arange(n), 6),
+        "City": CITIES[city_idx],
+        "State/Province": _choice(rng, np.array(["WA", "NY", "CA", "MA"], dtype=object), n),
+        "ZIP/Postal Code": 99999,
+        "Country/Region": COUNTRIES[city_idx],
+        "Web Page": None,
+        "Notes": None,
+        "Attachments": None,
+    }
+
+
+def make_excel_tables(scale, seed=DEFAULT_SEED):
+    """Classeurs de la Source 2 (colonnes de l'export Access de data/raw)."""
+    rng = np.random.default_rng(seed + 1)
+    n = scaled_rows(scale)
+
+    n_cust = max(n["excel_customers"], 1)
+    n_emp = max(n["excel_employees"], 1)
+    n_ord = max(n["excel_orders"], 1)
+
+    customers = pd.DataFrame(_contact_columns(rng, n_cust))
+    employees = pd.DataFrame(_contact_columns(rng, n_emp, company="Northwind Traders"))
+
+    order_dates = _dates(rng, "2006-01-15", 180, n_ord)
+    shipped = pd.Series(order_dates + pd.to_timedelta(rng.integers(0, 10, n_ord), unit="D"))
+    shipped[rng.random(n_ord) < 0.15] = pd.NaT
+    ship_idx = rng.integers(0, len(CITIES), n_ord)
+    orders = pd.DataFrame({
+        "Order ID": np.arange(30, 30 + n_ord),
+        "Employee ID": rng.integers(1, n_emp + 1, n_ord),
+        "Customer ID": rng.integers(1, n_cust + 1, n_ord),
+        "Order Date": order_dates,
+        "Shipped Date": shipped.to_numpy(),
+        "Shipper ID": rng.integers(1, 4, n_ord).astype(float),
+        "Ship Name": _ids("Ship ", rng.integers(0, 1000, n_ord), 3),
+        "Ship Address": _ids("Street ", rng.integers(0, 1000, n_ord), 3),
+        "Ship City": CITIES[ship_idx],
+        "Ship State/Province": _choice(rng, np.array(["WA", "NY", "NV"], dtype=object), n_ord),
+        "Ship ZIP/Postal Code": 99999,
+        "Ship Country/Region": COUNTRIES[ship_idx],
+        "Shipping Fee": rng.integers(0, 300, n_ord),
+        "Taxes": 0,
+        "Payment Type": _choice(rng, np.array(["Check", "Credit Card", "Cash"], dtype=object), n_ord),
+        "Paid Date": order_dates,
+        "Notes": None,
+        "Tax Rate": 0,
+        "Tax Status": None,
+        "Status ID": rng.choice(np.array([0, 2, 3]), n_ord),
+    })
+
+    return {"orders": orders, "customers": customers, "employees": employees}
+
+
+# ------------------------------
+# ÉCRITURE SUR DISQUE
+# ------------------------------
+
+def write_sqlite(tables, path):
+    """Écrit les tables Source 1 dans une base SQLite neuve."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        for name, df in tables.items():
+            df.to_sql(name, conn, index=False, chunksize=100_000)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def generate_dataset(scale, out_dir=None, seed=DEFAULT_SEED, xlsx=True, parquet=True, force=False):
+    """
+    Génère (ou réutilise) le jeu de données du facteur d'échelle scale dans out_dir :
+      source1.sqlite, raw/{orders,customers,employees}.xlsx, parquet/*.parquet, manifest.json
+    Le jeu existant est réutilisé si son manifest correspond (version, seed, formats).
+    Retourne le manifest (chemins + nombre de lignes par table).
+    """
+    out_dir = out_dir or os.path.join(SYNTHETIC_PATH, f"sf{scale:g}")
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    wanted = {"version": GENERATOR_VERSION, "scale": scale, "seed": seed, "xlsx": xlsx, "parquet": parquet}
+
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if all(manifest.get(k) == v for k, v in wanted.items()):
+            print(f"♻️ Jeu synthétique sf={scale:g} réutilisé ({out_dir})")
+            return manifest
+
+    print(f"🏭 Génération du Northwind synthétique sf={scale:g} dans {out_dir}...")
+    raw_dir = os.path.join(out_dir, "raw")
+    parquet_dir = os.path.join(out_dir, "parquet")
+    os.makedirs(raw_dir, exist_ok=True)
+
+    sql_tables = make_sql_tables(scale, seed)
+    excel_tables = make_excel_tables(scale, seed)
+
+    sqlite_path = os.path.join(out_dir, "source1.sqlite")
+    write_sqlite(sql_tables, sqlite_path)
+
+    excel_files = {}
+    for key, df in excel_tables.items():
+        path = os.path.join(raw_dir, f"{key}.xlsx")
+        if xlsx:
+            df.to_excel(path, index=False)
+        excel_files[key] = path
+
+    if parquet:
+        os.makedirs(parquet_dir, exist_ok=True)
+        for name, df in list(sql_tables.items()) + [(f"excel_{k}", v) for k, v in excel_tables.items()]:
+            df.to_parquet(os.path.join(parquet_dir, f"{name}.parquet"), index=False)
+
+    manifest = dict(wanted)
+    manifest.update({
+        "sqlite": sqlite_path,
+        "excel_files": excel_files,
+        "parquet_dir": parquet_dir if parquet else None,
+        "rows": {**{f"sql.{k}": len(v) for k, v in sql_tables.items()},
+                 **{f"excel.{k}": len(v) for k, v in excel_tables.items()}},
+    })
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✅ Jeu synthétique prêt : {manifest['rows']}")
+    return manifest
+
+
+
+def load_manifest(path):
+    """Manifest d'un jeu déjà généré (dossier sf<N> ou chemin de manifest.json)."""
+    if os.path.isdir(path):
+        path = os.path.join(path, "manifest.json")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    import sys
+    for s in (sys.argv[1:] or ["1"]):
+        generate_dataset(float(s))